@@ -0,0 +1,249 @@
+"""
+Compact, precomputed data bundle for the dashboard.
+
+    python dashboard_bundle.py [mlruns | sqlite:///mlflow.db] [--output ../frontend/public/data/bundle]
+
+The bundle replaces one indented metrics.json holding every run:
+
+- summary.json: each model's run count, best run (by BEST_METRIC) and latest run
+- history/<model>.json: the model's metrics over time, at most HISTORY_POINTS points
+  (bucket means of consecutive runs plus the bucket's best BEST_METRIC)
+- runs/<YYYY-MM>-<k>.json: every run, sharded by the month it started and then into
+  chunks of SHARD_RUNS runs in start order (new runs only change the month's last chunk)
+
+Files are compact JSON, with column arrays in the history files and shards,
+plus precompressed .gz copies (and .br copies when brotli is installed) for
+static servers. manifest.json records each file's SHA-256. A file whose
+content did not change since the last export is neither rewritten nor
+recompressed, so a new run touches only its month's last shard, its model's
+history, the summary and the manifest.
+"""
+
+import os
+import json
+import gzip
+import math
+import hashlib
+import argparse
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from mlruns_scanner import COST_KEYS, METRIC_KEYS
+from metrics_sources import default_location, open_source
+
+MANIFEST_FILE = "manifest.json"
+BUNDLE_VERSION = 1
+
+# Higher is better; the dashboard's "best model" is the one with the highest test R²
+BEST_METRIC = "test_r2"
+
+# Points per model history series
+HISTORY_POINTS = 500
+HISTORY_KEYS = ["test_rmse", "test_mae", "test_r2", "train_r2", "fit_seconds"]
+
+# Columns of the run shards
+RUN_KEYS = ["model", "mlflow_run_id", "experiment_id", "start_time", "data_version"] + METRIC_KEYS + COST_KEYS
+
+# Significant digits kept for floats in history and shards (the dashboard shows 4 decimals)
+SIGNIFICANT_DIGITS = 6
+
+# Runs per shard file (about 150 KB of JSON, 45 KB gzipped)
+SHARD_RUNS = 1000
+
+UNDATED_SHARD = "undated"
+
+
+def compact_json(data) -> bytes:
+    return json.dumps(data, separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+
+def _value(value):
+    """JSON-safe, rounded value: NaN becomes null"""
+    if isinstance(value, float):
+        return float(f"{value:.{SIGNIFICANT_DIGITS}g}") if math.isfinite(value) else None
+    return value
+
+
+def json_safe(run: Dict) -> Dict:
+    """Run with NaN and infinite values as null, full precision otherwise"""
+    return {k: None if isinstance(v, float) and not math.isfinite(v) else v for k, v in run.items()}
+
+
+def _score(run: Dict) -> float:
+    value = run.get(BEST_METRIC)
+    return value if value is not None and not math.isnan(value) else -math.inf
+
+
+def _start(run: Dict) -> int:
+    return run.get("start_time") or 0
+
+
+def shard_month(run: Dict) -> str:
+    """Month (UTC) the run started in"""
+    if not run.get("start_time"):
+        return UNDATED_SHARD
+    return datetime.fromtimestamp(run["start_time"] / 1000, tz=timezone.utc).strftime("%Y-%m")
+
+
+def columns(runs: List[Dict], keys: List[str]) -> Dict[str, List]:
+    return {key: [_value(run.get(key)) for run in runs] for key in keys}
+
+
+def history(runs: List[Dict], points: int = HISTORY_POINTS) -> Dict[str, List]:
+    """Metrics of runs sorted by start time, averaged over at most `points` consecutive buckets"""
+    series = {"t": [], "n": [], **{key: [] for key in HISTORY_KEYS}, f"best_{BEST_METRIC}": []}
+    n_buckets = min(points, len(runs))
+    for b in range(n_buckets):
+        bucket = runs[b * len(runs) // n_buckets:(b + 1) * len(runs) // n_buckets]
+        series["t"].append(_start(bucket[-1]))
+        series["n"].append(len(bucket))
+        for key in HISTORY_KEYS:
+            values = [run[key] for run in bucket if run.get(key) is not None and not math.isnan(run[key])]
+            series[key].append(_value(sum(values) / len(values)) if values else None)
+        best = max(_score(run) for run in bucket)
+        series[f"best_{BEST_METRIC}"].append(_value(best) if best != -math.inf else None)
+    return series
+
+
+def build_bundle(runs: List[Dict]) -> Dict[str, object]:
+    """Bundle file name -> JSON content for a list of runs (as returned by MetricsSource.runs())"""
+    runs = sorted(runs, key=lambda run: (_start(run), run["mlflow_run_id"]))
+    by_model: Dict[str, List[Dict]] = {}
+    shards: Dict[str, List[Dict]] = {}
+    for run in runs:
+        by_model.setdefault(run["model"], []).append(run)
+        shards.setdefault(shard_month(run), []).append(run)
+
+    files = {}
+    for model, model_runs in by_model.items():
+        files[f"history/{model}.json"] = {"model": model, "runs": len(model_runs), **history(model_runs)}
+    for month, month_runs in shards.items():
+        for start in range(0, len(month_runs), SHARD_RUNS):
+            name = f"{month}-{start // SHARD_RUNS:02d}"
+            shard_runs = month_runs[start:start + SHARD_RUNS]
+            files[f"runs/{name}.json"] = {"shard": name, "runs": len(shard_runs), **columns(shard_runs, RUN_KEYS)}
+    files["summary.json"] = {
+        "version": BUNDLE_VERSION,
+        "runs": len(runs),
+        "best_metric": BEST_METRIC,
+        "models": [
+            {"model": model, "runs": len(model_runs), "best": json_safe(max(model_runs, key=_score)),
+             "latest": json_safe(model_runs[-1])}
+            for model, model_runs in sorted(by_model.items())
+        ],
+        "history": sorted(name for name in files if name.startswith("history/")),
+        "shards": sorted(name for name in files if name.startswith("runs/")),
+    }
+    return files
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def encodings() -> Dict[str, object]:
+    """Suffix -> compress(bytes) of every precompressed copy that can be made here"""
+    found = {".gz": lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+    brotli = _brotli()
+    if brotli is not None:
+        found[".br"] = lambda data: brotli.compress(data, quality=11)
+    return found
+
+
+def write_if_changed(path, data: bytes) -> bool:
+    """Replace path with data unless it already holds exactly that; True if written"""
+    path = Path(path)
+    try:
+        if path.stat().st_size == len(data) and path.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+    return True
+
+
+def _load_manifest(output_dir: Path) -> Dict:
+    try:
+        with open(output_dir / MANIFEST_FILE) as f:
+            manifest = json.load(f)
+        return manifest if manifest.get("version") == BUNDLE_VERSION else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def export_bundle(runs: List[Dict], output_dir) -> Dict[str, int]:
+    """Write the bundle for runs into output_dir, touching only changed files; returns counts"""
+    output_dir = Path(output_dir)
+    previous = _load_manifest(output_dir).get("files", {})
+    compressors = encodings()
+    now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    entries, written, kept = {}, 0, 0
+    for name, content in sorted(build_bundle(runs).items()):
+        data = compact_json(content)
+        digest = hashlib.sha256(data).hexdigest()
+        path = output_dir / name
+        old = previous.get(name)
+        unchanged = (old is not None and old["sha256"] == digest and path.exists()
+                     and all(Path(f"{path}{suffix}").exists() for suffix in compressors))
+        if unchanged:
+            entries[name] = old
+            kept += 1
+            continue
+        write_if_changed(path, data)
+        entry = {"sha256": digest, "bytes": len(data), "updated": now}
+        for suffix, compress in compressors.items():
+            packed = compress(data)
+            write_if_changed(f"{path}{suffix}", packed)
+            entry[f"bytes{suffix}"] = len(packed)
+        entries[name] = entry
+        written += 1
+
+    # Shards and histories that no longer have runs
+    removed = 0
+    for name in set(previous) - set(entries):
+        for suffix in ["", ".gz", ".br"]:
+            stale = output_dir / f"{name}{suffix}"
+            if stale.exists():
+                stale.unlink()
+        removed += 1
+
+    manifest = {"version": BUNDLE_VERSION, "files": entries}
+    write_if_changed(output_dir / MANIFEST_FILE, json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"))
+    return {"written": written, "unchanged": kept, "removed": removed}
+
+
+def bundle_size(output_dir, suffix: str = "") -> int:
+    """Bytes of the bundle files (or of their suffix copies) listed in the manifest"""
+    files = _load_manifest(Path(output_dir)).get("files", {})
+    return sum(entry.get(f"bytes{suffix}", 0) for entry in files.values())
+
+
+def main(location: Optional[str] = None, output_dir=None):
+    source = open_source(location or default_location(), Path(__file__).parent)
+    if not source.exists():
+        print(f"Error: MLflow runs source not found: {source}")
+        return
+    output_dir = output_dir or Path(__file__).parent.parent / "frontend" / "public" / "data" / "bundle"
+    runs = source.runs()
+    counts = export_bundle(runs, output_dir)
+    print(f"✓ Bundle for {len(runs)} runs in {output_dir}: {counts['written']} files written, "
+          f"{counts['unchanged']} unchanged, {counts['removed']} removed "
+          f"({bundle_size(output_dir) / 1024:.1f} KB, {bundle_size(output_dir, '.gz') / 1024:.1f} KB gzipped)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the compact dashboard data bundle")
+    parser.add_argument("location", nargs="?", default=None,
+                        help="mlruns directory or sqlite:/// store (default: MLFLOW_TRACKING_URI or mlruns)")
+    parser.add_argument("--output", default=None, help="Bundle directory (default: frontend/public/data/bundle)")
+    args = parser.parse_args()
+    main(args.location, args.output)
@@ -2,93 +2,41 @@
 """
 Generate static metrics JSON file from MLflow runs
 Run this script whenever you update your models to regenerate the metrics
+(reads mlruns/, or the SQLite store in MLFLOW_TRACKING_URI or the first argument)
+and update the compact dashboard bundle in public/data/bundle/ (dashboard_bundle.py)
 """
 
-import os
-import json
+import sys
 from pathlib import Path
 
-def read_metric_file(file_path):
-    """Read metric value from MLflow metric file"""
-    try:
-        with open(file_path, 'r') as f:
-            lines = f.readlines()
-            if lines:
-                parts = lines[0].strip().split()
-                if len(parts) >= 2:
-                    return float(parts[1])
-    except Exception as e:
-        print(f"Error reading {file_path}: {e}")
-    return 0.0
+from metrics_sources import default_location, open_source
+from dashboard_bundle import compact_json, export_bundle, json_safe, write_if_changed
 
-def read_param_file(file_path):
-    """Read parameter value from MLflow param file"""
-    try:
-        with open(file_path, 'r') as f:
-            return f.read().strip()
-    except Exception as e:
-        print(f"Error reading {file_path}: {e}")
-    return ""
-
-def generate_metrics_json():
+def generate_metrics_json(location=None):
     """Generate metrics.json from MLflow runs"""
-    metrics_list = []
-    
-    # Path to mlruns
-    mlruns_path = Path(__file__).parent / "mlruns" / "0"
+    # mlruns tree or sqlite:/// store, relative to this directory
+    source = open_source(location or default_location(), Path(__file__).parent)
     
-    if not mlruns_path.exists():
-        print(f"Error: MLflow runs path not found: {mlruns_path}")
+    if not source.exists():
+        print(f"Error: MLflow runs source not found: {source}")
         return
     
-    print(f"Reading metrics from: {mlruns_path}")
+    print(f"Reading metrics from: {source}")
     
-    # Iterate through all run directories
-    for run_dir in mlruns_path.iterdir():
-        if not run_dir.is_dir() or run_dir.name in ['meta.yaml', 'models']:
-            continue
-        
-        metrics_dir = run_dir / "metrics"
-        params_dir = run_dir / "params"
-        
-        if not metrics_dir.exists() or not params_dir.exists():
-            continue
-        
-        try:
-            # Read model name
-            model_file = params_dir / "model"
-            if not model_file.exists():
-                continue
-            
-            model_name = read_param_file(model_file)
-            
-            # Read all metrics
-            metric_data = {
-                "model": model_name,
-                "train_rmse": read_metric_file(metrics_dir / "train_rmse"),
-                "train_mae": read_metric_file(metrics_dir / "train_mae"),
-                "train_r2": read_metric_file(metrics_dir / "train_r2"),
-                "test_rmse": read_metric_file(metrics_dir / "test_rmse"),
-                "test_mae": read_metric_file(metrics_dir / "test_mae"),
-                "test_r2": read_metric_file(metrics_dir / "test_r2"),
-                "mlflow_run_id": run_dir.name,
-            }
-            
-            metrics_list.append(metric_data)
-            print(f"✓ Processed {model_name} (run: {run_dir.name[:8]}...)")
-            
-        except Exception as e:
-            print(f"Error processing run {run_dir.name}: {e}")
+    metrics_list = source.runs()
+    for metric_data in metrics_list:
+        print(f"✓ Processed {metric_data['model']} (run: {metric_data['mlflow_run_id'][:8]}...)")
     
-    # Save to frontend public directory
-    output_path = Path(__file__).parent.parent / "frontend" / "public" / "metrics.json"
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    with open(output_path, 'w') as f:
-        json.dump(metrics_list, f, indent=2)
+    # Save to frontend public directory (compact, and left alone when nothing changed)
+    public_dir = Path(__file__).parent.parent / "frontend" / "public"
+    output_path = public_dir / "metrics.json"
+    write_if_changed(output_path, compact_json([json_safe(m) for m in metrics_list]))
     
     print(f"\n✓ Generated metrics.json with {len(metrics_list)} model runs")
     print(f"✓ Saved to: {output_path}")
 
+    counts = export_bundle(metrics_list, public_dir / "data" / "bundle")
+    print(f"✓ Bundle: {counts['written']} files written, {counts['unchanged']} unchanged")
+
 if __name__ == "__main__":
-    generate_metrics_json()
+    generate_metrics_json(sys.argv[1] if len(sys.argv) > 1 else None)
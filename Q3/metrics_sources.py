@@ -0,0 +1,302 @@
+"""
+Pluggable sources of MLflow run metrics.
+
+Every source returns runs in the shape `mlruns_scanner.scan_run` produces (model,
+metric keys, cost keys, run id, experiment, data_version, start_time), across
+every experiment unless told otherwise:
+
+- FileStoreSource reads an `mlruns/` FileStore tree with the parallel scanner.
+- SqliteSource queries a SQLite MLflow tracking store (`sqlite:///mlflow.db`,
+  filled by MLflow itself or by migrate_mlruns.py). Like the file store it
+  takes the first logged value of each metric (or, with latest=True, the
+  value in `latest_metrics`) and filters by experiment and params in SQL
+  through MLflow's run_uuid indexes, so no file is read per run.
+
+Both also expose `signatures()` and `load()` for the backend's incremental
+MetricsIndex: a cheap per-run change signature, then a reload of just the
+runs whose signature changed. `model_dir()` finds the model a run logged with
+`mlflow.sklearn.log_model`, for the backend's model registry.
+"""
+
+import os
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from urllib.parse import urlparse
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from mlruns_scanner import (COST_KEYS, METRIC_KEYS, SKIP_ENTRIES, list_experiments, list_runs,
+                            read_param, scan_run_paths)
+
+SQLITE_PREFIX = "sqlite:///"
+
+# Run ids per IN (...) clause, below SQLite's default bound-parameter limit
+SQL_CHUNK = 500
+
+# Pickle written by mlflow.sklearn.log_model inside the model directory
+MODEL_FILE = "model.pkl"
+
+
+def run_signature(run_path: str) -> Optional[Tuple[int, int, int]]:
+    """Return the mtimes that change whenever MLflow writes to a run
+
+    Directory mtimes only change when a file is added or removed, which is enough:
+    runs carry each metric's first value, and appending a later one leaves it alone.
+    """
+    try:
+        return (
+            os.stat(run_path).st_mtime_ns,
+            os.stat(os.path.join(run_path, "metrics")).st_mtime_ns,
+            os.stat(os.path.join(run_path, "params")).st_mtime_ns,
+        )
+    except OSError:
+        return None
+
+
+class FileStoreSource:
+    """MLflow FileStore tree (mlruns/<experiment>/<run>)"""
+
+    def __init__(self, mlruns_path):
+        self.mlruns_path = Path(mlruns_path)
+        # experiment id -> (models/ directory mtime, run id -> logged model directory)
+        self._model_dirs: Dict[str, Tuple[Optional[int], Dict[str, Path]]] = {}
+
+    def __str__(self) -> str:
+        return str(self.mlruns_path)
+
+    def exists(self) -> bool:
+        return self.mlruns_path.exists()
+
+    def runs(self, experiment_ids: Optional[Iterable[str]] = None, params: Optional[Dict[str, str]] = None,
+             latest: bool = False) -> List[Dict]:
+        """Model runs of the given experiments (default: all) whose params match"""
+        if experiment_ids is None:
+            experiment_ids = list_experiments(self.mlruns_path)
+        run_paths = []
+        for experiment_id in experiment_ids:
+            for run_path in list_runs(self.mlruns_path / str(experiment_id)):
+                if all(read_param(os.path.join(run_path, "params", key)) == str(value)
+                       for key, value in (params or {}).items()):
+                    run_paths.append(run_path)
+        return [run for run in scan_run_paths(run_paths, latest) if run is not None]
+
+    def signatures(self) -> Dict[str, Tuple[str, object]]:
+        """(run path, mtime signature) of every run directory, keyed by '<experiment>/<run>'"""
+        found = {}
+        for experiment_id in list_experiments(self.mlruns_path):
+            try:
+                with os.scandir(self.mlruns_path / experiment_id) as it:
+                    for entry in it:
+                        if entry.name in SKIP_ENTRIES or not entry.is_dir():
+                            continue
+                        signature = run_signature(entry.path)
+                        if signature is not None:
+                            found[f"{experiment_id}/{entry.name}"] = (entry.path, signature)
+            except FileNotFoundError:
+                continue
+        return found
+
+    def load(self, locators: List[str]) -> List[Optional[Dict]]:
+        """Runs for locators returned by signatures(), in order; None for non-model runs"""
+        return scan_run_paths(locators)
+
+    def model_dir(self, experiment_id: str, run_id: str) -> Optional[Path]:
+        """Directory holding the run's logged model.pkl, or None if it has none (yet)"""
+        # MLflow < 3 logs models into the run's own artifacts
+        legacy = self.mlruns_path / str(experiment_id) / run_id / "artifacts" / "model"
+        if (legacy / MODEL_FILE).exists():
+            return legacy
+        return self._logged_models(str(experiment_id)).get(run_id)
+
+    def _logged_models(self, experiment_id: str) -> Dict[str, Path]:
+        """run id -> artifacts of its newest logged model (MLflow 3 <experiment>/models/), cached by mtime"""
+        models_path = self.mlruns_path / experiment_id / "models"
+        stat = _stat(models_path)
+        signature = stat.st_mtime_ns if stat else None
+        cached = self._model_dirs.get(experiment_id)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        newest = {}
+        if stat is not None:
+            with os.scandir(models_path) as it:
+                for entry in it:
+                    meta = _read_meta(os.path.join(entry.path, "meta.yaml"), ("source_run_id", "creation_timestamp"))
+                    run_id, created = meta.get("source_run_id"), int(meta.get("creation_timestamp") or 0)
+                    if run_id and (run_id not in newest or created > newest[run_id][0]) and \
+                            os.path.exists(os.path.join(entry.path, "artifacts", MODEL_FILE)):
+                        newest[run_id] = (created, Path(entry.path) / "artifacts")
+        found = {run_id: path for run_id, (_, path) in newest.items()}
+        self._model_dirs[experiment_id] = (signature, found)
+        return found
+
+
+class SqliteSource:
+    """SQLite MLflow tracking store, queried read-only"""
+
+    # Active model runs of active experiments, with the params every run dict carries
+    RUNS_SQL = """
+        SELECT r.run_uuid, r.experiment_id, r.start_time, pm.value, pd.value
+        FROM runs r
+        JOIN experiments e ON e.experiment_id = r.experiment_id AND e.lifecycle_stage = 'active'
+        JOIN params pm ON pm.run_uuid = r.run_uuid AND pm.key = 'model'
+        LEFT JOIN params pd ON pd.run_uuid = r.run_uuid AND pd.key = 'data_version'
+    """
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self._db_stat = None
+        self._signatures: Dict[str, Tuple[str, object]] = {}
+
+    def __str__(self) -> str:
+        return f"{SQLITE_PREFIX}{self.db_path}"
+
+    def exists(self) -> bool:
+        return self.db_path.exists()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+
+    def runs(self, experiment_ids: Optional[Iterable[str]] = None, params: Optional[Dict[str, str]] = None,
+             latest: bool = False) -> List[Dict]:
+        """Model runs of the given experiments (default: all) whose params match"""
+        sql, args = self.RUNS_SQL, []
+        for i, (key, value) in enumerate((params or {}).items()):
+            sql += f" JOIN params f{i} ON f{i}.run_uuid = r.run_uuid AND f{i}.key = ? AND f{i}.value = ?"
+            args += [key, str(value)]
+        sql += " WHERE r.lifecycle_stage = 'active'"
+        if experiment_ids is not None:
+            experiment_ids = [int(e) for e in experiment_ids]
+            sql += f" AND r.experiment_id IN ({','.join('?' * len(experiment_ids))})"
+            args += experiment_ids
+        with closing(self._connect()) as db:
+            return self._with_metrics(db, db.execute(sql, args).fetchall(), latest)
+
+    def _with_metrics(self, db: sqlite3.Connection, rows: List[tuple], latest: bool = False) -> List[Dict]:
+        """Run dicts for RUNS_SQL rows, with each metric's first logged value or its latest one"""
+        runs = {}
+        for run_uuid, experiment_id, start_time, model, data_version in rows:
+            run = {"model": model, **{key: 0.0 for key in METRIC_KEYS}, **{key: None for key in COST_KEYS}}
+            run.update(mlflow_run_id=run_uuid, experiment_id=str(experiment_id),
+                       data_version=data_version or None, start_time=start_time)
+            runs[run_uuid] = run
+
+        keys = METRIC_KEYS + COST_KEYS
+        run_ids = list(runs)
+        for start in range(0, len(run_ids), SQL_CHUNK):
+            chunk = run_ids[start:start + SQL_CHUNK]
+            where = f"run_uuid IN ({','.join('?' * len(chunk))}) AND key IN ({','.join('?' * len(keys))})"
+            if latest:
+                sql = f"SELECT run_uuid, key, value, is_nan FROM latest_metrics WHERE {where}"
+            else:
+                # First value logged, as in the metric file's first line
+                sql = f"""
+                    SELECT run_uuid, key, value, is_nan FROM (
+                        SELECT run_uuid, key, value, is_nan, ROW_NUMBER() OVER (
+                            PARTITION BY run_uuid, key ORDER BY timestamp, step) AS n
+                        FROM metrics WHERE {where}
+                    ) WHERE n = 1
+                """
+            for run_uuid, key, value, is_nan in db.execute(sql, chunk + keys):
+                runs[run_uuid][key] = float("nan") if is_nan else value
+        return list(runs.values())
+
+    def signatures(self) -> Dict[str, Tuple[str, object]]:
+        """(run id, signature) of every active run, re-queried only when the database files change"""
+        db_stat = tuple(
+            (s.st_mtime_ns, s.st_size) if s else None
+            for s in (_stat(self.db_path), _stat(f"{self.db_path}-wal"))
+        )
+        if db_stat == self._db_stat:
+            return self._signatures
+
+        with closing(self._connect()) as db:
+            rows = db.execute("""
+                SELECT r.experiment_id, r.run_uuid, r.status, r.end_time,
+                       (SELECT COUNT(*) FROM latest_metrics lm WHERE lm.run_uuid = r.run_uuid),
+                       (SELECT COUNT(*) FROM params p WHERE p.run_uuid = r.run_uuid)
+                FROM runs r
+                JOIN experiments e ON e.experiment_id = r.experiment_id AND e.lifecycle_stage = 'active'
+                WHERE r.lifecycle_stage = 'active'
+            """).fetchall()
+        self._signatures = {f"{row[0]}/{row[1]}": (row[1], row[2:]) for row in rows}
+        self._db_stat = db_stat
+        return self._signatures
+
+    def load(self, locators: List[str]) -> List[Optional[Dict]]:
+        """Runs for run ids returned by signatures(), in order; None for non-model runs"""
+        found = {}
+        with closing(self._connect()) as db:
+            for start in range(0, len(locators), SQL_CHUNK):
+                chunk = locators[start:start + SQL_CHUNK]
+                rows = db.execute(
+                    f"{self.RUNS_SQL} WHERE r.run_uuid IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((run["mlflow_run_id"], run) for run in self._with_metrics(db, rows))
+        return [found.get(run_uuid) for run_uuid in locators]
+
+    def model_dir(self, experiment_id: str, run_id: str) -> Optional[Path]:
+        """Local directory holding the run's logged model.pkl, or None if it has none (yet)"""
+        with closing(self._connect()) as db:
+            try:
+                row = db.execute(
+                    "SELECT artifact_location FROM logged_models WHERE source_run_id = ? "
+                    "AND lifecycle_stage = 'active' ORDER BY creation_timestamp_ms DESC LIMIT 1", (run_id,)
+                ).fetchone()
+            except sqlite3.OperationalError:
+                # Stores created before MLflow 3 have no logged_models table
+                row = None
+            if row is None:
+                row = db.execute("SELECT artifact_uri || '/model' FROM runs WHERE run_uuid = ?", (run_id,)).fetchone()
+        path = _local_path(row[0]) if row else None
+        return path if path is not None and (path / MODEL_FILE).exists() else None
+
+
+def _stat(path):
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+def _read_meta(path, keys) -> Dict[str, str]:
+    """Top-level scalar fields of a meta.yaml, without a YAML parser"""
+    found = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in keys:
+                    found[key] = value.strip().strip("'\"")
+    except OSError:
+        pass
+    return found
+
+
+def _local_path(uri) -> Optional[Path]:
+    """Filesystem path of a file:// (or plain path) artifact URI; None for remote stores"""
+    parsed = urlparse(uri)
+    if parsed.scheme == "file":
+        # urllib.request pulls in http.client and ssl; only model lookups need it
+        from urllib.request import url2pathname
+        return Path(url2pathname(parsed.path))
+    if parsed.scheme == "" or len(parsed.scheme) == 1:
+        # A plain path (a single letter is a Windows drive)
+        return Path(uri)
+    return None
+
+
+def open_source(location, base_dir=None):
+    """FileStoreSource for a path, SqliteSource for a sqlite:/// URI (relative paths from base_dir)"""
+    location = str(location)
+    if location.startswith(SQLITE_PREFIX):
+        db_path = Path(location[len(SQLITE_PREFIX):])
+        return SqliteSource(db_path if db_path.is_absolute() or base_dir is None else Path(base_dir) / db_path)
+    path = Path(location)
+    return FileStoreSource(path if path.is_absolute() or base_dir is None else Path(base_dir) / path)
+
+
+def default_location(fallback: str = "mlruns") -> str:
+    """MLFLOW_TRACKING_URI when it points at a SQLite store, else the FileStore fallback"""
+    uri = os.getenv("MLFLOW_TRACKING_URI", "")
+    return uri if uri.startswith(SQLITE_PREFIX) else fallback
@@ -0,0 +1,183 @@
+"""
+Import an MLflow FileStore (mlruns/) into a SQLite tracking store.
+
+    python migrate_mlruns.py mlruns mlflow.db [--experiments 0 3]
+
+The schema is created by MLflow itself (the same tables and indexes
+`mlflow server --backend-store-uri sqlite:///mlflow.db` would use), then
+experiments, runs, metric histories, latest metrics, params and tags are
+bulk-inserted. Runs already in the database are skipped, so the import can be
+re-run after more training to add just the new runs. Afterwards point
+training at the store with MLFLOW_TRACKING_URI=sqlite:///mlflow.db and the
+backend with METRICS_SOURCE=sqlite:///mlflow.db.
+"""
+
+import os
+import math
+import sqlite3
+import argparse
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import yaml
+
+from mlruns_scanner import list_experiments, list_runs
+
+# mlflow.entities.RunStatus / SourceType values as stored in FileStore meta.yaml
+RUN_STATUS = {1: "RUNNING", 2: "SCHEDULED", 3: "FINISHED", 4: "FAILED", 5: "KILLED"}
+SOURCE_TYPE = {1: "NOTEBOOK", 2: "JOB", 3: "PROJECT", 4: "LOCAL", 1000: "UNKNOWN"}
+
+# Runs read and inserted per transaction
+BATCH_RUNS = 500
+
+
+def create_schema(db_path):
+    """Create (or upgrade) the MLflow tables by opening the store once through MLflow"""
+    from mlflow.store.tracking.sqlalchemy_store import SqlAlchemyStore
+
+    artifact_root = Path(db_path).resolve().parent / "mlartifacts"
+    store = SqlAlchemyStore(f"sqlite:///{Path(db_path).resolve()}", artifact_root.as_uri())
+    store.engine.dispose()
+    with closing(sqlite3.connect(db_path)) as db:
+        # MetricsSource queries runs by experiment; MLflow only indexes the metric/param tables
+        db.execute("CREATE INDEX IF NOT EXISTS index_runs_experiment_id ON runs (experiment_id)")
+        db.commit()
+
+
+def _read_yaml(path):
+    try:
+        with open(path) as f:
+            return yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        return {}
+
+
+def _walk_files(root):
+    """(key, path) of every file under root; nested directories give keys like 'a/b'"""
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            yield os.path.relpath(path, root).replace(os.sep, "/"), path
+
+
+def _read_text(path):
+    with open(path) as f:
+        return f.read()
+
+
+def read_run(run_path):
+    """Rows for one run directory: (run, metrics, latest_metrics, params, tags)"""
+    meta = _read_yaml(os.path.join(run_path, "meta.yaml"))
+    run_uuid = str(meta.get("run_id") or meta.get("run_uuid") or os.path.basename(run_path))
+    experiment_id = int(meta.get("experiment_id", os.path.basename(os.path.dirname(run_path))))
+
+    metrics, latest = [], {}
+    for key, path in _walk_files(os.path.join(run_path, "metrics")):
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 2:
+                    continue
+                timestamp, value = int(parts[0]), float(parts[1])
+                step = int(parts[2]) if len(parts) > 2 else 0
+                is_nan = math.isnan(value)
+                row = (key, 0.0 if is_nan else value, timestamp, run_uuid, step, is_nan)
+                metrics.append(row)
+                # MLflow's latest value: highest step, then timestamp, then value
+                if key not in latest or (step, timestamp, row[1]) > (latest[key][4], latest[key][2], latest[key][1]):
+                    latest[key] = row
+
+    params = [(key, _read_text(path).strip(), run_uuid)
+              for key, path in _walk_files(os.path.join(run_path, "params"))]
+    tags = [(key, _read_text(path), run_uuid)
+            for key, path in _walk_files(os.path.join(run_path, "tags"))]
+    run_name = meta.get("run_name") or next((value for key, value, _ in tags if key == "mlflow.runName"), "")
+
+    run = (
+        run_uuid, run_name, SOURCE_TYPE.get(meta.get("source_type"), "UNKNOWN"),
+        meta.get("source_name") or "", meta.get("entry_point_name") or "", meta.get("user_id") or "",
+        RUN_STATUS.get(meta.get("status"), "FINISHED"), meta.get("start_time"), meta.get("end_time"),
+        meta.get("source_version") or "", meta.get("lifecycle_stage") or "active",
+        meta.get("artifact_uri") or "", experiment_id,
+    )
+    return run, metrics, list(latest.values()), params, tags
+
+
+def _insert_experiments(db, mlruns_path, experiment_ids):
+    rows = []
+    for experiment_id in experiment_ids:
+        meta = _read_yaml(Path(mlruns_path) / experiment_id / "meta.yaml")
+        rows.append((
+            int(experiment_id), meta.get("name") or f"experiment-{experiment_id}",
+            meta.get("artifact_location") or "", meta.get("lifecycle_stage") or "active",
+            meta.get("creation_time"), meta.get("last_update_time"),
+        ))
+    db.executemany(
+        "INSERT OR IGNORE INTO experiments (experiment_id, name, artifact_location, lifecycle_stage, "
+        "creation_time, last_update_time) VALUES (?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+
+
+def _insert_runs(db, rows):
+    runs, metrics, latest, params, tags = ([] for _ in range(5))
+    for run, run_metrics, run_latest, run_params, run_tags in rows:
+        runs.append(run)
+        metrics += run_metrics
+        latest += run_latest
+        params += run_params
+        tags += run_tags
+    db.executemany(
+        "INSERT INTO runs (run_uuid, name, source_type, source_name, entry_point_name, user_id, status, "
+        "start_time, end_time, source_version, lifecycle_stage, artifact_uri, experiment_id) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        runs,
+    )
+    # A metric logged twice with the same (key, timestamp, step, value) is one row in MLflow
+    db.executemany(
+        "INSERT OR IGNORE INTO metrics (key, value, timestamp, run_uuid, step, is_nan) VALUES (?, ?, ?, ?, ?, ?)",
+        metrics,
+    )
+    db.executemany(
+        "INSERT INTO latest_metrics (key, value, timestamp, run_uuid, step, is_nan) VALUES (?, ?, ?, ?, ?, ?)",
+        latest,
+    )
+    db.executemany("INSERT INTO params (key, value, run_uuid) VALUES (?, ?, ?)", params)
+    db.executemany("INSERT INTO tags (key, value, run_uuid) VALUES (?, ?, ?)", tags)
+
+
+def migrate(mlruns_path, db_path, experiment_ids=None, max_workers=None):
+    """Import the runs of the given experiments (default: all) that are not in the database yet"""
+    create_schema(db_path)
+    experiment_ids = [str(e) for e in (experiment_ids or list_experiments(mlruns_path))]
+
+    with closing(sqlite3.connect(db_path)) as db:
+        known = {row[0] for row in db.execute("SELECT run_uuid FROM runs")}
+        _insert_experiments(db, mlruns_path, experiment_ids)
+        db.commit()
+
+        run_paths = [path for experiment_id in experiment_ids
+                     for path in list_runs(Path(mlruns_path) / experiment_id)
+                     if os.path.basename(path) not in known]
+        print(f"Importing {len(run_paths)} runs from {mlruns_path} into {db_path} "
+              f"({len(known)} already there)")
+
+        with ThreadPoolExecutor(max_workers=max_workers or min(32, (os.cpu_count() or 1) * 4)) as pool:
+            for start in range(0, len(run_paths), BATCH_RUNS):
+                rows = list(pool.map(read_run, run_paths[start:start + BATCH_RUNS]))
+                _insert_runs(db, rows)
+                db.commit()
+                print(f"✓ {min(start + BATCH_RUNS, len(run_paths))}/{len(run_paths)} runs")
+    return len(run_paths)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import an mlruns/ FileStore into a SQLite MLflow store")
+    parser.add_argument("mlruns", nargs="?", default="mlruns", help="FileStore directory")
+    parser.add_argument("db", nargs="?", default="mlflow.db", help="SQLite database (created if missing)")
+    parser.add_argument("--experiments", nargs="+", help="Experiment IDs to import (default: all)")
+    args = parser.parse_args()
+
+    migrate(args.mlruns, args.db, args.experiments)
+    print(f"✅ Done. Use MLFLOW_TRACKING_URI=sqlite:///{args.db} and METRICS_SOURCE=sqlite:///{args.db}")
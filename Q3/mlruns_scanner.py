@@ -0,0 +1,140 @@
+"""
+Fast scanner for MLflow FileStore run directories (mlruns/<experiment>/<run>).
+
+Shared by export_metrics.py, generate_metrics.py and the backend API. Runs are
+listed with os.scandir, every metric file is read only as far as needed (the
+first line, or the last line for the latest step) and runs are read in
+parallel on a thread pool, across every experiment in the store.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+METRIC_KEYS = ["train_rmse", "train_mae", "train_r2", "test_rmse", "test_mae", "test_r2"]
+
+# Training cost logged by train_and_save(); None for runs that predate it
+COST_KEYS = ["fit_seconds", "predict_seconds", "peak_mem_mb", "train_rows_per_sec"]
+
+# Entries in an experiment directory that are not runs
+SKIP_ENTRIES = {"meta.yaml", "models", "tags", "datasets"}
+
+# Enough for the last line of a metric file ("<timestamp> <value> <step>")
+TAIL_BYTES = 256
+
+
+def read_metric(metric_file, latest: bool = False) -> float:
+    """Read a metric value: the first logged value, or the latest one"""
+    try:
+        with open(metric_file, "rb") as f:
+            if latest:
+                size = f.seek(0, os.SEEK_END)
+                f.seek(max(0, size - TAIL_BYTES))
+                lines = f.read().split(b"\n")
+                line = next((l for l in reversed(lines) if l.strip()), b"")
+            else:
+                line = f.readline()
+        # Format: timestamp value step
+        parts = line.split()
+        if len(parts) >= 2:
+            return float(parts[1])
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Error reading metric file {metric_file}: {e}")
+    return 0.0
+
+
+def read_param(param_file) -> str:
+    """Read a parameter value"""
+    try:
+        with open(param_file, "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Error reading param file {param_file}: {e}")
+    return ""
+
+
+def read_start_time(meta_file) -> Optional[int]:
+    """Run start time (ms since epoch) from a run's meta.yaml, without a YAML parser"""
+    try:
+        with open(meta_file, "r") as f:
+            for line in f:
+                if line.startswith("start_time:"):
+                    value = line.split(":", 1)[1].strip()
+                    return int(value) if value.isdigit() else None
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Error reading run meta {meta_file}: {e}")
+    return None
+
+
+def list_experiments(mlruns_path) -> List[str]:
+    """IDs of every experiment directory in the store"""
+    try:
+        with os.scandir(mlruns_path) as it:
+            # Experiment IDs are numeric; skips .trash and the model registry's "models"
+            return sorted((e.name for e in it if e.is_dir() and e.name.isdigit()), key=int)
+    except FileNotFoundError:
+        return []
+
+
+def list_runs(experiment_path) -> List[str]:
+    """Run directory paths of one experiment"""
+    try:
+        with os.scandir(experiment_path) as it:
+            return [e.path for e in it if e.name not in SKIP_ENTRIES and e.is_dir()]
+    except FileNotFoundError:
+        return []
+
+
+def scan_run(run_path, latest: bool = False, metric_keys: Iterable[str] = METRIC_KEYS) -> Optional[Dict]:
+    """Read the model name and metrics of one run; None if it is not a model run"""
+    run_path = str(run_path)
+    model_name = read_param(os.path.join(run_path, "params", "model"))
+    if not model_name:
+        return None
+
+    metrics_dir = os.path.join(run_path, "metrics")
+    run = {"model": model_name}
+    for key in metric_keys:
+        run[key] = read_metric(os.path.join(metrics_dir, key), latest)
+    try:
+        logged = set(os.listdir(metrics_dir))
+    except OSError:
+        logged = set()
+    for key in COST_KEYS:
+        run[key] = read_metric(os.path.join(metrics_dir, key), latest) if key in logged else None
+    run["mlflow_run_id"] = os.path.basename(run_path)
+    run["experiment_id"] = os.path.basename(os.path.dirname(run_path))
+    run["data_version"] = read_param(os.path.join(run_path, "params", "data_version")) or None
+    run["start_time"] = read_start_time(os.path.join(run_path, "meta.yaml"))
+    return run
+
+
+def scan_run_paths(run_paths: List[str], latest: bool = False, max_workers: Optional[int] = None,
+                   metric_keys: Iterable[str] = METRIC_KEYS) -> List[Optional[Dict]]:
+    """scan_run over many runs on a thread pool, results in input order"""
+    metric_keys = list(metric_keys)
+    if len(run_paths) < 8:
+        return [scan_run(p, latest, metric_keys) for p in run_paths]
+    with ThreadPoolExecutor(max_workers=max_workers or min(32, (os.cpu_count() or 1) * 4)) as pool:
+        return list(pool.map(lambda p: scan_run(p, latest, metric_keys), run_paths))
+
+
+def scan_runs(mlruns_path, experiment_ids: Optional[Iterable[str]] = None, latest: bool = False,
+              max_workers: Optional[int] = None, metric_keys: Iterable[str] = METRIC_KEYS) -> List[Dict]:
+    """Metrics of every model run in the given experiments (default: all of them)"""
+    mlruns_path = Path(mlruns_path)
+    if experiment_ids is None:
+        experiment_ids = list_experiments(mlruns_path)
+
+    run_paths = []
+    for experiment_id in experiment_ids:
+        run_paths.extend(list_runs(mlruns_path / str(experiment_id)))
+
+    return [run for run in scan_run_paths(run_paths, latest, max_workers, metric_keys) if run is not None]
@@ -0,0 +1,101 @@
+"""
+Background rendering and upload of training artifacts.
+
+Plots and MLflow artifact/model uploads are queued on a worker thread so that
+`train_and_save()` can write the model file and metrics JSON first and move on
+to the next model. Figures are drawn on an explicit Agg canvas rather than
+through pyplot, so rendering off the main thread is safe and needs no display.
+matplotlib is imported by the first plot, on the worker thread, and never when
+plots are turned off with TRAIN_PLOTS=0.
+"""
+
+import os
+import queue
+import threading
+import traceback
+
+import numpy as np
+
+# Set to 0 to skip plots; process-pool workers inherit it
+PLOTS_ENV = "TRAIN_PLOTS"
+
+# Above this many test points the residual plot switches from a scatter to a hexbin
+SCATTER_MAX_POINTS = 10000
+
+
+class ArtifactWorker:
+    """Single background thread running queued artifact tasks in order"""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.errors = []
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._queue.put((fn, args, kwargs))
+
+    def drain(self):
+        """Block until every queued task has finished"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            fn, args, kwargs = self._queue.get()
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                self.errors.append(e)
+                print(f"Error in background artifact task {getattr(fn, '__name__', fn)}: {e}")
+                traceback.print_exc()
+            finally:
+                self._queue.task_done()
+
+
+def plots_enabled():
+    return os.getenv(PLOTS_ENV, "1") != "0"
+
+
+def _figure(figsize):
+    """Figure backed by a headless Agg canvas"""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def plot_residuals(y_true, y_pred, model_name, path):
+    """Actual vs predicted plot; large test sets are drawn as a hexbin density"""
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+    fig = _figure((6, 6))
+    ax = fig.add_subplot()
+    if len(y_true) > SCATTER_MAX_POINTS:
+        hb = ax.hexbin(y_true, y_pred, gridsize=80, bins="log", mincnt=1, cmap="viridis")
+        fig.colorbar(hb, ax=ax, label="log10(count)")
+    else:
+        ax.scatter(y_true, y_pred, alpha=0.6)
+    lo, hi = float(y_true.min()), float(y_true.max())
+    ax.plot([lo, hi], [lo, hi], "r--")
+    ax.set_xlabel("Actual CPU Usage")
+    ax.set_ylabel("Predicted CPU Usage")
+    ax.set_title(f"Residuals Plot ({model_name})")
+    fig.savefig(path)
+
+
+def plot_feature_importance(features, importance, model_name, feature_name_type, path):
+    """Horizontal bar chart of coefficients / feature importances, sorted by magnitude"""
+    importance = np.asarray(importance)
+    order = np.argsort(np.abs(importance))
+    fig = _figure((8, 6))
+    ax = fig.add_subplot()
+    ax.barh(np.asarray(features)[order], importance[order])
+    ax.set_xlabel(feature_name_type)
+    ax.set_title(f"{feature_name_type} ({model_name})")
+    fig.savefig(path)
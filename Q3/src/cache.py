@@ -0,0 +1,189 @@
+"""
+Local content-addressed cache for preprocess and train results.
+
+Outside DVC (CI, ad-hoc runs) the pipeline scripts look up their outputs by a
+key built from the input file's SHA-256, the source of the code that produces
+them and their configuration (feature list, model parameters). On a hit the
+stored processed data, model files and metrics are copied back instead of
+being recomputed. Entries live under PIPELINE_CACHE_DIR. The least recently
+used entries are evicted once the cache grows past PIPELINE_CACHE_MAX_MB.
+
+File hashes are remembered by path, size and mtime, so an unchanged multi-GB
+raw.csv is hashed once. The data hash also serves as the MLflow
+`data_version` when DVC_DATA_VERSION is not set.
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CACHE_DIR = os.getenv("PIPELINE_CACHE_DIR", ".pipeline-cache")
+CACHE_MAX_MB = float(os.getenv("PIPELINE_CACHE_MAX_MB", "5120"))
+
+ENTRY_FILE = "entry.json"
+HASHES_FILE = "hashes.json"
+
+# Bytes read per update when hashing files
+HASH_BLOCK_BYTES = 1 << 20
+
+# Hex digits of the data hash used as data_version
+DATA_VERSION_CHARS = 12
+
+
+def hash_file(path, block_bytes=HASH_BLOCK_BYTES):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_bytes), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_sources(names):
+    """Hash of the src/ modules that produce an output, so code edits invalidate its entries"""
+    digest = hashlib.sha256()
+    for name in sorted(names):
+        digest.update(name.encode())
+        digest.update(hash_file(os.path.join(SRC_DIR, name)).encode())
+    return digest.hexdigest()
+
+
+def dvc_data_version():
+    """DVC_DATA_VERSION when the pipeline runs under DVC, else None"""
+    version = os.getenv("DVC_DATA_VERSION")
+    return version if version and version != "unknown" else None
+
+
+def data_version(data_hash):
+    """DVC_DATA_VERSION when the pipeline runs under DVC, else the short data hash"""
+    return dvc_data_version() or data_hash[:DATA_VERSION_CHARS]
+
+
+def _size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(path) for name in names)
+    return os.path.getsize(path)
+
+
+def _copy(src, dest):
+    if os.path.isdir(src):
+        shutil.rmtree(dest, ignore_errors=True)
+        shutil.copytree(src, dest)
+    else:
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+        shutil.copy2(src, dest)
+
+
+class ContentCache:
+    """Directory of entries keyed by the hash of their inputs, evicted least recently used first"""
+
+    def __init__(self, root=CACHE_DIR, max_mb=CACHE_MAX_MB):
+        self.root = root
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.entries_dir = os.path.join(root, "entries")
+        os.makedirs(self.entries_dir, exist_ok=True)
+        self._hashes_path = os.path.join(root, HASHES_FILE)
+
+    @staticmethod
+    def key(**parts):
+        """Key for a set of JSON-serializable inputs"""
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def file_hash(self, path):
+        """SHA-256 of a file, reused while its size and mtime are unchanged"""
+        try:
+            with open(self._hashes_path) as f:
+                hashes = json.load(f)
+        except (OSError, ValueError):
+            hashes = {}
+        stat = os.stat(path)
+        real_path = os.path.realpath(path)
+        known = hashes.get(real_path)
+        if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            return known["sha256"]
+
+        digest = hash_file(path)
+        hashes[real_path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(hashes, f)
+        os.replace(tmp_path, self._hashes_path)
+        return digest
+
+    def restore(self, key, outputs):
+        """Copy a stored entry's files to their output paths; False on a miss
+
+        Outputs the entry does not have (e.g. a plot the cached run did not
+        produce) are removed, so no stale file from another run is left behind.
+        """
+        entry_path = os.path.join(self.entries_dir, key)
+        try:
+            with open(os.path.join(entry_path, ENTRY_FILE)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return False
+        for name, path in outputs.items():
+            if name in entry["files"]:
+                _copy(os.path.join(entry_path, name), path)
+            elif os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        # The entry file's mtime is its last use
+        os.utime(os.path.join(entry_path, ENTRY_FILE))
+        return True
+
+    def store(self, key, outputs, meta=None):
+        """Copy every existing output into a new entry, then evict down to the size limit"""
+        tmp_path = tempfile.mkdtemp(dir=self.entries_dir, prefix=".tmp-")
+        files = {}
+        for name, path in outputs.items():
+            if os.path.exists(path):
+                _copy(path, os.path.join(tmp_path, name))
+                files[name] = _size(path)
+        with open(os.path.join(tmp_path, ENTRY_FILE), "w") as f:
+            json.dump({"key": key, "created": time.time(), "files": files, "meta": meta or {}}, f, indent=4)
+
+        entry_path = os.path.join(self.entries_dir, key)
+        shutil.rmtree(entry_path, ignore_errors=True)
+        os.replace(tmp_path, entry_path)
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for key in os.listdir(self.entries_dir):
+            entry_file = os.path.join(self.entries_dir, key, ENTRY_FILE)
+            try:
+                with open(entry_file) as f:
+                    size = sum(json.load(f)["files"].values())
+                entries.append((os.path.getmtime(entry_file), size, key))
+            except (OSError, ValueError):
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(os.path.join(self.entries_dir, key), ignore_errors=True)
+            total -= size
+            print(f"Evicted cache entry {key[:DATA_VERSION_CHARS]} ({size / 2**20:.1f} MB)")
+
+
+def cached_run(stage, key_parts, outputs, compute, cache=None):
+    """Restore outputs from the cache, or compute and store them; returns True on a hit
+
+    outputs maps a name inside the entry to the path the stage writes it to.
+    """
+    cache = cache or ContentCache()
+    key = cache.key(stage=stage, **key_parts)
+    if cache.restore(key, outputs):
+        print(f"✓ {stage}: cache hit {key[:DATA_VERSION_CHARS]}, outputs restored without recomputing")
+        return True
+    compute()
+    cache.store(key, outputs, meta={"stage": stage, **key_parts})
+    return False
@@ -0,0 +1,224 @@
+"""
+Flattened tree ensembles for fast, light inference.
+
+`train_and_save()` converts the random forest and XGBoost models into a
+directory of flat NumPy arrays next to the pickle (`<name>_compiled/`). Every
+node of every tree becomes one slot in the feature, threshold, child and value
+arrays. children[node] holds the (right, left) pair, so the branch taken is
+children[node, x <= threshold]. Leaves point to themselves, so a batch walks all trees at once with
+one vectorized step per tree level. Loading maps the arrays read-only instead
+of unpickling sklearn/xgboost objects, and prediction needs NumPy only.
+
+Both libraries compare float32 features. sklearn sends `x <= threshold` left
+and XGBoost sends `x < split` left, so XGBoost splits are stored as the next
+float32 below the split. That way one `<=` test serves both.
+"""
+
+import os
+import json
+import shutil
+
+import numpy as np
+
+META_FILE = "meta.json"
+ARRAYS = ("roots", "feature", "threshold", "children", "default_left", "value")
+
+# Largest absolute difference from the original model's predictions accepted by verify()
+VERIFY_ATOL = 1e-4
+
+# Test rows export_compiled() checks the compiled model on
+VERIFY_ROWS = 10_000
+
+# Set to 1 (train.py --require-compiled) to fail instead of falling back to the pickle
+REQUIRE_ENV = "TRAIN_REQUIRE_COMPILED"
+
+# Rows per block when walking large batches (bounds the (rows, trees) index arrays)
+PREDICT_BLOCK_ROWS = 8192
+
+
+class CompiledForest:
+    """Sum (XGBoost) or mean (random forest) of flattened regression trees"""
+
+    def __init__(self, arrays, meta):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.meta = meta
+        self.kind = meta["kind"]
+        self.base_score = meta["base_score"]
+        self.max_depth = meta["max_depth"]
+        self.n_features_in_ = meta["n_features"]
+        self.feature_names = meta.get("feature_names")
+        # Trees are averaged for random forests and summed onto base_score for XGBoost
+        self._scale = 1.0 / len(self.roots) if meta["average"] else 1.0
+
+    @classmethod
+    def from_model(cls, model, feature_names=None):
+        """Flatten a fitted RandomForestRegressor or XGBRegressor"""
+        if hasattr(model, "estimators_"):
+            trees = [_sklearn_tree(est.tree_) for est in model.estimators_]
+            kind, base_score, average = "rf", 0.0, True
+        elif hasattr(model, "get_booster"):
+            trees, base_score = _xgb_trees(model.get_booster(), _best_iteration(model))
+            kind, average = "xgb", False
+        else:
+            raise TypeError(f"Cannot compile {type(model).__name__}: only tree ensembles are supported")
+
+        offsets = np.cumsum([0] + [len(t["feature"]) for t in trees])
+        arrays = {"roots": offsets[:-1].astype(np.int32)}
+        for name in ARRAYS[1:]:
+            parts = [t[name] + offset if name == "children" else t[name]
+                     for t, offset in zip(trees, offsets)]
+            arrays[name] = np.concatenate(parts)
+
+        meta = {
+            "kind": kind,
+            "n_trees": len(trees),
+            "n_nodes": int(offsets[-1]),
+            "n_features": int(model.n_features_in_),
+            "feature_names": list(feature_names) if feature_names is not None else None,
+            "max_depth": max(t["depth"] for t in trees),
+            "base_score": base_score,
+            "average": average,
+        }
+        return cls(arrays, meta)
+
+    def save(self, path):
+        """Write one .npy per array plus meta.json, replacing an existing directory"""
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name in ARRAYS:
+            np.save(os.path.join(tmp_path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(tmp_path, META_FILE), "w") as f:
+            json.dump(self.meta, f, indent=4)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Map the arrays read-only (pages are shared between processes serving the same model)"""
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in ARRAYS}
+        return cls(arrays, meta)
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, the model expects {self.n_features_in_}")
+        if len(X) <= PREDICT_BLOCK_ROWS:
+            return self._predict_block(X)
+        return np.concatenate([self._predict_block(X[start:start + PREDICT_BLOCK_ROWS])
+                               for start in range(0, len(X), PREDICT_BLOCK_ROWS)])
+
+    def _predict_block(self, X):
+        X = np.ascontiguousarray(X)
+        has_nan = bool(np.isnan(X).any())
+        row_start = (np.arange(len(X), dtype=np.int64) * X.shape[1])[:, None]
+        X = X.ravel()
+        children = self.children.ravel()
+        node = np.broadcast_to(self.roots, (len(row_start), len(self.roots)))
+        for _ in range(self.max_depth):
+            x = X.take(row_start + self.feature.take(node))
+            go_left = x <= self.threshold.take(node)
+            if has_nan:
+                go_left |= np.isnan(x) & self.default_left.take(node)
+            node = children.take(2 * node + go_left)
+        return self.value.take(node).sum(axis=1) * self._scale + self.base_score
+
+    def verify(self, model, X, atol=VERIFY_ATOL):
+        """Largest absolute difference from model.predict on X; raises if above atol"""
+        expected = np.asarray(model.predict(X), dtype=np.float64)
+        error = float(np.max(np.abs(self.predict(np.asarray(X)) - expected))) if len(expected) else 0.0
+        if not error <= atol:
+            raise ValueError(f"Compiled {self.kind} predictions differ by {error:.3g} (tolerance {atol:g})")
+        return error
+
+
+def compiled_path(model_path_base, model_name):
+    return os.path.join(model_path_base, f"{model_name}_compiled")
+
+
+def _finish_tree(left, right, feature, threshold, default_left, value):
+    """Arrays for one tree with leaves pointing to themselves, plus its depth"""
+    is_leaf = left < 0
+    self_index = np.arange(len(left), dtype=np.int32)
+    depth = np.zeros(len(left), dtype=np.int32)
+    for i in range(len(left)):
+        if not is_leaf[i]:
+            depth[left[i]] = depth[right[i]] = depth[i] + 1
+    return {
+        "feature": np.where(is_leaf, 0, feature).astype(np.int32),
+        "threshold": np.where(is_leaf, 0.0, threshold).astype(np.float64),
+        "children": np.stack([np.where(is_leaf, self_index, right),
+                              np.where(is_leaf, self_index, left)], axis=1).astype(np.int32),
+        "default_left": np.asarray(default_left, dtype=bool),
+        "value": np.asarray(value, dtype=np.float64),
+        "depth": int(depth.max()),
+    }
+
+
+def _sklearn_tree(tree):
+    # sklearn >= 1.3 learns where missing values go; older trees send NaN right
+    default_left = getattr(tree, "missing_go_to_left", np.zeros(tree.node_count, dtype=bool))
+    return _finish_tree(tree.children_left, tree.children_right, tree.feature, tree.threshold,
+                        default_left, tree.value[:, 0, 0])
+
+
+def _best_iteration(model):
+    """Last boosting round XGBRegressor.predict uses (None without early stopping)"""
+    try:
+        return model.best_iteration if model.get_params().get("early_stopping_rounds") else None
+    except AttributeError:
+        return None
+
+
+def _xgb_trees(booster, best_iteration=None):
+    """Trees and base_score of a regression booster, read from its JSON model"""
+    model = json.loads(booster.save_raw("json"))
+    learner = model["learner"]
+    if learner["objective"]["name"] != "reg:squarederror":
+        raise TypeError(f"Cannot compile objective {learner['objective']['name']}")
+    # base_score is "5E-1" in XGBoost < 3 and "[5E-1]" from 3.0 on
+    base_score = float(learner["learner_model_param"]["base_score"].strip("[]"))
+
+    gbtree = learner["gradient_booster"]["model"]
+    n_trees = len(gbtree["trees"]) if best_iteration is None else gbtree["iteration_indptr"][best_iteration + 1]
+    trees = []
+    for tree in gbtree["trees"][:n_trees]:
+        if any(tree["split_type"]):
+            raise TypeError("Cannot compile categorical XGBoost splits")
+        split = np.asarray(tree["split_conditions"], dtype=np.float32)
+        left = np.asarray(tree["left_children"], dtype=np.int32)
+        # Leaves keep their weight in split_conditions; x < split is x <= the next float32 below it
+        threshold = np.nextafter(split, np.float32(-np.inf))
+        trees.append(_finish_tree(left, np.asarray(tree["right_children"], dtype=np.int32),
+                                  np.asarray(tree["split_indices"], dtype=np.int32), threshold,
+                                  tree["default_left"], np.where(left < 0, split, 0.0)))
+    return trees, base_score
+
+
+def export_compiled(model, X_check, model_path_base, model_name, feature_names=None):
+    """Flatten a tree model, check it against the original on (up to VERIFY_ROWS of) X_check and save it
+
+    Returns the largest prediction difference, or None when the model cannot be
+    compiled or does not match (any stale compiled copy is removed, so servers
+    fall back to the pickle). With REQUIRE_ENV set that raises RuntimeError
+    instead, for pipelines that declare the compiled copy as an output.
+    """
+    path = compiled_path(model_path_base, model_name)
+    try:
+        compiled = CompiledForest.from_model(model, feature_names)
+        error = compiled.verify(model, X_check[:VERIFY_ROWS])
+    except (TypeError, ValueError) as e:
+        shutil.rmtree(path, ignore_errors=True)
+        if os.getenv(REQUIRE_ENV) == "1":
+            raise RuntimeError(f"{model_name} could not be compiled: {e}") from e
+        print(f"⚠ {model_name} not compiled: {e}")
+        return None
+    compiled.save(path)
+    return error
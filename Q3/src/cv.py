@@ -0,0 +1,181 @@
+"""
+K-fold and time-ordered cross-validation of the training models.
+
+The processed file is read once into a float32 matrix (see lean.py) whose rows
+are grouped by test fold, so every fold's test rows are one contiguous slice.
+With `--strategy time` the rows keep their file order (oldest first), and
+each fold trains on everything before its test block, like sklearn's
+TimeSeriesSplit. Fold boundaries are computed once. The matrix is written to
+a .npy file that every worker process maps, and all (model, fold) fits run
+concurrently on one process pool. Each model gets a parent MLflow run with
+the mean and standard deviation of every metric, and one nested run per fold.
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import mlflow
+from mlflow.utils.mlflow_tags import MLFLOW_PARENT_RUN_ID
+from sklearn.model_selection import KFold, TimeSeriesSplit
+
+from data_io import count_rows
+from lean import SplitArrays
+from cache import ContentCache, data_version
+from evaluation import split_metrics
+from train import FEATURE_TYPES, build_model
+
+STRATEGIES = ("kfold", "time")
+METRIC_KEYS = ["train_rmse", "train_mae", "train_r2", "test_rmse", "test_mae", "test_r2"]
+
+# Arrays mapped by each worker process in _init_worker
+_DATA = None
+
+
+def fold_layout(n_rows, n_folds, strategy="kfold", random_state=42):
+    """Row order that makes every test fold contiguous, and the (start, end) of each test fold
+
+    kfold: shuffled K-fold; a fold trains on every row outside its test slice.
+    time: file order kept; a fold trains on every row before its test slice.
+    """
+    if strategy == "time":
+        splits = TimeSeriesSplit(n_splits=n_folds).split(np.arange(n_rows))
+        bounds = [(int(test[0]), int(test[-1]) + 1) for _, test in splits]
+        return np.arange(n_rows), bounds
+    if strategy != "kfold":
+        raise ValueError(f"Unknown CV strategy: {strategy}")
+    tests = [test for _, test in KFold(n_folds, shuffle=True, random_state=random_state).split(np.arange(n_rows))]
+    ends = np.cumsum([len(test) for test in tests])
+    return np.concatenate(tests), [(int(end - len(test)), int(end)) for test, end in zip(tests, ends)]
+
+
+def _init_worker(mmap_dir):
+    global _DATA
+    _DATA = SplitArrays.open(mmap_dir)
+
+
+def _run_fold(model_name, params, start, end, strategy, n_threads):
+    """Process-pool task: fit one model on one fold of the mapped matrix"""
+    X, y = _DATA.X, _DATA.y
+    if strategy == "time":
+        # Everything before the test block, a view of the mapped file
+        X_train, y_train = X[:start], y[:start]
+    else:
+        X_train = np.concatenate([X[:start], X[end:]])
+        y_train = np.concatenate([y[:start], y[end:]])
+    X_test, y_test = X[start:end], y[start:end]
+
+    model = build_model(model_name, n_threads, params)
+    started = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - started
+    metrics = split_metrics(y_train, model.predict(X_train), y_test, model.predict(X_test))
+    metrics.update(fit_seconds=fit_seconds, train_rows=len(X_train), test_rows=len(X_test))
+    return metrics
+
+
+def summarize(fold_results):
+    """Mean and standard deviation of every metric over the folds"""
+    summary = {}
+    for key in METRIC_KEYS + ["fit_seconds"]:
+        values = np.array([result[key] for result in fold_results], dtype=np.float64)
+        summary[f"{key}_mean"] = float(values.mean())
+        summary[f"{key}_std"] = float(values.std(ddof=1)) if len(values) > 1 else 0.0
+    return summary
+
+
+def log_cv(client, experiment_id, model_name, strategy, n_folds, params, fold_results, summary):
+    """One parent run per model with the fold summary, and a nested run per fold"""
+    with mlflow.start_run(run_name=f"cv-{model_name}") as parent:
+        mlflow.log_params({"model_family": model_name, "cv_strategy": strategy, "n_folds": n_folds,
+                           "data_version": os.getenv("DVC_DATA_VERSION", "unknown"), **(params or {})})
+        for fold, result in enumerate(fold_results):
+            run = client.create_run(experiment_id, run_name=f"{model_name}-fold-{fold}",
+                                    tags={MLFLOW_PARENT_RUN_ID: parent.info.run_id})
+            client.log_param(run.info.run_id, "fold", fold)
+            for k, v in result.items():
+                client.log_metric(run.info.run_id, k, v)
+            client.set_terminated(run.info.run_id)
+        mlflow.log_metrics(summary)
+        return parent.info.run_id
+
+
+def cross_validate(data_path, model_names=None, n_folds=5, strategy="kfold", cpu_budget=None, params=None,
+                   output_dir="metrics"):
+    """Cross-validate each model over n_folds folds; returns the per-model summaries"""
+    model_names = list(model_names or FEATURE_TYPES)
+    params = params or {}
+    cpu_budget = cpu_budget or os.cpu_count() or 1
+    client = mlflow.tracking.MlflowClient()
+    # Make sure the tracking store and default experiment exist before logging
+    experiment_id = client.get_experiment("0").experiment_id
+
+    # Every worker maps one on-disk copy of the fold-ordered matrix instead of loading the dataset
+    mmap_dir = tempfile.mkdtemp(prefix=".cv-", dir=os.path.dirname(os.path.abspath(data_path)))
+    try:
+        started = time.perf_counter()
+        n_rows = count_rows(data_path)
+        order, bounds = fold_layout(n_rows, n_folds, strategy)
+        SplitArrays.load(data_path, order, n_rows, n_rows=n_rows, mmap_dir=mmap_dir)
+        print(f"⏱ cv: {n_rows:,} rows loaded into {n_folds} {strategy} folds "
+              f"in {time.perf_counter() - started:.2f}s")
+
+        tasks = [(name, fold) for name in model_names for fold in range(n_folds)]
+        n_threads = max(1, cpu_budget // len(tasks))
+        with ProcessPoolExecutor(max_workers=min(cpu_budget, len(tasks)), initializer=_init_worker,
+                                 initargs=(mmap_dir,)) as pool:
+            futures = {(name, fold): pool.submit(_run_fold, name, params.get(name), *bounds[fold], strategy,
+                                                 n_threads)
+                       for name, fold in tasks}
+            results = {name: [futures[name, fold].result() for fold in range(n_folds)] for name in model_names}
+    finally:
+        shutil.rmtree(mmap_dir, ignore_errors=True)
+
+    summaries = {}
+    for name in model_names:
+        summary = summarize(results[name])
+        run_id = log_cv(client, experiment_id, name, strategy, n_folds, params.get(name), results[name],
+                        summary)
+        summaries[name] = summary
+
+        model_dir = os.path.join(output_dir, name)
+        os.makedirs(model_dir, exist_ok=True)
+        with open(os.path.join(model_dir, "cv_metrics.json"), "w") as f:
+            json.dump({"model": name, "strategy": strategy, "n_folds": n_folds, "mlflow_run_id": run_id,
+                       **summary, "folds": results[name]}, f, indent=4)
+        print(f"✅ {name}: test_rmse {summary['test_rmse_mean']:.5f} ± {summary['test_rmse_std']:.5f}, "
+              f"test_r2 {summary['test_r2_mean']:.4f} ± {summary['test_r2_std']:.4f}")
+    return summaries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cross-validate the CPU usage models")
+    parser.add_argument("data_path")
+    parser.add_argument("--models", nargs="+", default=list(FEATURE_TYPES), choices=list(FEATURE_TYPES))
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--strategy", choices=STRATEGIES, default="kfold",
+                        help="kfold: shuffled K-fold; time: train on earlier rows, test on the next block")
+    parser.add_argument("--jobs", type=int, default=-1, help="Parallel fold fits (-1: all cores)")
+    parser.add_argument("--params", default=None,
+                        help="JSON file of per-model hyperparameter overrides (e.g. from sweep.py)")
+    parser.add_argument("--output-dir", default="metrics", help="cv_metrics.json goes to <dir>/<model>/")
+    args = parser.parse_args()
+
+    if args.folds < 2:
+        parser.error("--folds must be at least 2")
+
+    params = None
+    if args.params:
+        with open(args.params, "r") as f:
+            params = json.load(f)
+
+    # The data hash is the MLflow data_version outside DVC, as in train.py
+    os.environ["DVC_DATA_VERSION"] = data_version(ContentCache().file_hash(args.data_path))
+
+    cross_validate(args.data_path, args.models, args.folds, args.strategy,
+                   None if args.jobs == -1 else args.jobs, params, args.output_dir)
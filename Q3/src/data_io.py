@@ -0,0 +1,136 @@
+"""
+Reading and writing the processed dataset handed from preprocess to train.
+
+CSV is kept for compatibility; Parquet and Arrow IPC (Feather) store typed
+columns (float32 features and target, bool one-hot flags) so the hand-off
+skips float formatting and parsing. Arrow files are memory-mapped on read.
+iter_processed() walks the file in record batches for loaders that never hold
+the whole frame (see lean.py). pandas, like pyarrow, is imported by the
+readers that need it, so importing this module stays cheap.
+"""
+
+import os
+
+import numpy as np
+
+FORMATS = {".csv": "csv", ".parquet": "parquet", ".feather": "feather", ".arrow": "feather"}
+
+
+def infer_format(path):
+    """Pick the format from the file extension, defaulting to CSV"""
+    return FORMATS.get(os.path.splitext(str(path))[1].lower(), "csv")
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Please install pyarrow for Parquet/Feather data: pip install pyarrow")
+    return pyarrow
+
+
+def to_typed(df):
+    """Downcast numeric columns to float32; one-hot columns stay bool"""
+    return df.astype({c: np.float32 for c in df.columns if df[c].dtype != bool})
+
+
+class ProcessedWriter:
+    """Write the processed dataset in one go or chunk by chunk"""
+
+    def __init__(self, path, fmt=None):
+        self.path = path
+        self.fmt = fmt or infer_format(path)
+        if self.fmt not in FORMATS.values():
+            raise ValueError(f"Unknown data format: {self.fmt}")
+        self._writer = None
+        self._rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, df):
+        if self.fmt == "csv":
+            df.to_csv(self.path, index=False, header=self._rows == 0, mode="w" if self._rows == 0 else "a")
+        else:
+            pa = _require_pyarrow()
+            table = pa.Table.from_pandas(to_typed(df), preserve_index=False)
+            if self._writer is None:
+                self._writer = self._open(pa, table.schema)
+            self._writer.write_table(table)
+        self._rows += len(df)
+
+    def _open(self, pa, schema):
+        if self.fmt == "parquet":
+            import pyarrow.parquet as pq
+            return pq.ParquetWriter(self.path, schema)
+        return pa.ipc.new_file(self.path, schema)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def read_processed(path, fmt=None):
+    """Load the processed dataset written by ProcessedWriter"""
+    fmt = fmt or infer_format(path)
+    if fmt == "csv":
+        import pandas as pd
+        return pd.read_csv(path)
+
+    pa = _require_pyarrow()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+    else:
+        with pa.memory_map(str(path), "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas()
+
+
+def count_rows(path, fmt=None):
+    """Number of rows, from file metadata where the format has it"""
+    fmt = fmt or infer_format(path)
+    if fmt == "csv":
+        lines, last = 0, b"\n"
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 24), b""):
+                lines += chunk.count(b"\n")
+                last = chunk[-1:]
+        # Minus the header; a last line without a newline still counts
+        return max(lines + (last != b"\n") - 1, 0)
+
+    pa = _require_pyarrow()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    with pa.memory_map(str(path), "r") as source:
+        reader = pa.ipc.open_file(source)
+        return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+
+
+def iter_processed(path, fmt=None, batch_rows=1_000_000, columns=None):
+    """Yield the dataset as DataFrames of at most batch_rows rows, in file order (optionally only some columns)"""
+    fmt = fmt or infer_format(path)
+    if fmt == "csv":
+        import pandas as pd
+        yield from pd.read_csv(path, chunksize=batch_rows, usecols=columns)
+        return
+
+    pa = _require_pyarrow()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_rows, columns=columns):
+            yield batch.to_pandas()
+        return
+    with pa.memory_map(str(path), "r") as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if columns is not None:
+                batch = batch.select(columns)
+            for start in range(0, batch.num_rows, batch_rows):
+                yield batch.slice(start, batch_rows).to_pandas()
@@ -0,0 +1,129 @@
+"""
+Regression metrics and residual diagnostics computed with plain NumPy.
+
+regression_metrics() gets RMSE, MAE and R² from a single blockwise pass over
+the targets and predictions. Each block's residuals are computed once and
+feed the squared-error sum, the absolute-error sum and a running mean/variance
+of the target (merged as in transform.RunningStats). The three sklearn
+calls this replaces each made their own passes and temporary arrays.
+diagnostics() adds what the residual plot only shows as a picture, as compact
+JSON: residual quantiles and per-`controller_kind` error breakdowns.
+"""
+
+import os
+
+import numpy as np
+
+from transform import FeatureTransform, CATEGORICAL_COL
+
+# Rows sampled for train-set metrics (unset or 0: every training row); process-pool workers inherit it
+TRAIN_SAMPLE_ENV = "TRAIN_METRICS_SAMPLE"
+
+# Rows per block of the fused pass (bounds the temporary residual arrays)
+BLOCK_ROWS = 1 << 20
+
+RESIDUAL_QUANTILES = (0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99)
+
+
+def regression_metrics(y_true, y_pred, block_rows=BLOCK_ROWS):
+    """RMSE, MAE and R² in one pass; matches sklearn (R² of a constant target is 1.0 or 0.0)"""
+    y_true = np.asarray(y_true).ravel()
+    y_pred = np.asarray(y_pred).ravel()
+    n = len(y_true)
+    if n == 0 or n != len(y_pred):
+        raise ValueError(f"Need matching, non-empty targets and predictions, got {n} and {len(y_pred)}")
+
+    sse = sae = 0.0
+    count, mean, m2 = 0, 0.0, 0.0
+    for start in range(0, n, block_rows):
+        y = np.asarray(y_true[start:start + block_rows], dtype=np.float64)
+        residual = y - y_pred[start:start + block_rows]
+        sse += float(residual @ residual)
+        sae += float(np.abs(residual).sum())
+
+        # Chan et al. merge of the target's mean and sum of squared deviations
+        block_mean = float(y.mean())
+        deviation = y - block_mean
+        total = count + len(y)
+        delta = block_mean - mean
+        mean += delta * len(y) / total
+        m2 += float(deviation @ deviation) + delta * delta * count * len(y) / total
+        count = total
+
+    if m2 > 0:
+        r2 = 1.0 - sse / m2
+    else:
+        r2 = 1.0 if sse == 0 else 0.0
+    return {"rmse": float(np.sqrt(sse / n)), "mae": sae / n, "r2": float(r2)}
+
+
+def split_metrics(y_train, train_preds, y_test, test_preds):
+    """train_/test_ prefixed metrics as logged to MLflow and metrics.json"""
+    metrics = {}
+    for split, (y, preds) in (("train", (y_train, train_preds)), ("test", (y_test, test_preds))):
+        metrics.update({f"{split}_{k}": v for k, v in regression_metrics(y, preds).items()})
+    return metrics
+
+
+def train_sample_size():
+    return int(os.getenv(TRAIN_SAMPLE_ENV) or 0)
+
+
+def sample_rows(n_rows, sample, random_state=42):
+    """Sorted indices of a reproducible sample of rows, or None when sample covers them all"""
+    if not sample or sample >= n_rows:
+        return None
+    return np.sort(np.random.default_rng(random_state).choice(n_rows, size=sample, replace=False))
+
+
+def controller_kinds(transform_path, feature_names, categorical_col=CATEGORICAL_COL):
+    """Full category list: from preprocessor.json, else the one-hot columns after an unnamed first one"""
+    if transform_path and os.path.exists(transform_path):
+        return [str(c) for c in FeatureTransform.load(transform_path).categories]
+    prefix = f"{categorical_col}_"
+    return ["(first)"] + [name[len(prefix):] for name in feature_names if name.startswith(prefix)]
+
+
+def category_codes(X, feature_names, categories, categorical_col=CATEGORICAL_COL):
+    """Category index of every row, decoded from its drop-first one-hot columns
+
+    categories is the full category list (FeatureTransform.categories); rows with
+    no flag set belong to the dropped first category.
+    """
+    prefix = f"{categorical_col}_"
+    columns = [i for i, name in enumerate(feature_names) if name.startswith(prefix)]
+    index = {c: i for i, c in enumerate(categories)}
+    codes = np.zeros(len(X), dtype=np.int64)
+    flags = X.iloc[:, columns].to_numpy() if hasattr(X, "iloc") else np.asarray(X)[:, columns]
+    for j, i in enumerate(columns):
+        category = feature_names[i][len(prefix):]
+        codes[np.asarray(flags[:, j], dtype=bool)] = index.get(category, 0)
+    return codes
+
+
+def diagnostics(y_true, y_pred, codes=None, categories=None, quantiles=RESIDUAL_QUANTILES):
+    """Residual (actual - predicted) quantiles plus per-category count, RMSE, MAE and mean residual"""
+    residual = np.asarray(y_true, dtype=np.float64).ravel() - np.asarray(y_pred, dtype=np.float64).ravel()
+    values = np.quantile(residual, quantiles) if len(residual) else np.full(len(quantiles), np.nan)
+    result = {
+        "rows": int(len(residual)),
+        "residual_quantiles": {f"p{round(q * 100):02d}": float(v) for q, v in zip(quantiles, values)},
+        "abs_residual_p95": float(np.quantile(np.abs(residual), 0.95)) if len(residual) else None,
+    }
+    if codes is not None and categories is not None:
+        # Every per-category sum in one bincount each over the same residuals
+        size = len(categories)
+        count = np.bincount(codes, minlength=size)
+        sse = np.bincount(codes, weights=residual * residual, minlength=size)
+        sae = np.bincount(codes, weights=np.abs(residual), minlength=size)
+        bias = np.bincount(codes, weights=residual, minlength=size)
+        result["by_controller_kind"] = {
+            str(category): {
+                "rows": int(count[i]),
+                "rmse": float(np.sqrt(sse[i] / count[i])),
+                "mae": float(sae[i] / count[i]),
+                "bias": float(bias[i] / count[i]),
+            }
+            for i, category in enumerate(categories) if count[i]
+        }
+    return result
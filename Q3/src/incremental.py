@@ -0,0 +1,134 @@
+"""
+State kept between training runs so appended rows can be trained incrementally.
+
+After every training run `train_state.json` records how many processed rows
+the models have seen, a fingerprint of those rows and how they were split
+into train/test segments; `linear_stats.npz` holds the linear model's
+sufficient statistics (X'X and X'y over the training rows). An incremental run
+only needs to fit the rows appended since then.
+"""
+
+import os
+import json
+import hashlib
+
+import numpy as np
+
+STATE_FILE = "train_state.json"
+LINEAR_STATS_FILE = "linear_stats.npz"
+
+# Rows converted at a time when hashing or accumulating statistics
+BLOCK_ROWS = 262_144
+
+# Values are hashed as float32, so a float32 matrix (train.py --lean) and the float64
+# DataFrame of the same file give the same fingerprint
+FINGERPRINT_DTYPE = np.float32
+
+
+def _float_rows(X, rows, dtype=np.float64):
+    """Rows of a DataFrame or array as dtype, rows being a slice or an index array"""
+    if hasattr(X, "iloc"):
+        return X.iloc[rows].to_numpy(dtype=dtype)
+    return np.asarray(X[rows], dtype=dtype)
+
+
+def fingerprint(X, y, n_rows, position=None):
+    """Hash of the first n_rows of features and target, as float32
+
+    position maps file rows to rows of X when X was reordered (see lean.SplitArrays).
+    """
+    def rows(start, stop):
+        return slice(start, stop) if position is None else position[start:stop]
+
+    digest = hashlib.sha256()
+    for start in range(0, n_rows, BLOCK_ROWS):
+        block = _float_rows(X, rows(start, min(start + BLOCK_ROWS, n_rows)), FINGERPRINT_DTYPE)
+        digest.update(np.ascontiguousarray(block).tobytes())
+    digest.update(np.ascontiguousarray(np.asarray(y)[rows(0, n_rows)].astype(FINGERPRINT_DTYPE)).tobytes())
+    return digest.hexdigest()
+
+
+def segment_split(start, stop, test_size=0.2, random_state=42):
+    """Row indices of one segment split like train_all splits the full dataset"""
+    from sklearn.model_selection import train_test_split
+    indices = np.arange(start, stop)
+    if stop - start < 2:
+        return indices, indices[:0]
+    return train_test_split(indices, test_size=test_size, random_state=random_state)
+
+
+def split_segments(segments):
+    """Train/test indices over every segment boundary recorded so far"""
+    train_parts, test_parts = [], []
+    start = 0
+    for stop in segments:
+        train_idx, test_idx = segment_split(start, stop)
+        train_parts.append(train_idx)
+        test_parts.append(test_idx)
+        start = stop
+    return np.concatenate(train_parts), np.concatenate(test_parts)
+
+
+def linear_stats(X, y):
+    """Sufficient statistics of least squares with an intercept column, accumulated in blocks"""
+    y = np.asarray(y, dtype=np.float64)
+    n_cols = X.shape[1] + 1
+    xtx, xty = np.zeros((n_cols, n_cols)), np.zeros(n_cols)
+    for start in range(0, len(X), BLOCK_ROWS):
+        block = _float_rows(X, slice(start, start + BLOCK_ROWS))
+        A = np.hstack([np.ones((len(block), 1)), block])
+        xtx += A.T @ A
+        xty += A.T @ y[start:start + len(block)]
+    return xtx, xty
+
+
+def solve_linear(model, xtx, xty):
+    """Set a LinearRegression's coefficients from accumulated X'X and X'y"""
+    beta = np.linalg.lstsq(xtx, xty, rcond=None)[0]
+    model.intercept_ = float(beta[0])
+    model.coef_ = beta[1:]
+    model.n_features_in_ = len(beta) - 1
+    return model
+
+
+def load_state(model_path_base):
+    """Return (state, (xtx, xty)) or (None, None) if no usable state exists"""
+    state_file = os.path.join(model_path_base, STATE_FILE)
+    stats_file = os.path.join(model_path_base, LINEAR_STATS_FILE)
+    if not os.path.exists(state_file) or not os.path.exists(stats_file):
+        return None, None
+    with open(state_file, "r") as f:
+        state = json.load(f)
+    with np.load(stats_file) as stats:
+        return state, (stats["xtx"], stats["xty"])
+
+
+def save_state(model_path_base, X, y, segments, xtx, xty, base_n_estimators, position=None):
+    """Record what the saved models were trained on"""
+    os.makedirs(model_path_base, exist_ok=True)
+    state = {
+        "n_rows": int(segments[-1]),
+        "fingerprint": fingerprint(X, y, segments[-1], position),
+        "segments": [int(s) for s in segments],
+        "data_version": os.getenv("DVC_DATA_VERSION", "unknown"),
+        "base_n_estimators": base_n_estimators,
+    }
+    with open(os.path.join(model_path_base, STATE_FILE), "w") as f:
+        json.dump(state, f, indent=4)
+    np.savez(os.path.join(model_path_base, LINEAR_STATS_FILE), xtx=xtx, xty=xty)
+
+
+def clear_state(model_path_base):
+    """Forget the recorded state, so the next incremental run retrains from scratch"""
+    for name in (STATE_FILE, LINEAR_STATS_FILE):
+        path = os.path.join(model_path_base, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def appended_rows_start(state, X, y):
+    """Index of the first new row if the data only grew by appending, else None"""
+    n_rows = state["n_rows"]
+    if len(X) < n_rows or fingerprint(X, y, n_rows) != state["fingerprint"]:
+        return None
+    return n_rows
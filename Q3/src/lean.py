@@ -0,0 +1,113 @@
+"""
+Memory-lean training data: one float32 feature matrix shared by every model.
+
+The processed file is read batch by batch straight into a preallocated,
+C-contiguous float32 matrix (optionally a memory-mapped .npy file). Rows are
+placed in split order, with the training rows first in the order
+train_test_split would return them and then the test rows. X_train and X_test
+are slices (views) rather than copies. Random forests and XGBoost consume
+float32 without converting it, and the linear model is solved from
+accumulated X'X and X'y. Process-pool workers map the same .npy file instead
+of receiving pickled copies.
+"""
+
+import os
+import json
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from data_io import count_rows, iter_processed
+
+TARGET = "cpu_usage"
+
+META_FILE = "meta.json"
+
+
+def split_order(n_rows, test_size=0.2, random_state=42):
+    """Row order with train_test_split's training rows first, then its test rows"""
+    from sklearn.model_selection import train_test_split
+    train_idx, test_idx = train_test_split(np.arange(n_rows), test_size=test_size, random_state=random_state)
+    return np.concatenate([train_idx, test_idx]), len(train_idx)
+
+
+class SplitArrays:
+    """Features and target in split order; the splits are views of one matrix"""
+
+    def __init__(self, X, y, n_train, feature_names, position=None):
+        self.X = X
+        self.y = y
+        self.n_train = n_train
+        self.feature_names = feature_names
+        # position[i] is the row of X holding row i of the file, -1 if it was left out
+        # (None when mapped by a worker)
+        self.position = position
+
+    @property
+    def X_train(self):
+        return self.X[:self.n_train]
+
+    @property
+    def X_test(self):
+        return self.X[self.n_train:]
+
+    @property
+    def y_train(self):
+        return self.y[:self.n_train]
+
+    @property
+    def y_test(self):
+        return self.y[self.n_train:]
+
+    @classmethod
+    def load(cls, data_path, order, n_train, n_rows=None, mmap_dir=None, batch_rows=1_000_000):
+        """Read the file rows listed in order (all rows by default) into that order
+
+        With mmap_dir the matrix is written to a .npy file there that workers can map.
+        """
+        n_rows = len(order) if n_rows is None else n_rows
+        position = np.full(n_rows, -1, dtype=np.int64)
+        position[order] = np.arange(len(order))
+
+        X = y = feature_names = None
+        start = 0
+        for batch in iter_processed(data_path, batch_rows=batch_rows):
+            if X is None:
+                feature_names = [c for c in batch.columns if c != TARGET]
+                X = _allocate(mmap_dir, "X.npy", (len(order), len(feature_names)), np.float32)
+                y = _allocate(mmap_dir, "y.npy", (len(order),), np.float64)
+            rows = position[start:start + len(batch)]
+            keep = rows >= 0
+            X[rows[keep]] = batch[feature_names].to_numpy(dtype=np.float32)[keep]
+            y[rows[keep]] = batch[TARGET].to_numpy(dtype=np.float64)[keep]
+            start += len(batch)
+
+        if start != n_rows:
+            raise ValueError(f"{data_path} has {start} rows, expected {n_rows}")
+        if mmap_dir:
+            X.flush()
+            y.flush()
+            with open(os.path.join(mmap_dir, META_FILE), "w") as f:
+                json.dump({"n_train": n_train, "feature_names": feature_names}, f)
+        return cls(X, y, n_train, feature_names, position)
+
+    @classmethod
+    def open(cls, mmap_dir):
+        """Map arrays written by load(..., mmap_dir) read-only, without copying them"""
+        with open(os.path.join(mmap_dir, META_FILE)) as f:
+            meta = json.load(f)
+        X = np.load(os.path.join(mmap_dir, "X.npy"), mmap_mode="r")
+        y = np.load(os.path.join(mmap_dir, "y.npy"), mmap_mode="r")
+        return cls(X, y, meta["n_train"], meta["feature_names"])
+
+
+def _allocate(mmap_dir, name, shape, dtype):
+    if mmap_dir:
+        return open_memmap(os.path.join(mmap_dir, name), mode="w+", dtype=dtype, shape=shape)
+    return np.empty(shape, dtype=dtype)
+
+
+def load_train_test(data_path, test_size=0.2, random_state=42, mmap_dir=None):
+    """Processed data split like train_all's train_test_split, as float32 views"""
+    order, n_train = split_order(count_rows(data_path), test_size, random_state)
+    return SplitArrays.load(data_path, order, n_train, mmap_dir=mmap_dir)
@@ -1,26 +1,146 @@
+import os
+import argparse
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
 
-def preprocess(input_path, output_path):
-    df = pd.read_csv(input_path)
+from transform import FeatureTransform, RunningStats, NUM_COLS, CATEGORICAL_COL
+from data_io import ProcessedWriter, FORMATS, infer_format
+from profiling import StageProfiler, enable_profiling, log_stage_run
+from cache import ContentCache, cached_run, data_version, dvc_data_version, hash_sources
 
-    # Select only the required columns
-    features = ['cpu_request','mem_request','cpu_limit','mem_limit','runtime_minutes','controller_kind']
-    target = 'cpu_usage'
+FEATURES = NUM_COLS + [CATEGORICAL_COL]
+TARGET = 'cpu_usage'
 
-    df = df[features + [target]]
+# Modules whose code decides what preprocess writes (part of the cache key)
+CACHE_SOURCES = ["preprocess.py", "transform.py", "data_io.py"]
 
-    # One-hot encode categorical column
-    df = pd.get_dummies(df, columns=['controller_kind'], drop_first=True)
+def preprocess(input_path, output_path, transform_path=None, fmt=None, transform=None):
+    profiler = StageProfiler()
+    with profiler:
+        with profiler.stage("read"):
+            df = pd.read_csv(input_path, usecols=FEATURES + [TARGET])
 
-    # Scale numeric features
-    num_cols = ['cpu_request','mem_request','cpu_limit','mem_limit','runtime_minutes']
-    scaler = StandardScaler()
-    df[num_cols] = scaler.fit_transform(df[num_cols])
+        # Select only the required columns
+        df = df[FEATURES + [TARGET]]
 
-    # Save processed dataset
-    df.to_csv(output_path, index=False)
+        # Scale numeric features and one-hot encode the categorical column
+        with profiler.stage("fit"):
+            if transform is None:
+                transform = FeatureTransform.fit(df)
+        with profiler.stage("transform"):
+            out = transform.transform_frame(df)
+            out.insert(len(NUM_COLS), TARGET, df[TARGET].to_numpy())
+
+        # Save processed dataset
+        with profiler.stage("write"):
+            with ProcessedWriter(output_path, fmt) as writer:
+                writer.write(out)
+
+        save_transform(transform, transform_path)
+
+    log_profile(profiler, len(df), streaming=False)
+
+def preprocess_streaming(input_path, output_path, transform_path=None, chunksize=1_000_000, fmt=None,
+                         transform=None):
+    """Two-pass chunked preprocess whose peak memory is bounded by the chunk size"""
+    profiler = StageProfiler()
+    n_rows = 0
+    with profiler:
+        # Pass 1: scaler statistics and the category set (skipped when reusing a transform)
+        if transform is None:
+            stats = RunningStats(len(NUM_COLS))
+            categories = set()
+            chunks = pd.read_csv(input_path, usecols=FEATURES + [TARGET], chunksize=chunksize)
+            for chunk in profiler.iterate("read", chunks):
+                with profiler.stage("fit"):
+                    stats.update(chunk[NUM_COLS].to_numpy(dtype='float64'))
+                    categories.update(str(c) for c in chunk[CATEGORICAL_COL].dropna().unique())
+
+            transform = FeatureTransform.from_stats(stats, categories)
+
+        # Pass 2: transform and append chunk by chunk
+        with ProcessedWriter(output_path, fmt) as writer:
+            chunks = pd.read_csv(input_path, usecols=FEATURES + [TARGET], chunksize=chunksize)
+            for chunk in profiler.iterate("read", chunks):
+                with profiler.stage("transform"):
+                    out = transform.transform_frame(chunk)
+                    out.insert(len(NUM_COLS), TARGET, chunk[TARGET].to_numpy())
+                with profiler.stage("write"):
+                    writer.write(out)
+                n_rows += len(chunk)
+
+        save_transform(transform, transform_path)
+
+    log_profile(profiler, n_rows, streaming=True)
+
+def log_profile(profiler, n_rows, streaming):
+    """Report stage timings and log them as a 'preprocess' MLflow run"""
+    total = sum(profiler.stages.values())
+    print(f"⏱ preprocess: {profiler.summary()} ({n_rows / total if total else 0:,.0f} rows/s)")
+    try:
+        log_stage_run("preprocess", profiler, rates={"preprocess": (n_rows, None)},
+                      params={"rows": n_rows, "streaming": streaming})
+    except Exception as e:
+        print(f"Could not log preprocess timings to MLflow: {e}")
+
+def save_transform(transform, transform_path):
+    """Save the fitted transform next to the models so scoring never refits it"""
+    if transform_path:
+        os.makedirs(os.path.dirname(transform_path) or ".", exist_ok=True)
+        transform.save(transform_path)
 
 if __name__ == "__main__":
-    import sys
-    preprocess(sys.argv[1], sys.argv[2])
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Preprocess raw pod telemetry for training")
+    parser.add_argument("input_path")
+    parser.add_argument("output_path")
+    parser.add_argument("transform_path", nargs="?", default=None)
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Stream the input in chunks of this many rows (bounded memory)")
+    parser.add_argument("--format", choices=sorted(set(FORMATS.values())), default=None,
+                        help="Output format (default: from the output file extension)")
+    parser.add_argument("--reuse-transform", action="store_true",
+                        help="Apply the existing transform instead of refitting it, so previously "
+                             "processed rows stay identical (needed for incremental training)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Capture cProfile and tracemalloc snapshots into the run's profile.json")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always recompute instead of restoring the output for unchanged data and code")
+    args = parser.parse_args()
+
+    if args.profile:
+        enable_profiling()
+
+    # Under DVC (DVC_DATA_VERSION set) the stage only reruns on changed inputs, so there is nothing to cache.
+    # Otherwise the raw-data hash is both the cache key and the MLflow data_version of the preprocess run
+    use_cache = not args.no_cache and dvc_data_version() is None
+    if use_cache:
+        cache = ContentCache()
+        data_hash = cache.file_hash(args.input_path)
+        os.environ["DVC_DATA_VERSION"] = data_version(data_hash)
+
+    transform = None
+    if args.reuse_transform and args.transform_path and os.path.exists(args.transform_path):
+        transform = FeatureTransform.load(args.transform_path)
+
+    def run():
+        if args.chunksize:
+            preprocess_streaming(args.input_path, args.output_path, args.transform_path, args.chunksize,
+                                 args.format, transform)
+        else:
+            preprocess(args.input_path, args.output_path, args.transform_path, args.format, transform)
+
+    if not use_cache:
+        run()
+    else:
+        key_parts = {
+            "data": data_hash,
+            "code": hash_sources(CACHE_SOURCES),
+            "features": FEATURES,
+            "target": TARGET,
+            "format": args.format or infer_format(args.output_path),
+            "streaming": bool(args.chunksize),
+            "transform": cache.file_hash(args.transform_path) if transform is not None else None,
+        }
+        outputs = {"processed": args.output_path}
+        if args.transform_path:
+            outputs["preprocessor.json"] = args.transform_path
+        cached_run("preprocess", key_parts, outputs, run, cache)
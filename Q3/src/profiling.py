@@ -0,0 +1,156 @@
+"""
+Stage timing and optional profiling for preprocess.py and train.py.
+
+Every run records the wall time of each named stage and the process's peak RSS,
+which are logged as MLflow metrics (`<stage>_seconds`, `peak_mem_mb`, rows/sec).
+`peak_mem_mb` is the peak over the whole process lifetime, not just the run's
+stages: models trained one after another in the same process report at least
+the peak of the ones before them.
+With `--profile` (or PIPELINE_PROFILE=1, which process-pool workers inherit)
+a cProfile of the main thread and tracemalloc's peak and top allocation sites
+are captured as well. They go into the profile.json artifact.
+"""
+
+import io
+import os
+import sys
+import time
+import pstats
+import cProfile
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+from contextlib import contextmanager
+
+PROFILE_ENV = "PIPELINE_PROFILE"
+
+# Rows of cProfile / tracemalloc output kept in the profile artifact
+PROFILE_TOP_N = 30
+
+_DONE = object()
+
+
+def profiling_enabled():
+    return os.getenv(PROFILE_ENV) == "1"
+
+
+def enable_profiling():
+    """Turn on cProfile/tracemalloc for this process and the workers it starts"""
+    os.environ[PROFILE_ENV] = "1"
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (ru_maxrss is KB on Linux, bytes on macOS)
+
+    Without the resource module this is tracemalloc's peak while it is tracing, None otherwise.
+    """
+    if resource is None:
+        return tracemalloc.get_traced_memory()[1] / 2**20 if tracemalloc.is_tracing() else None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class StageProfiler:
+    """Wall time per named stage plus peak memory, optionally with cProfile and tracemalloc"""
+
+    def __init__(self, profile=None):
+        self.profile = profiling_enabled() if profile is None else profile
+        self.stages = {}
+        self._cprofile = None
+        self._tracing = False
+        self._report = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def start(self):
+        """Begin cProfile/tracemalloc capture (no-op unless profiling)"""
+        if self.profile:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._tracing = True
+            tracemalloc.reset_peak()
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def stop(self):
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            out = io.StringIO()
+            pstats.Stats(self._cprofile, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+            self._report["cprofile"] = out.getvalue()
+            self._cprofile = None
+        if tracemalloc.is_tracing() and self.profile:
+            self._report["tracemalloc_peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+            top = tracemalloc.take_snapshot().statistics("lineno")[:PROFILE_TOP_N]
+            self._report["top_allocations"] = [str(stat) for stat in top]
+            if self._tracing:
+                tracemalloc.stop()
+                self._tracing = False
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block; repeated stages accumulate"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+    def iterate(self, name, iterable):
+        """Yield from iterable, timing how long each item takes to produce (e.g. CSV chunk reads)"""
+        it = iter(iterable)
+        while True:
+            with self.stage(name):
+                item = next(it, _DONE)
+            if item is _DONE:
+                return
+            yield item
+
+    def add(self, stages):
+        """Include stages timed elsewhere, e.g. data loading shared by several models"""
+        for name, seconds in (stages or {}).items():
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def metrics(self, rates=None):
+        """MLflow metrics: <stage>_seconds, peak_mem_mb (process-level peak) and <name>_rows_per_sec
+
+        rates maps a name to (rows, stage); a stage of None means the total over all stages.
+        """
+        metrics = {f"{name}_seconds": seconds for name, seconds in self.stages.items()}
+        peak_mb = peak_rss_mb()
+        if peak_mb is not None:
+            metrics["peak_mem_mb"] = peak_mb
+        for name, (rows, stage) in (rates or {}).items():
+            seconds = sum(self.stages.values()) if stage is None else self.stages.get(stage)
+            if seconds:
+                metrics[f"{name}_rows_per_sec"] = rows / seconds
+        if "tracemalloc_peak_mb" in self._report:
+            metrics["tracemalloc_peak_mb"] = self._report["tracemalloc_peak_mb"]
+        return metrics
+
+    def report(self, rates=None):
+        """Everything captured, for the profile.json artifact"""
+        return {"stages": dict(self.stages), "metrics": self.metrics(rates), **self._report}
+
+    def summary(self):
+        return ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.stages.items())
+
+
+def log_stage_run(stage, profiler, rates=None, params=None):
+    """Log a non-model pipeline stage as its own MLflow run (scanners skip runs without a model param)"""
+    import mlflow
+
+    with mlflow.start_run(run_name=stage):
+        mlflow.log_params({"stage": stage, "data_version": os.getenv("DVC_DATA_VERSION", "unknown"),
+                           **(params or {})})
+        mlflow.log_metrics(profiler.metrics(rates))
+        mlflow.log_dict(profiler.report(rates), "profile.json")
@@ -0,0 +1,171 @@
+"""
+Offline batch scoring of raw pod specs with the models saved by train.py.
+
+    python src/score.py specs.parquet predictions.parquet models/ --models rf xgb --workers 4
+
+The input (CSV, Parquet or Feather) is read chunk by chunk, keeping only the
+feature columns and any `--keep` columns such as a pod id. Features are built
+with the saved preprocessor.json, the same transform `preprocess()` applied to
+the training data. Worker processes load the transform and models once (tree
+models from their memory-mapped compiled copy when present) and score whole
+chunks. Results are appended to the output in input order as they complete.
+At most CHUNKS_PER_WORKER chunks per worker are in flight, so peak memory
+depends on the chunk size and worker count, not on the input size.
+"""
+
+import os
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from transform import FeatureTransform, NUM_COLS, CATEGORICAL_COL
+from data_io import ProcessedWriter, FORMATS, iter_processed
+from compiled import CompiledForest, compiled_path
+from profiling import peak_rss_mb
+
+MODEL_NAMES = ["linear", "rf", "xgb"]
+FEATURES = NUM_COLS + [CATEGORICAL_COL]
+TRANSFORM_FILE = "preprocessor.json"
+
+# Chunks submitted per worker before waiting for the oldest one (bounds memory, keeps workers busy)
+CHUNKS_PER_WORKER = 2
+
+
+def prediction_column(model_name):
+    return f"{model_name}_cpu_usage"
+
+
+def available_models(model_path_base):
+    """Names of the models train.py saved under model_path_base"""
+    return [name for name in MODEL_NAMES
+            if os.path.exists(os.path.join(model_path_base, f"{name}_model.pkl"))
+            or os.path.isdir(compiled_path(model_path_base, name))]
+
+
+def load_model(model_path_base, model_name, use_compiled=True):
+    """The compiled copy of a model when present, else its pickle"""
+    path = compiled_path(model_path_base, model_name)
+    if use_compiled and os.path.isdir(path):
+        return CompiledForest.load(path)
+    model = joblib.load(os.path.join(model_path_base, f"{model_name}_model.pkl"))
+    # Parallelism comes from the worker processes, so each model predicts on one thread
+    if "n_jobs" in model.get_params():
+        model.set_params(n_jobs=1)
+    return model
+
+
+class ChunkScorer:
+    """Feature transform and models, loaded once per process"""
+
+    def __init__(self, model_path_base, model_names, use_compiled=True):
+        self.transform = FeatureTransform.load(os.path.join(model_path_base, TRANSFORM_FILE))
+        self.models = {name: load_model(model_path_base, name, use_compiled) for name in model_names}
+
+    def score(self, columns):
+        """(rows, models) predictions for raw feature columns given as name -> array"""
+        X = self.transform.transform_batch(columns)
+        preds = np.empty((len(X), len(self.models)), dtype=np.float64)
+        for j, model in enumerate(self.models.values()):
+            # Models fitted on DataFrames expect the same column names at predict time
+            if hasattr(model, "feature_names_in_"):
+                preds[:, j] = model.predict(pd.DataFrame(X, columns=self.transform.feature_columns))
+            else:
+                preds[:, j] = model.predict(X)
+        return preds
+
+
+_scorer = None
+
+
+def _init_worker(model_path_base, model_names, use_compiled):
+    global _scorer
+    _scorer = ChunkScorer(model_path_base, model_names, use_compiled)
+
+
+def _score_chunk(columns):
+    return _scorer.score(columns), peak_rss_mb()
+
+
+def _scored_chunks(chunks, model_path_base, model_names, workers, use_compiled, keep):
+    """Yield (kept columns, predictions, scoring process peak MB) per input chunk, in input order"""
+    def split(chunk):
+        features = {col: chunk[col].to_numpy() for col in FEATURES}
+        return chunk[keep].reset_index(drop=True), features
+
+    if workers <= 1:
+        scorer = ChunkScorer(model_path_base, model_names, use_compiled)
+        for chunk in chunks:
+            kept, features = split(chunk)
+            yield kept, scorer.score(features), peak_rss_mb()
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_path_base, model_names, use_compiled)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            kept, features = split(chunk)
+            del chunk
+            pending.append((kept, pool.submit(_score_chunk, features)))
+            if len(pending) >= workers * CHUNKS_PER_WORKER:
+                kept, future = pending.popleft()
+                yield (kept, *future.result())
+        while pending:
+            kept, future = pending.popleft()
+            yield (kept, *future.result())
+
+
+def score(input_path, output_path, model_path_base, model_names=None, chunksize=100_000, workers=None,
+          keep=(), use_compiled=True, fmt=None):
+    """Stream input_path through the models into output_path; returns the number of rows scored"""
+    model_names = list(model_names or available_models(model_path_base))
+    if not model_names:
+        raise FileNotFoundError(f"No trained models in {model_path_base}")
+    keep = list(keep)
+    workers = os.cpu_count() if not workers or workers < 0 else workers
+
+    started = time.perf_counter()
+    n_rows, worker_peak_mb = 0, 0.0
+    columns = FEATURES + [col for col in keep if col not in FEATURES]
+    chunks = iter_processed(input_path, batch_rows=chunksize, columns=columns)
+    with ProcessedWriter(output_path, fmt) as writer:
+        scored = _scored_chunks(chunks, model_path_base, model_names, workers, use_compiled, keep)
+        for kept, preds, peak_mb in scored:
+            for j, name in enumerate(model_names):
+                kept[prediction_column(name)] = preds[:, j]
+            writer.write(kept)
+            n_rows += len(kept)
+            worker_peak_mb = max(worker_peak_mb, peak_mb or 0.0)
+
+    elapsed = time.perf_counter() - started
+    print(f"⏱ score: {n_rows:,} rows with {', '.join(model_names)} on {workers} worker(s) in {elapsed:.2f}s "
+          f"({n_rows / elapsed if elapsed else 0:,.0f} rows/s, peak memory {peak_rss_mb() or 0:.0f} MB here, "
+          f"{worker_peak_mb:.0f} MB per worker)")
+    return n_rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Predict CPU usage for a file of raw pod specs")
+    parser.add_argument("input_path", help="CSV, Parquet or Feather file with the raw feature columns")
+    parser.add_argument("output_path", help="Predictions file (format from the extension)")
+    parser.add_argument("model_path_base", metavar="models_folder", nargs="?", default="models")
+    parser.add_argument("--models", nargs="+", choices=MODEL_NAMES, default=None,
+                        help="Models to score with (default: every saved model)")
+    parser.add_argument("--chunksize", type=int, default=100_000,
+                        help="Rows read, scored and written at a time")
+    parser.add_argument("--workers", type=int, default=-1,
+                        help="Scoring processes (-1: all cores, 1: score in this process)")
+    parser.add_argument("--keep", nargs="+", default=[],
+                        help="Input columns copied to the output next to the predictions (e.g. a pod id)")
+    parser.add_argument("--no-compiled", action="store_true",
+                        help="Score tree models with their pickles instead of the compiled copies")
+    parser.add_argument("--format", choices=sorted(set(FORMATS.values())), default=None,
+                        help="Output format (default: from the output file extension)")
+    args = parser.parse_args()
+
+    score(args.input_path, args.output_path, args.model_path_base, args.models, args.chunksize, args.workers,
+          args.keep, not args.no_compiled, args.format)
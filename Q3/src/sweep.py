@@ -0,0 +1,313 @@
+"""
+Hyperparameter sweeps with parallel trials and successive halving.
+
+Trials are sampled from a per-model search space and evaluated on a
+validation split carved out of the training data (the test split is never
+touched). The split is written once as a float32 .npy file that every worker
+maps (see lean.py), and XGBoost trials share one QuantileDMatrix per worker
+instead of rebuilding it for every fit. Each rung gives the surviving trials
+`eta` times more trees and keeps the best 1/eta; XGBoost additionally stops
+early on the validation set. Every trial is logged as a nested MLflow run under
+one parent run per model, and the best parameters are written as JSON for
+`train.py --params`.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import signal
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import mlflow
+import xgboost as xgb
+from mlflow.utils.mlflow_tags import MLFLOW_PARENT_RUN_ID
+from sklearn.model_selection import train_test_split
+
+from data_io import count_rows
+from lean import SplitArrays
+from train import build_model
+
+SEARCH_SPACES = {
+    "rf": {
+        "max_depth": ("choice", [6, 8, 10, 14, 18, None]),
+        "min_samples_leaf": ("choice", [1, 2, 5, 10]),
+        "max_features": ("choice", [1.0, 0.7, 0.5, "sqrt"]),
+    },
+    "xgb": {
+        "max_depth": ("int", 3, 10),
+        "learning_rate": ("loguniform", 0.01, 0.3),
+        "subsample": ("uniform", 0.6, 1.0),
+        "colsample_bytree": ("uniform", 0.6, 1.0),
+        "min_child_weight": ("loguniform", 1.0, 20.0),
+        "reg_lambda": ("loguniform", 0.1, 10.0),
+    },
+}
+
+# Rounds without validation improvement before an XGBoost trial stops adding trees
+EARLY_STOPPING_ROUNDS = 20
+
+# Training/validation arrays mapped by each worker process in _init_worker, and the
+# XGBoost matrices built from them on first use
+_DATA = None
+_DMATRICES = None
+
+
+def sample_params(space, rng):
+    """Draw one configuration from a search space"""
+    params = {}
+    for name, spec in space.items():
+        kind = spec[0]
+        if kind == "choice":
+            params[name] = spec[1][rng.integers(len(spec[1]))]
+        elif kind == "int":
+            params[name] = int(rng.integers(spec[1], spec[2] + 1))
+        elif kind == "uniform":
+            params[name] = float(rng.uniform(spec[1], spec[2]))
+        elif kind == "loguniform":
+            params[name] = float(math.exp(rng.uniform(math.log(spec[1]), math.log(spec[2]))))
+        else:
+            raise ValueError(f"Unknown search space type: {kind}")
+    return params
+
+
+def load_sweep_split(data_path, val_size, mmap_dir):
+    """Write the training rows, split into train/validation, as arrays in mmap_dir"""
+    n_rows = count_rows(data_path)
+    # Same outer split as train_all, so the sweep never sees the test rows
+    train_idx, _ = train_test_split(np.arange(n_rows), test_size=0.2, random_state=42)
+    tr_idx, val_idx = train_test_split(train_idx, test_size=val_size, random_state=7)
+    SplitArrays.load(data_path, np.concatenate([tr_idx, val_idx]), len(tr_idx), n_rows=n_rows, mmap_dir=mmap_dir)
+
+
+def _init_worker(mmap_dir, pids):
+    global _DATA
+    # Reported so TrialPool.stop() can kill the worker mid-trial
+    pids.put(os.getpid())
+    _DATA = SplitArrays.open(mmap_dir)
+
+
+def _dmatrices():
+    """QuantileDMatrix pair shared by every XGBoost trial in this worker"""
+    global _DMATRICES
+    if _DMATRICES is None:
+        dtrain = xgb.QuantileDMatrix(_DATA.X_train, _DATA.y_train)
+        _DMATRICES = dtrain, xgb.QuantileDMatrix(_DATA.X_test, _DATA.y_test, ref=dtrain)
+    return _DMATRICES
+
+
+def _evaluate(model_name, params, n_estimators, n_threads):
+    """Fit one trial with the given number of trees and score it on the validation split"""
+    started = time.perf_counter()
+    model = build_model(model_name, n_threads, {**params, "n_estimators": n_estimators})
+    result = {}
+    if model_name == "xgb":
+        dtrain, dval = _dmatrices()
+        booster = xgb.train(model.get_xgb_params(), dtrain, num_boost_round=n_estimators,
+                            evals=[(dval, "val")], early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+                            verbose_eval=False)
+        result["best_iteration"] = int(booster.best_iteration) + 1
+        preds = booster.predict(dval, iteration_range=(0, result["best_iteration"]))
+    else:
+        model.fit(_DATA.X_train, _DATA.y_train)
+        preds = model.predict(_DATA.X_test)
+    result["val_rmse"] = float(np.sqrt(np.mean((np.asarray(_DATA.y_test) - preds) ** 2)))
+    result["fit_seconds"] = time.perf_counter() - started
+    return result
+
+
+class TrialPool(ProcessPoolExecutor):
+    """Process pool whose workers map mmap_dir and report their PIDs, so running trials can be killed"""
+
+    def __init__(self, mmap_dir, max_workers):
+        self.worker_pids = multiprocessing.SimpleQueue()
+        super().__init__(max_workers=max_workers, initializer=_init_worker,
+                         initargs=(mmap_dir, self.worker_pids))
+
+    def stop(self):
+        """Cancel queued trials and kill running ones; shutdown() alone would wait for them to finish"""
+        self.shutdown(wait=False, cancel_futures=True)
+        while not self.worker_pids.empty():
+            try:
+                os.kill(self.worker_pids.get(), signal.SIGTERM)
+            except OSError:
+                # Already exited
+                pass
+
+
+def successive_halving(pool, model_name, n_trials, min_resource, max_resource, eta,
+                       n_threads, deadline, rng, log_trial):
+    """Run one successive-halving bracket; returns (best_params, best_result)
+
+    A trial that raises is logged as failed and dropped from the bracket. At the
+    deadline, or once a worker dies, the pool's workers are stopped, so the pool
+    cannot be reused.
+    """
+    trials = [{"id": i, "params": sample_params(SEARCH_SPACES[model_name], rng)} for i in range(n_trials)]
+    alive = trials
+    resource = min_resource
+    best = None
+
+    while alive:
+        try:
+            futures = {
+                pool.submit(_evaluate, model_name, t["params"], resource, n_threads): t for t in alive
+            }
+        except BrokenProcessPool as e:
+            print(f"✗ {model_name} workers stopped at {resource} trees: {e}")
+            break
+        scored = []
+        pending = set(futures)
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # Trials that finished keep their results; unfinished ones are killed
+                pool.stop()
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for f in done:
+                trial = futures[f]
+                try:
+                    result = f.result()
+                except Exception as e:
+                    # A bad configuration or a killed worker (BrokenProcessPool) fails only this trial
+                    log_trial(trial, resource, None, error=e)
+                    continue
+                trial["result"] = result
+                log_trial(trial, resource, result)
+                scored.append(trial)
+                if best is None or result["val_rmse"] < best["result"]["val_rmse"]:
+                    best = {"params": trial["params"], "resource": resource, "result": result}
+
+        if time.monotonic() >= deadline:
+            print(f"⏱ Time budget exhausted for {model_name} at {resource} trees")
+            break
+        if resource >= max_resource or len(scored) <= 1:
+            break
+
+        scored.sort(key=lambda t: t["result"]["val_rmse"])
+        alive = scored[:max(1, len(scored) // eta)]
+        resource = min(resource * eta, max_resource)
+
+    if best is None:
+        return None, None
+    n_estimators = best["result"].get("best_iteration", best["resource"])
+    return {**best["params"], "n_estimators": n_estimators}, best["result"]
+
+
+def _sweep_models(client, experiment_id, mmap_dir, model_names, n_trials, min_resource, max_resource,
+                  eta, deadline, cpu_budget, rng):
+    """Run successive halving for each model on its own pool of workers mapping mmap_dir"""
+    best_params = {}
+    for i, model_name in enumerate(model_names):
+        # Split what is left of the budget evenly between the remaining models
+        model_deadline = time.monotonic() + (deadline - time.monotonic()) / (len(model_names) - i)
+
+        # A pool per model, since hitting a deadline stops the workers
+        with TrialPool(mmap_dir, cpu_budget) as pool, \
+                mlflow.start_run(run_name=f"sweep-{model_name}") as parent:
+            mlflow.log_params({"model_family": model_name, "n_trials": n_trials, "eta": eta,
+                               "min_resource": min_resource, "max_resource": max_resource})
+            # run id -> final status of every trial run created so far
+            trial_runs = {}
+
+            def log_trial(trial, resource, result, error=None):
+                run_id = trial.get("run_id")
+                if run_id is None:
+                    run = client.create_run(experiment_id, run_name=f"{model_name}-trial-{trial['id']}",
+                                            tags={MLFLOW_PARENT_RUN_ID: parent.info.run_id})
+                    run_id = trial["run_id"] = run.info.run_id
+                    trial_runs[run_id] = "FINISHED"
+                    for k, v in trial["params"].items():
+                        client.log_param(run_id, k, v)
+                if error is not None:
+                    trial_runs[run_id] = "FAILED"
+                    client.set_tag(run_id, "error", f"{type(error).__name__}: {error}"[:5000])
+                    print(f"  {model_name} trial {trial['id']:>3} @ {resource:>4} trees: failed ({error!r})")
+                    return
+                for k, v in result.items():
+                    client.log_metric(run_id, k, v, step=resource)
+                print(f"  {model_name} trial {trial['id']:>3} @ {resource:>4} trees: "
+                      f"val_rmse={result['val_rmse']:.5f}")
+
+            try:
+                params, result = successive_halving(
+                    pool, model_name, n_trials, min_resource, max_resource, eta,
+                    n_threads=1, deadline=model_deadline, rng=rng, log_trial=log_trial
+                )
+            finally:
+                for run_id, status in trial_runs.items():
+                    client.set_terminated(run_id, status)
+
+            if params is None:
+                print(f"✗ No {model_name} trial succeeded within the time budget")
+                continue
+            best_params[model_name] = params
+            mlflow.log_metric("best_val_rmse", result["val_rmse"])
+            mlflow.log_dict(params, "best_params.json")
+            print(f"✅ Best {model_name}: val_rmse={result['val_rmse']:.5f} params={params}")
+    return best_params
+
+
+def sweep(data_path, model_names, n_trials=27, min_resource=25, max_resource=675, eta=3,
+          time_budget=600.0, cpu_budget=None, val_size=0.2, seed=42, output_path=None):
+    """Search hyperparameters for each model within a wall-clock budget"""
+    cpu_budget = cpu_budget or os.cpu_count() or 1
+    rng = np.random.default_rng(seed)
+    client = mlflow.tracking.MlflowClient()
+    # Make sure the tracking store and default experiment exist before logging
+    experiment_id = client.get_experiment("0").experiment_id
+
+    deadline = time.monotonic() + time_budget
+    # Workers map one on-disk copy of the split instead of each loading the dataset
+    mmap_dir = tempfile.mkdtemp(prefix=".sweep-", dir=os.path.dirname(os.path.abspath(data_path)))
+    try:
+        load_sweep_split(data_path, val_size, mmap_dir)
+        best_params = _sweep_models(client, experiment_id, mmap_dir, model_names, n_trials, min_resource,
+                                    max_resource, eta, deadline, cpu_budget, rng)
+    finally:
+        shutil.rmtree(mmap_dir, ignore_errors=True)
+
+    if output_path and not best_params:
+        print(f"⚠ No model produced parameters; {output_path} left unchanged")
+    elif output_path:
+        # Models not swept this time (or without a finished trial) keep their earlier parameters
+        saved = {}
+        if os.path.exists(output_path):
+            with open(output_path, "r") as f:
+                saved = json.load(f)
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        with open(output_path, "w") as f:
+            json.dump({**saved, **best_params}, f, indent=4)
+        print(f"✓ Best parameters saved to {output_path}")
+    return best_params
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Successive-halving hyperparameter sweep")
+    parser.add_argument("data_path")
+    parser.add_argument("--models", nargs="+", default=list(SEARCH_SPACES), choices=list(SEARCH_SPACES))
+    parser.add_argument("--trials", type=int, default=27, help="Configurations sampled per model")
+    parser.add_argument("--min-resource", type=int, default=25, help="Trees in the first rung")
+    parser.add_argument("--max-resource", type=int, default=675, help="Trees in the last rung")
+    parser.add_argument("--eta", type=int, default=3, help="Keep the best 1/eta trials per rung")
+    parser.add_argument("--time-budget", type=float, default=600.0, help="Wall-clock budget in seconds")
+    parser.add_argument("--jobs", type=int, default=-1, help="Parallel trials (-1: all cores)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="models/best_params.json")
+    args = parser.parse_args()
+
+    if args.eta < 2:
+        print("--eta must be at least 2")
+        sys.exit(1)
+
+    sweep(args.data_path, args.models, args.trials, args.min_resource, args.max_resource, args.eta,
+          args.time_budget, None if args.jobs == -1 else args.jobs, seed=args.seed,
+          output_path=args.output)
@@ -1,103 +1,161 @@
+"""
+Train the CPU usage models and log them to MLflow.
+
+    python src/train.py data/processed.parquet models/ --models rf --jobs -1
+
+MLflow, scikit-learn estimators, XGBoost and matplotlib are imported where
+they are used, not at module load. A cache hit then restores its outputs
+without loading any of them, and modules that only need build_model() or
+FEATURE_TYPES stay light. `--models` trains a subset, and `--no-plots`
+skips the residual and feature-importance plots.
+"""
+
 import os
 import sys
 import json
+import atexit
+import argparse
+import tempfile
 import joblib
-import mlflow
-import mlflow.sklearn
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
-
-# Import XGBoost
-try:
-    from xgboost import XGBRegressor
-except ImportError:
-    print("Please install xgboost: pip install xgboost")
-    sys.exit(1)
-
-
-def train_and_save(X_train, X_test, y_train, y_test, model, model_name, feature_name_type, model_path_base):
-    # Train
-    model.fit(X_train, y_train)
-
-    # Predict
-    train_preds = model.predict(X_train)
-    test_preds = model.predict(X_test)
-
-    # Metrics
-    metrics = {
-        "model": model_name,
-        "train_rmse": float(np.sqrt(mean_squared_error(y_train, train_preds))),
-        "train_mae": float(mean_absolute_error(y_train, train_preds)),
-        "train_r2": float(r2_score(y_train, train_preds)),
-        "test_rmse": float(np.sqrt(mean_squared_error(y_test, test_preds))),
-        "test_mae": float(mean_absolute_error(y_test, test_preds)),
-        "test_r2": float(r2_score(y_test, test_preds)),
-        "comments": f"Trained {model_name} model"
-    }
+from concurrent.futures import ProcessPoolExecutor
 
-    # Create folders
-    model_dir = os.path.join("metrics", model_name)
-    os.makedirs(model_dir, exist_ok=True)
-    os.makedirs(os.path.dirname(model_path_base), exist_ok=True)
-
-    # Save metrics JSON
-    with open(os.path.join(model_dir, "metrics.json"), "w") as f:
-        json.dump(metrics, f, indent=4)
-
-    # Residual plot
-    plt.figure(figsize=(6, 6))
-    plt.scatter(y_test, test_preds, alpha=0.6)
-    plt.plot([y_test.min(), y_test.max()], [y_test.min(), y_test.max()], "r--")
-    plt.xlabel("Actual CPU Usage")
-    plt.ylabel("Predicted CPU Usage")
-    plt.title(f"Residuals Plot ({model_name})")
-    residuals_path = os.path.join(model_dir, "residuals.png")
-    plt.savefig(residuals_path)
-    plt.close()
-
-    # Feature importance / coefficients
-    try:
-        if model_name == "linear":
-            importance = model.coef_
+from data_io import read_processed
+from lean import SplitArrays, load_train_test
+from compiled import REQUIRE_ENV as REQUIRE_COMPILED_ENV, compiled_path, export_compiled
+from cache import ContentCache, cached_run, data_version, dvc_data_version, hash_sources
+from artifacts import PLOTS_ENV, ArtifactWorker, plot_residuals, plot_feature_importance, plots_enabled
+from profiling import StageProfiler, enable_profiling
+from evaluation import (TRAIN_SAMPLE_ENV, category_codes, controller_kinds, diagnostics, sample_rows,
+                        split_metrics, train_sample_size)
+from incremental import (LINEAR_STATS_FILE, STATE_FILE, appended_rows_start, clear_state, linear_stats,
+                         load_state, save_state, segment_split, solve_linear, split_segments)
+
+
+# Plots and artifact uploads run here, off the training critical path
+artifact_worker = ArtifactWorker()
+atexit.register(artifact_worker.drain)
+
+
+def _log_artifacts(run_id, model, model_name, feature_name_type, model_dir,
+                   y_test, test_preds, feature_names, importance, profile):
+    """Render plots and upload them together with the model to an already-logged run"""
+    import mlflow
+    import mlflow.sklearn
+
+    profiler = StageProfiler(profile=False)
+    residuals_path = feature_imp_path = None
+    if plots_enabled():
+        with profiler.stage("plot"):
+            residuals_path = os.path.join(model_dir, "residuals.png")
+            plot_residuals(y_test, test_preds, model_name, residuals_path)
+
+            if importance is not None:
+                try:
+                    feature_imp_path = os.path.join(model_dir, "feature_importance.png")
+                    plot_feature_importance(feature_names, importance, model_name, feature_name_type,
+                                            feature_imp_path)
+                except Exception:
+                    feature_imp_path = None
+    else:
+        # Plots from an earlier run would no longer match this model
+        for name in ("residuals.png", "feature_importance.png"):
+            if os.path.exists(os.path.join(model_dir, name)):
+                os.remove(os.path.join(model_dir, name))
+
+    with mlflow.start_run(run_id=run_id):
+        with profiler.stage("log_artifacts"):
+            if residuals_path:
+                mlflow.log_artifact(residuals_path)
+            if feature_imp_path:
+                mlflow.log_artifact(feature_imp_path)
+
+        # Log model
+        with profiler.stage("log_model"):
+            mlflow.sklearn.log_model(model, artifact_path="model")
+
+        mlflow.log_metrics({f"{name}_seconds": seconds for name, seconds in profiler.stages.items()})
+        profile["stages"].update(profiler.stages)
+        mlflow.log_dict(profile, "profile.json")
+
+
+def train_and_save(X_train, X_test, y_train, y_test, model, model_name, feature_name_type, model_path_base,
+                   fit_fn=None, stage_seconds=None, feature_names=None):
+    import mlflow
+
+    # Stage timings (plus cProfile/tracemalloc with --profile); stage_seconds covers shared data loading
+    profiler = StageProfiler()
+    profiler.add(stage_seconds)
+    profiler.start()
+
+    # Train (fit_fn lets incremental updates replace a full fit)
+    with profiler.stage("fit"):
+        if fit_fn is None:
+            model.fit(X_train, y_train)
         else:
-            importance = model.feature_importances_
-
-        feature_importance = pd.DataFrame({
-            "feature": X_train.columns,
-            "importance": importance
-        }).sort_values(by="importance", key=abs, ascending=True)
-
-        plt.figure(figsize=(8, 6))
-        plt.barh(feature_importance["feature"], feature_importance["importance"])
-        plt.xlabel(feature_name_type)
-        plt.title(f"{feature_name_type} ({model_name})")
-        feature_imp_path = os.path.join(model_dir, "feature_importance.png")
-        plt.savefig(feature_imp_path)
-        plt.close()
-    except Exception:
-        feature_imp_path = None  # not all models support feature importance
-
-    # MLflow logging
-    with mlflow.start_run(run_name=model_name) as run:
+            fit_fn(model, X_train, y_train)
+
+    # Predict (train metrics are estimated on a sample of rows when TRAIN_METRICS_SAMPLE is set)
+    feature_names = feature_names or list(X_train.columns)
+    train_rows = sample_rows(len(X_train), train_sample_size())
+    X_train_eval, y_train_eval = X_train, y_train
+    if train_rows is not None:
+        X_train_eval = X_train.iloc[train_rows] if hasattr(X_train, "iloc") else X_train[train_rows]
+        y_train_eval = np.asarray(y_train)[train_rows]
+    with profiler.stage("predict"):
+        train_preds = model.predict(X_train_eval)
+        test_preds = model.predict(X_test)
+
+    # Metrics in one NumPy pass per split, plus residual quantiles and per-controller_kind errors
+    with profiler.stage("evaluate"):
+        metrics = {
+            "model": model_name,
+            **split_metrics(y_train_eval, train_preds, y_test, test_preds),
+            "comments": f"Trained {model_name} model"
+        }
+        if train_rows is not None:
+            metrics["train_metrics_rows"] = len(train_rows)
+        categories = controller_kinds(os.path.join(model_path_base, "preprocessor.json"), feature_names)
+        diagnosis = diagnostics(y_test, test_preds, category_codes(X_test, feature_names, categories), categories)
+
+    # Flattened copy of tree models for fast inference, checked against the model's own predictions
+    if model_name in COMPILED_MODELS:
+        with profiler.stage("compile"):
+            error = export_compiled(model, X_test, model_path_base, model_name, feature_names)
+        if error is not None:
+            metrics["compiled_max_abs_error"] = error
+
+    # Training cost goes to MLflow and profile.json only; the DVC metrics file stays deterministic
+    rates = {"train": (len(X_train), "fit"), "predict": (len(X_train_eval) + len(X_test), "predict")}
+    cost = profiler.metrics(rates)
+
+    with profiler.stage("save"):
+        # Create folders
+        model_dir = os.path.join("metrics", model_name)
+        os.makedirs(model_dir, exist_ok=True)
+        os.makedirs(os.path.dirname(model_path_base), exist_ok=True)
+
+        # Save metrics JSON
+        with open(os.path.join(model_dir, "metrics.json"), "w") as f:
+            json.dump(metrics, f, indent=4)
+        with open(os.path.join(model_dir, "diagnostics.json"), "w") as f:
+            json.dump(diagnosis, f, indent=4)
+
+        # Save model locally for DVC before any plotting or uploads
+        model_file = os.path.join(model_path_base, f"{model_name}_model.pkl")
+        joblib.dump(model, model_file)
+
+    # MLflow logging (params and metrics inline; artifacts follow in the background)
+    with profiler.stage("mlflow_log"), mlflow.start_run(run_name=model_name) as run:
         mlflow.log_param("model", model_name)
         mlflow.log_param("data_version", os.getenv("DVC_DATA_VERSION", "unknown"))
 
         for k, v in metrics.items():
             if k not in ["model", "comments"]:
                 mlflow.log_metric(k, v)
-
-        # Log artifacts
-        mlflow.log_artifact(residuals_path)
-        if feature_imp_path:
-            mlflow.log_artifact(feature_imp_path)
-
-        # Log model
-        mlflow.sklearn.log_model(model, artifact_path="model")
+        mlflow.log_metrics(cost)
+        mlflow.log_metric("save_seconds", profiler.stages["save"])
+        mlflow.log_dict(diagnosis, "diagnostics.json")
 
         # Save run info
         run_info = {
@@ -106,38 +164,371 @@ def train_and_save(X_train, X_test, y_train, y_test, model, model_name, feature_
         }
         with open(os.path.join(model_dir, "run_info.json"), "w") as f:
             json.dump(run_info, f, indent=4)
+    profiler.stop()
+    print(f"⏱ {model_name}: {profiler.summary()}")
+
+    # Feature importance / coefficients (not all models support it)
+    importance = getattr(model, "coef_" if model_name == "linear" else "feature_importances_", None)
 
-    # Save model locally for DVC
-    model_file = os.path.join(model_path_base, f"{model_name}_model.pkl")
-    joblib.dump(model, model_file)
+    artifact_worker.submit(
+        _log_artifacts, run.info.run_id, model, model_name, feature_name_type, model_dir,
+        np.asarray(y_test), np.asarray(test_preds), feature_names, importance,
+        profiler.report(rates)
+    )
     print(f"✅ Training complete. {model_name} model saved to {model_file}")
+    return metrics
+
+
+FEATURE_TYPES = {
+    "linear": "Coefficient",
+    "rf": "Feature Importance",
+    "xgb": "Feature Importance",
+}
+
+
+# Models exported as flattened trees next to their pickle (see compiled.py)
+COMPILED_MODELS = ("rf", "xgb")
+
+
+DEFAULT_PARAMS = {
+    "linear": {},
+    "rf": {"n_estimators": 100, "max_depth": 10, "random_state": 42},
+    "xgb": {"n_estimators": 100, "max_depth": 5, "learning_rate": 0.1,
+            "objective": 'reg:squarederror', "random_state": 42, "verbosity": 0},
+}
+
+
+def build_model(model_name, n_threads=None, params=None):
+    """Create an unfitted model; n_threads=None lets the tree models use every core"""
+    if model_name not in DEFAULT_PARAMS:
+        raise ValueError(f"Unknown model: {model_name}")
+    kwargs = {**DEFAULT_PARAMS[model_name], **(params or {})}
+    # Only the requested model's library is imported
+    if model_name == "linear":
+        from sklearn.linear_model import LinearRegression
+        return LinearRegression(**kwargs)
+    if model_name == "rf":
+        from sklearn.ensemble import RandomForestRegressor
+        return RandomForestRegressor(n_jobs=-1 if n_threads is None else n_threads, **kwargs)
+    try:
+        from xgboost import XGBRegressor
+    except ImportError:
+        raise ImportError("Please install xgboost: pip install xgboost")
+    return XGBRegressor(n_jobs=n_threads, **kwargs)
+
+
+def split_cpu_budget(model_names, cpu_budget):
+    """Give the single-threaded linear fit one core and share the rest between tree models"""
+    threads = {name: 1 for name in model_names}
+    tree_models = [name for name in model_names if name != "linear"]
+    if tree_models:
+        spare = max(cpu_budget - (len(model_names) - len(tree_models)), len(tree_models))
+        for i, name in enumerate(tree_models):
+            threads[name] = spare // len(tree_models) + (1 if i < spare % len(tree_models) else 0)
+    return threads
+
+
+def _train_one(X_train, X_test, y_train, y_test, model_name, n_threads, params, model_path_base,
+               stage_seconds=None):
+    """Process-pool task: each model trains and logs its own MLflow run in one process"""
+    model = build_model(model_name, n_threads, params)
+    metrics = train_and_save(X_train, X_test, y_train, y_test, model, model_name,
+                             FEATURE_TYPES[model_name], model_path_base, stage_seconds=stage_seconds)
+    artifact_worker.drain()
+    return metrics
+
 
+def _create_tracking_store():
+    """Make sure the tracking store and default experiment exist before workers race to create them"""
+    import mlflow
+    mlflow.tracking.MlflowClient().get_experiment("0")
 
-def train_all(data_path, model_path_base):
-    df = pd.read_csv(data_path)
+
+def selected_models(model_names=None):
+    """model_names in training order, or every model"""
+    if not model_names:
+        return list(FEATURE_TYPES)
+    unknown = set(model_names) - set(FEATURE_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown models: {sorted(unknown)}")
+    return [name for name in FEATURE_TYPES if name in model_names]
+
+
+def train_all(data_path, model_path_base, cpu_budget=None, params=None, lean=False, model_names=None):
+    if lean:
+        return train_all_lean(data_path, model_path_base, cpu_budget, params, model_names)
+    from sklearn.model_selection import train_test_split
+
+    params = params or {}
+    setup = StageProfiler(profile=False)
+    with setup.stage("load"):
+        df = read_processed(data_path)
     X = df.drop("cpu_usage", axis=1)
     y = df["cpu_usage"]
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42
-    )
+    with setup.stage("split"):
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42
+        )
+
+    model_names = selected_models(model_names)
+
+    if not cpu_budget or cpu_budget == 1:
+        for model_name in model_names:
+            model = build_model(model_name, cpu_budget, params.get(model_name))
+            train_and_save(X_train, X_test, y_train, y_test, model, model_name,
+                           FEATURE_TYPES[model_name], model_path_base, stage_seconds=setup.stages)
+        artifact_worker.drain()
+        record_state(model_path_base, X, y, [len(X)], X_train, y_train, model_names, params)
+        return
+
+    _create_tracking_store()
+
+    threads = split_cpu_budget(model_names, cpu_budget)
+    print(f"Training {len(model_names)} models in parallel with threads {threads}")
+    with ProcessPoolExecutor(max_workers=len(model_names)) as pool:
+        futures = [
+            pool.submit(_train_one, X_train, X_test, y_train, y_test, name, threads[name],
+                        params.get(name), model_path_base, setup.stages)
+            for name in model_names
+        ]
+        for future in futures:
+            future.result()
+
+    record_state(model_path_base, X, y, [len(X)], X_train, y_train, model_names, params)
+
+
+def _train_lean(data, model_name, n_threads, params, model_path_base, stats, stage_seconds):
+    model = build_model(model_name, n_threads, params)
+    fit_fn = None
+    if model_name == "linear":
+        # Solved from X'X and X'y rather than from a float64 copy of X_train
+        def fit_fn(model, X_part, y_part):
+            solve_linear(model, *stats)
+    return train_and_save(data.X_train, data.X_test, data.y_train, data.y_test, model, model_name,
+                          FEATURE_TYPES[model_name], model_path_base, fit_fn=fit_fn,
+                          stage_seconds=stage_seconds, feature_names=data.feature_names)
+
+
+def _train_one_lean(mmap_dir, model_name, n_threads, params, model_path_base, stats, stage_seconds):
+    """Process-pool task: map the shared arrays instead of receiving a pickled copy"""
+    metrics = _train_lean(SplitArrays.open(mmap_dir), model_name, n_threads, params, model_path_base,
+                          stats, stage_seconds)
+    artifact_worker.drain()
+    return metrics
+
+
+def train_all_lean(data_path, model_path_base, cpu_budget=None, params=None, model_names=None):
+    """train_all on one float32 matrix whose train/test splits are views (see lean.py)"""
+    params = params or {}
+    model_names = selected_models(model_names)
+    parallel = bool(cpu_budget) and cpu_budget > 1
+    os.makedirs(model_path_base, exist_ok=True)
+
+    setup = StageProfiler(profile=False)
+    with tempfile.TemporaryDirectory(prefix=".lean-", dir=model_path_base) as mmap_dir:
+        with setup.stage("load"):
+            data = load_train_test(data_path, mmap_dir=mmap_dir if parallel else None)
+        with setup.stage("linear_stats"):
+            stats = linear_stats(data.X_train, data.y_train)
+
+        if not parallel:
+            for model_name in model_names:
+                _train_lean(data, model_name, cpu_budget, params.get(model_name), model_path_base,
+                            stats, setup.stages)
+            artifact_worker.drain()
+        else:
+            _create_tracking_store()
+
+            threads = split_cpu_budget(model_names, cpu_budget)
+            print(f"Training {len(model_names)} models in parallel with threads {threads}")
+            with ProcessPoolExecutor(max_workers=len(model_names)) as pool:
+                futures = [
+                    pool.submit(_train_one_lean, mmap_dir, name, threads[name], params.get(name),
+                                model_path_base, stats, setup.stages)
+                    for name in model_names
+                ]
+                for future in futures:
+                    future.result()
+
+        record_state(model_path_base, data.X, data.y, [len(data.X)], None, None, model_names, params,
+                     stats=stats, position=data.position)
+
+
+# Modules whose code decides what train_all produces (part of the cache key)
+CACHE_SOURCES = ["train.py", "compiled.py", "lean.py", "incremental.py", "data_io.py", "artifacts.py",
+                 "evaluation.py"]
+
 
-    models = {
-        "linear": (LinearRegression(), "Coefficient"),
-        "rf": (RandomForestRegressor(n_estimators=100, max_depth=10, random_state=42), "Feature Importance"),
-        "xgb": (XGBRegressor(n_estimators=100, max_depth=5, learning_rate=0.1,
-                             objective='reg:squarederror', random_state=42, verbosity=0), "Feature Importance")
+def cache_outputs(model_path_base, model_names=None):
+    """Files train_all writes, by their name inside a cache entry"""
+    outputs = {name: os.path.join(model_path_base, name) for name in (STATE_FILE, LINEAR_STATS_FILE)}
+    for model_name in selected_models(model_names):
+        outputs[f"{model_name}_model.pkl"] = os.path.join(model_path_base, f"{model_name}_model.pkl")
+        if model_name in COMPILED_MODELS:
+            outputs[f"{model_name}_compiled"] = compiled_path(model_path_base, model_name)
+        for file_name in ("metrics.json", "diagnostics.json", "run_info.json", "residuals.png",
+                          "feature_importance.png"):
+            outputs[f"metrics/{model_name}/{file_name}"] = os.path.join("metrics", model_name, file_name)
+    return outputs
+
+
+def train_all_cached(data_path, model_path_base, cpu_budget=None, params=None, lean=False, cache=None,
+                     data_hash=None, model_names=None):
+    """train_all, skipped when the same data, code and parameters were trained before"""
+    cache = cache or ContentCache()
+    params = params or {}
+    model_names = selected_models(model_names)
+    key_parts = {
+        "data": data_hash or cache.file_hash(data_path),
+        "code": hash_sources(CACHE_SOURCES),
+        "params": {name: {**DEFAULT_PARAMS[name], **(params.get(name) or {})} for name in model_names},
+        "lean": lean,
+        "train_metrics_sample": train_sample_size(),
+        "plots": plots_enabled(),
     }
+    return cached_run("train", key_parts, cache_outputs(model_path_base, model_names),
+                      lambda: train_all(data_path, model_path_base, cpu_budget, params, lean, model_names),
+                      cache)
+
+
+def record_state(model_path_base, X, y, segments, X_train, y_train, model_names, params,
+                 stats=None, position=None):
+    """Save what the models were trained on so the next run can be incremental"""
+    if len(model_names) < len(FEATURE_TYPES):
+        # The models left out were trained on other data, so the next incremental run retrains fully
+        clear_state(model_path_base)
+        return
+    xtx, xty = stats if stats is not None else linear_stats(X_train, y_train)
+    base_n_estimators = {name: build_model(name, 1, params.get(name)).get_params().get("n_estimators")
+                   for name in model_names}
+    save_state(model_path_base, X, y, segments, xtx, xty, base_n_estimators, position)
+
+
+def new_tree_count(base_n_estimators, n_new, n_total):
+    """Trees to add so the ensemble weights new rows like the rows it has already seen"""
+    return max(1, int(np.ceil(base_n_estimators * n_new / max(n_total, 1))))
 
-    for model_name, (model, feature_type) in models.items():
-        train_and_save(X_train, X_test, y_train, y_test, model, model_name, feature_type, model_path_base)
+
+def train_incremental(data_path, model_path_base):
+    """Update the saved models with rows appended since the last run, or retrain fully"""
+    state, stats = load_state(model_path_base)
+    setup = StageProfiler(profile=False)
+    with setup.stage("load"):
+        df = read_processed(data_path)
+    X = df.drop("cpu_usage", axis=1)
+    y = df["cpu_usage"]
+
+    start = None
+    if state is not None:
+        start = appended_rows_start(state, X, y)
+    model_names = list(FEATURE_TYPES)
+    if start is None or not all(
+            os.path.exists(os.path.join(model_path_base, f"{name}_model.pkl")) for name in model_names):
+        print("↻ No incremental state matches this data; retraining from scratch")
+        return train_all(data_path, model_path_base)
+    if start == len(X):
+        print("✓ No new rows since the last training run")
+        return
+
+    segments = state["segments"] + [len(X)]
+    delta_train, _ = segment_split(start, len(X))
+    train_idx, test_idx = split_segments(segments)
+    X_delta, y_delta = X.iloc[delta_train], y.iloc[delta_train]
+    # Test metrics cover every held-out row; train metrics cover the rows fitted in this update
+    X_test, y_test = X.iloc[test_idx], y.iloc[test_idx]
+    print(f"Incremental update with {len(X) - start} new rows ({len(delta_train)} for training)")
+
+    xtx, xty = stats
+    dxtx, dxty = linear_stats(X_delta, y_delta)
+    xtx, xty = xtx + dxtx, xty + dxty
+    n_new_trees = {
+        name: new_tree_count(state["base_n_estimators"].get(name) or 0, len(delta_train), len(train_idx))
+        for name in model_names
+    }
+
+    def fit_linear(model, X_part, y_part):
+        solve_linear(model, xtx, xty)
+
+    def fit_rf(model, X_part, y_part):
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + n_new_trees["rf"])
+        model.fit(X_part, y_part)
+
+    def fit_xgb(model, X_part, y_part):
+        booster = model.get_booster()
+        model.set_params(n_estimators=n_new_trees["xgb"])
+        model.fit(X_part, y_part, xgb_model=booster)
+
+    fit_fns = {"linear": fit_linear, "rf": fit_rf, "xgb": fit_xgb}
+    for model_name in model_names:
+        model = joblib.load(os.path.join(model_path_base, f"{model_name}_model.pkl"))
+        train_and_save(X_delta, X_test, y_delta, y_test, model, model_name,
+                       FEATURE_TYPES[model_name], model_path_base, fit_fn=fit_fns[model_name],
+                       stage_seconds=setup.stages)
+    artifact_worker.drain()
+
+    save_state(model_path_base, X, y, segments, xtx, xty, state["base_n_estimators"])
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: python train.py <data_path> <models_folder>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Train CPU usage models and log them to MLflow")
+    parser.add_argument("data_path")
+    parser.add_argument("model_path_base", metavar="models_folder")
+    parser.add_argument("--models", nargs="+", choices=list(FEATURE_TYPES), default=None,
+                        help="Models to train (default: all)")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="CPU budget for training the models in parallel (-1: all cores)")
+    parser.add_argument("--params", default=None,
+                        help="JSON file of per-model hyperparameter overrides (e.g. from sweep.py)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only fit rows appended since the last run (falls back to a full retrain)")
+    parser.add_argument("--lean", action="store_true",
+                        help="Train from one float32 matrix with view-based splits (lower peak memory)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Capture cProfile and tracemalloc snapshots into each run's profile.json")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always retrain instead of restoring results for unchanged data, code and params")
+    parser.add_argument("--train-metrics-sample", type=int, default=None,
+                        help="Estimate train-set metrics on this many sampled rows instead of all of them")
+    parser.add_argument("--require-compiled", action="store_true",
+                        help="Fail when a tree model cannot be compiled or verified instead of keeping only its pickle")
+    parser.add_argument("--no-plots", action="store_true",
+                        help="Skip the residual and feature-importance plots (matplotlib is never imported)")
+    args = parser.parse_args()
+
+    if args.incremental and args.models:
+        parser.error("--incremental updates every model; drop --models")
+
+    if args.profile:
+        enable_profiling()
+    if args.train_metrics_sample:
+        # Through the environment so process-pool workers use the same sample size
+        os.environ[TRAIN_SAMPLE_ENV] = str(args.train_metrics_sample)
+    if args.no_plots:
+        os.environ[PLOTS_ENV] = "0"
+    if args.require_compiled:
+        os.environ[REQUIRE_COMPILED_ENV] = "1"
+
+    # Under DVC (DVC_DATA_VERSION set) the stage only reruns on changed inputs, so there is nothing to cache.
+    # Otherwise the data hash is both the cache key and the MLflow data_version (workers inherit it)
+    use_cache = not args.no_cache and dvc_data_version() is None
+    if use_cache:
+        cache = ContentCache()
+        data_hash = cache.file_hash(args.data_path)
+        os.environ["DVC_DATA_VERSION"] = data_version(data_hash)
+
+    if args.incremental:
+        train_incremental(args.data_path, args.model_path_base)
+        sys.exit(0)
+
+    params = None
+    if args.params:
+        with open(args.params, "r") as f:
+            params = json.load(f)
 
-    data_path = sys.argv[1]
-    model_path_base = sys.argv[2]
-    train_all(data_path, model_path_base)
+    cpu_budget = os.cpu_count() if args.jobs == -1 else args.jobs
+    if not use_cache:
+        train_all(args.data_path, args.model_path_base, cpu_budget, params, args.lean, args.models)
+    else:
+        train_all_cached(args.data_path, args.model_path_base, cpu_budget, params, args.lean, cache, data_hash,
+                         args.models)
@@ -0,0 +1,164 @@
+"""
+Fitted preprocessing transform shared by training and inference.
+
+`preprocess()` fits it once on the training data and saves it as a small JSON
+artifact next to the models. Scoring code loads that artifact and builds
+features with NumPy only, so no scaler is refitted and no DataFrame is built
+per request.
+"""
+
+import json
+from collections.abc import Mapping
+
+import numpy as np
+
+NUM_COLS = ['cpu_request', 'mem_request', 'cpu_limit', 'mem_limit', 'runtime_minutes']
+CATEGORICAL_COL = 'controller_kind'
+
+
+class FeatureTransform:
+    """Standard scaling of the numeric columns plus drop-first one-hot encoding"""
+
+    def __init__(self, mean, scale, categories, num_cols=NUM_COLS, categorical_col=CATEGORICAL_COL):
+        self.num_cols = list(num_cols)
+        self.categorical_col = categorical_col
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.categories = list(categories)
+
+        # Same layout as pd.get_dummies(drop_first=True): first category is all zeros
+        self.dummy_columns = [f"{categorical_col}_{c}" for c in self.categories[1:]]
+        self.feature_columns = self.num_cols + self.dummy_columns
+        self.n_features = len(self.feature_columns)
+        self._num = list(zip(self.num_cols, self.mean.tolist(), self.scale.tolist()))
+        self._dummy_index = {c: len(self.num_cols) + i for i, c in enumerate(self.categories[1:])}
+
+    @classmethod
+    def fit(cls, df, num_cols=NUM_COLS, categorical_col=CATEGORICAL_COL):
+        """Fit scaler statistics and the category set on a DataFrame; missing values are ignored"""
+        values = df[num_cols].to_numpy(dtype=np.float64)
+        _check_observed((~np.isnan(values)).sum(axis=0), num_cols)
+        mean = np.nanmean(values, axis=0)
+        scale = np.nanstd(values, axis=0)
+        categories = sorted(str(c) for c in df[categorical_col].dropna().unique())
+        return cls(mean, _safe_scale(scale), categories, num_cols, categorical_col)
+
+    @classmethod
+    def from_stats(cls, stats, categories, num_cols=NUM_COLS, categorical_col=CATEGORICAL_COL):
+        """Build the transform from RunningStats accumulated over chunks"""
+        _check_observed(stats.count, num_cols)
+        return cls(stats.mean, _safe_scale(stats.std()), sorted(categories), num_cols, categorical_col)
+
+    def to_dict(self):
+        return {
+            "num_cols": self.num_cols,
+            "mean": self.mean.tolist(),
+            "scale": self.scale.tolist(),
+            "categorical_col": self.categorical_col,
+            "categories": self.categories,
+            "feature_columns": self.feature_columns,
+        }
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as f:
+            data = json.load(f)
+        categories = data.get("categories")
+        if categories is None:
+            # Older artifacts only list the kept dummy columns; the dropped one is unknown
+            prefix = data["categorical_col"] + "_"
+            categories = [None] + [c[len(prefix):] for c in data["feature_columns"] if c.startswith(prefix)]
+        return cls(data["mean"], data["scale"], categories, data["num_cols"], data["categorical_col"])
+
+    def transform_frame(self, df):
+        """Transform a DataFrame into the processed training layout"""
+        out = df[self.num_cols].astype(np.float64)
+        out = (out - self.mean) / self.scale
+        kinds = df[self.categorical_col].astype(str)
+        for category, column in zip(self.categories[1:], self.dummy_columns):
+            out[column] = (kinds == category).to_numpy()
+        return out
+
+    def transform_row(self, spec):
+        """Features for a single raw pod spec (a mapping of column -> value)"""
+        row = [(float(spec[col]) - mean) / scale for col, mean, scale in self._num]
+        row.extend([0.0] * len(self.dummy_columns))
+        j = self._dummy_index.get(spec[self.categorical_col])
+        if j is not None:
+            row[j] = 1.0
+        return np.array(row, dtype=np.float64)
+
+    def transform_batch(self, specs):
+        """Features for many pod specs, given as a list of mappings or column -> sequence"""
+        if isinstance(specs, Mapping):
+            n = len(specs[self.categorical_col])
+            X = np.zeros((n, self.n_features), dtype=np.float64)
+            for i, (col, mean, scale) in enumerate(self._num):
+                X[:, i] = (np.asarray(specs[col], dtype=np.float64) - mean) / scale
+            kinds = np.asarray(specs[self.categorical_col]).astype(str)
+            for category, j in self._dummy_index.items():
+                X[:, j] = kinds == category
+            return X
+
+        n_num = len(self._num)
+        rows = []
+        for spec in specs:
+            row = [(float(spec[col]) - mean) / scale for col, mean, scale in self._num]
+            row.extend([0.0] * (self.n_features - n_num))
+            j = self._dummy_index.get(spec[self.categorical_col])
+            if j is not None:
+                row[j] = 1.0
+            rows.append(row)
+        return np.array(rows, dtype=np.float64).reshape(len(specs), self.n_features)
+
+
+class RunningStats:
+    """Per-column count, mean and sum of squared deviations, merged chunk by chunk
+
+    Missing (NaN) values are skipped, as StandardScaler does, so each column
+    keeps its own count.
+    """
+
+    def __init__(self, n_cols):
+        self.count = np.zeros(n_cols, dtype=np.int64)
+        self.mean = np.zeros(n_cols, dtype=np.float64)
+        self.m2 = np.zeros(n_cols, dtype=np.float64)
+
+    def update(self, values):
+        """Merge a 2-D block of rows (Chan et al. parallel variance update)"""
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape[0] == 0:
+            return
+        observed = ~np.isnan(values)
+        n = observed.sum(axis=0)
+        mean = np.where(observed, values, 0.0).sum(axis=0) / np.maximum(n, 1)
+        m2 = np.where(observed, (values - mean) ** 2, 0.0).sum(axis=0)
+        total = self.count + n
+        share = n / np.maximum(total, 1)
+        delta = mean - self.mean
+        self.mean = self.mean + delta * share
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * share
+        self.count = total
+
+    def std(self):
+        """Population standard deviation, as StandardScaler uses"""
+        return np.sqrt(self.m2 / np.maximum(self.count, 1))
+
+
+def _check_observed(counts, num_cols):
+    """Raise ValueError for numeric columns without a single non-missing value"""
+    empty = [col for col, n in zip(num_cols, counts) if n == 0]
+    if empty:
+        raise ValueError(f"Cannot fit the transform: no values in column(s) {', '.join(empty)}")
+
+
+def _safe_scale(scale):
+    """Mirror StandardScaler: constant columns are left unscaled"""
+    scale = np.asarray(scale, dtype=np.float64).copy()
+    scale[(scale == 0) | ~np.isfinite(scale)] = 1.0
+    return scale
+
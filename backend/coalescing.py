@@ -0,0 +1,51 @@
+"""
+Blocking work run off the event loop, with identical concurrent calls coalesced.
+
+Building a response body (filtering, sorting and serializing thousands of runs)
+and scanning mlruns are synchronous. They run on a small, bounded thread pool
+so the event loop keeps answering other requests, `/health` included. Callers
+that ask for the same key while a call is in flight await that call's result
+instead of starting their own, so a burst of identical dashboard requests
+costs one build.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Optional
+
+
+class Coalescer:
+    """Runs callables on a bounded thread pool; concurrent calls with the same key share one run"""
+
+    def __init__(self, max_workers: int = 4, thread_name_prefix: str = "backend-io"):
+        self.max_workers = max_workers
+        self._thread_name_prefix = thread_name_prefix
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix=self._thread_name_prefix)
+        return self._pool
+
+    async def run(self, key: Hashable, fn: Callable[[], object]):
+        """Result of fn() computed on the pool, shared with concurrent callers using the same key"""
+        future = self._inflight.get(key)
+        if future is not None:
+            # shield: one caller being cancelled must not cancel the shared call
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().run_in_executor(self.pool, fn)
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def run_blocking(self, fn: Callable[[], object]):
+        """fn() on the pool without coalescing (startup scans, one-off work)"""
+        return await asyncio.get_running_loop().run_in_executor(self.pool, fn)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
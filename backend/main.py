@@ -1,15 +1,76 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 import os
+import sys
 import json
+import asyncio
 from pathlib import Path
 
+# Share the run scanner and feature transform with the Q3 training code
+Q3_PATH = Path(__file__).resolve().parent.parent / "Q3"
+sys.path.insert(0, str(Q3_PATH / "src"))
+sys.path.insert(0, str(Q3_PATH))
+
+from metrics_sources import open_source
+from metrics_index import MetricsIndex
+from queries import FILTER_KEYS, QueryError, aggregate, best_run, by_model, query_runs
+from prediction import PredictionService
+from registry import ModelRegistry
+from streaming import RunBroadcaster
+from coalescing import Coalescer
+from snapshot import SharedSnapshot, locking_available
+
+MLRUNS_PATH = os.getenv("MLRUNS_PATH", "../Q3/mlruns")
+# An mlruns path or a sqlite:/// MLflow tracking store (relative paths are from this directory)
+METRICS_SOURCE = os.getenv("METRICS_SOURCE", MLRUNS_PATH)
+MLRUNS_POLL_INTERVAL = float(os.getenv("MLRUNS_POLL_INTERVAL", "5"))
+MODELS_PATH = os.getenv("MODELS_PATH", "../Q3/models")
+PREDICT_MAX_BATCH = int(os.getenv("PREDICT_MAX_BATCH", "1024"))
+PREDICT_MAX_WAIT_MS = float(os.getenv("PREDICT_MAX_WAIT_MS", "2"))
+PREDICT_COMPILED = os.getenv("PREDICT_COMPILED", "1") == "1"
+# Serve the best logged run of each model family instead of only the pickles in MODELS_PATH
+MODEL_REGISTRY = os.getenv("MODEL_REGISTRY", "1") == "1"
+MODEL_REGISTRY_METRIC = os.getenv("MODEL_REGISTRY_METRIC", "test_rmse")
+MODEL_CACHE_MB = float(os.getenv("MODEL_CACHE_MB", "512"))
+BACKEND_IO_THREADS = int(os.getenv("BACKEND_IO_THREADS", "4"))
+# Set when running several uvicorn workers so only one of them scans mlruns
+METRICS_SNAPSHOT = os.getenv("METRICS_SNAPSHOT")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the metrics index once (off the event loop) and keep it fresh while serving"""
+    # Models unpickle on the pool while the index is built, instead of blocking the loop afterwards
+    build_index = shared_snapshot.sync if shared_snapshot is not None else metrics_index.refresh
+    await asyncio.gather(coalescer.run_blocking(build_index), coalescer.run_blocking(prediction_service.load))
+    if shared_snapshot is not None:
+        shared_snapshot.start(MLRUNS_POLL_INTERVAL)
+    else:
+        metrics_index.start_watching(MLRUNS_POLL_INTERVAL)
+    run_broadcaster.start()
+    prediction_service.start()
+    if model_registry is not None:
+        model_registry.start()
+    yield
+    if model_registry is not None:
+        model_registry.stop()
+    await prediction_service.stop()
+    run_broadcaster.stop()
+    if shared_snapshot is not None:
+        shared_snapshot.stop()
+    else:
+        metrics_index.stop_watching()
+    coalescer.shutdown()
+
 app = FastAPI(
     title="MLOps Metrics API",
     description="API for serving ML model metrics from MLflow experiments",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS configuration
@@ -30,85 +91,107 @@ class ModelMetrics(BaseModel):
     test_mae: float
     test_r2: float
     mlflow_run_id: str
+    experiment_id: Optional[str] = None
+    data_version: Optional[str] = None
+    start_time: Optional[int] = None
     timestamp: Optional[str] = None
+    fit_seconds: Optional[float] = None
+    predict_seconds: Optional[float] = None
+    peak_mem_mb: Optional[float] = None
+    train_rows_per_sec: Optional[float] = None
 
 class MetricsResponse(BaseModel):
     metrics: List[ModelMetrics]
     total_count: int
+    next_cursor: Optional[str] = None
 
-def read_mlflow_metric(metric_file: Path) -> float:
-    """Read metric value from MLflow metric file"""
-    try:
-        with open(metric_file, 'r') as f:
-            lines = f.readlines()
-            if lines:
-                # Format: timestamp value step
-                parts = lines[0].strip().split()
-                if len(parts) >= 2:
-                    return float(parts[1])
-    except Exception as e:
-        print(f"Error reading metric file {metric_file}: {e}")
-    return 0.0
+class PodSpec(BaseModel):
+    cpu_request: float
+    mem_request: float
+    cpu_limit: float
+    mem_limit: float
+    runtime_minutes: float
+    controller_kind: str
 
-def read_mlflow_param(param_file: Path) -> str:
-    """Read parameter value from MLflow param file"""
-    try:
-        with open(param_file, 'r') as f:
-            return f.read().strip()
-    except Exception as e:
-        print(f"Error reading param file {param_file}: {e}")
-    return ""
+class PredictRequest(BaseModel):
+    instances: List[PodSpec]
+    model: Optional[str] = None  # Defaults to every loaded model
 
-def get_metrics_from_mlflow(mlruns_path: str = "../Q3/mlruns") -> List[ModelMetrics]:
-    """Extract metrics from MLflow experiment runs"""
-    metrics_list = []
-    
-    # Get the absolute path to mlruns
-    base_path = Path(__file__).parent / mlruns_path
-    experiment_path = base_path / "0"  # Default experiment ID
+class PredictResponse(BaseModel):
+    predictions: Dict[str, List[float]]
+
+def get_metrics_from_mlflow(mlruns_path: str = METRICS_SOURCE) -> List[ModelMetrics]:
+    """Extract metrics from every MLflow experiment of an mlruns tree or SQLite store"""
+    source = open_source(mlruns_path, Path(__file__).parent)
     
-    if not experiment_path.exists():
-        print(f"MLflow experiment path not found: {experiment_path}")
-        return metrics_list
+    if not source.exists():
+        print(f"MLflow runs source not found: {source}")
+        return []
     
-    # Iterate through all run directories
-    for run_dir in experiment_path.iterdir():
-        if not run_dir.is_dir() or run_dir.name in ['meta.yaml', 'models']:
-            continue
-        
-        metrics_dir = run_dir / "metrics"
-        params_dir = run_dir / "params"
-        
-        if not metrics_dir.exists() or not params_dir.exists():
-            continue
-        
-        try:
-            # Read model name from params
-            model_file = params_dir / "model"
-            if not model_file.exists():
-                continue
-            
-            model_name = read_mlflow_param(model_file)
-            
-            # Read all metrics
-            metrics = ModelMetrics(
-                model=model_name,
-                train_rmse=read_mlflow_metric(metrics_dir / "train_rmse"),
-                train_mae=read_mlflow_metric(metrics_dir / "train_mae"),
-                train_r2=read_mlflow_metric(metrics_dir / "train_r2"),
-                test_rmse=read_mlflow_metric(metrics_dir / "test_rmse"),
-                test_mae=read_mlflow_metric(metrics_dir / "test_mae"),
-                test_r2=read_mlflow_metric(metrics_dir / "test_r2"),
-                mlflow_run_id=run_dir.name,
-            )
-            
-            metrics_list.append(metrics)
-            
-        except Exception as e:
-            print(f"Error processing run {run_dir.name}: {e}")
-            continue
+    return [make_model_metrics(**run) for run in source.runs()]
+
+def make_model_metrics(**run) -> ModelMetrics:
+    """Build ModelMetrics from a scanned run, deriving the ISO timestamp from start_time"""
+    if run.get("start_time") is not None:
+        run["timestamp"] = datetime.fromtimestamp(run["start_time"] / 1000, tz=timezone.utc).isoformat()
+    return ModelMetrics(**run)
+
+def to_ms(value: Optional[datetime]) -> Optional[int]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+# Blocking work (scans, building and serializing bodies) runs on a bounded pool;
+# identical concurrent requests share one build
+coalescer = Coalescer(BACKEND_IO_THREADS)
+
+# Served from memory; refreshed at startup and whenever a run directory changes
+metrics_index = MetricsIndex(open_source(METRICS_SOURCE, Path(__file__).parent), make_model_metrics)
+run_broadcaster = RunBroadcaster(metrics_index, coalescer=coalescer)
+
+# With several workers, one scans and the others load its snapshot
+if METRICS_SNAPSHOT and not locking_available():
+    print("⚠ METRICS_SNAPSHOT needs fcntl, which this platform lacks; each worker scans on its own")
+shared_snapshot = SharedSnapshot(
+    metrics_index, Path(__file__).parent / METRICS_SNAPSHOT, lambda run: run.model_dump()
+) if METRICS_SNAPSHOT and locking_available() else None
+
+# Trained models, loaded once at startup and served through micro-batching
+prediction_service = PredictionService(
+    Path(__file__).parent / MODELS_PATH, PREDICT_MAX_BATCH, PREDICT_MAX_WAIT_MS, PREDICT_COMPILED
+)
+
+# Best run per model family, loaded in the background and swapped in while serving
+model_registry = ModelRegistry(
+    metrics_index, prediction_service, MODEL_REGISTRY_METRIC, MODEL_CACHE_MB, PREDICT_COMPILED,
+    MLRUNS_POLL_INTERVAL
+) if MODEL_REGISTRY else None
+
+# Serialized bodies keyed by path and query, reused while the index ETag is unchanged.
+# Paging cursors make the key space open-ended, so the cache is bounded
+RESPONSE_CACHE_SIZE = 1024
+_response_cache = {}
+
+async def cached_json_response(request: Request, build: Callable[[], object]) -> Response:
+    """Serve a JSON body derived from the index, honouring If-None-Match
+
+    Bodies are built on the I/O pool; concurrent requests for the same body share one build.
+    """
+    etag = metrics_index.etag
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
     
-    return metrics_list
+    key = str(request.url.path) + "?" + str(request.url.query)
+    cached = _response_cache.get(key)
+    if cached is None or cached[0] != etag:
+        body = await coalescer.run((key, etag), lambda: json.dumps(build()).encode())
+        cached = (etag, body)
+        if len(_response_cache) >= RESPONSE_CACHE_SIZE:
+            _response_cache.clear()
+        _response_cache[key] = cached
+    return Response(content=cached[1], media_type="application/json", headers={"ETag": etag})
 
 @app.get("/")
 async def root():
@@ -119,6 +202,13 @@ async def root():
         "endpoints": {
             "/api/metrics": "Get all model metrics",
             "/api/metrics/{model_name}": "Get metrics for specific model",
+            "/api/runs": "Paginated, filterable and sortable run metrics",
+            "/api/runs/stream": "Server-Sent Events stream of new and updated runs",
+            "/api/aggregates": "Per-model distribution of a metric",
+            "/api/models/best": "Best run per model",
+            "/predict": "Predict CPU usage for raw pod specs",
+            "/predict/stats": "Per-model prediction throughput and latency",
+            "/predict/models": "Model version served per family and the registry cache",
             "/health": "Health check endpoint"
         }
     }
@@ -129,43 +219,151 @@ async def health_check():
     return {"status": "healthy"}
 
 @app.get("/api/metrics", response_model=List[ModelMetrics])
-async def get_all_metrics():
+async def get_all_metrics(request: Request):
     """Get all model metrics from MLflow"""
     try:
-        metrics = get_metrics_from_mlflow()
-        if not metrics:
-            # Return empty list instead of error for better UX
-            return []
-        return metrics
+        # Return empty list instead of error for better UX
+        return await cached_json_response(
+            request, lambda: [m.model_dump() for m in metrics_index.runs]
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching metrics: {str(e)}")
 
 @app.get("/api/metrics/{model_name}", response_model=List[ModelMetrics])
-async def get_model_metrics(model_name: str):
+async def get_model_metrics(model_name: str, request: Request):
     """Get metrics for a specific model"""
-    try:
-        all_metrics = get_metrics_from_mlflow()
-        filtered_metrics = [m for m in all_metrics if m.model.lower() == model_name.lower()]
+    def build():
+        filtered_metrics = by_model(metrics_index).get(model_name.lower(), [])
         
         if not filtered_metrics:
             raise HTTPException(status_code=404, detail=f"No metrics found for model: {model_name}")
         
-        return filtered_metrics
+        return [m.model_dump() for m in filtered_metrics]
+    
+    try:
+        return await cached_json_response(request, build)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching metrics: {str(e)}")
 
 @app.get("/api/models")
-async def get_available_models():
+async def get_available_models(request: Request):
     """Get list of available models"""
-    try:
-        metrics = get_metrics_from_mlflow()
-        models = list(set(m.model for m in metrics))
+    def build():
+        models = sorted(set(m.model for m in metrics_index.runs))
         return {"models": models, "count": len(models)}
+    
+    try:
+        return await cached_json_response(request, build)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching models: {str(e)}")
 
+@app.get("/api/runs", response_model=MetricsResponse)
+async def get_runs(
+    request: Request,
+    model: Optional[str] = None,
+    data_version: Optional[str] = None,
+    experiment_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    where: List[str] = Query([], description="Metric thresholds, e.g. test_r2>=0.8"),
+    sort: str = Query("-start_time", description="Metric or start_time; prefix '-' for descending"),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Get one page of runs matching the filters, in sort order"""
+    def build():
+        page, total_count, next_cursor = query_runs(
+            metrics_index, model, data_version, experiment_id, to_ms(since), to_ms(until),
+            where, sort, cursor, limit
+        )
+        return {
+            "metrics": [m.model_dump() for m in page],
+            "total_count": total_count,
+            "next_cursor": next_cursor,
+        }
+    
+    try:
+        return await cached_json_response(request, build)
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching runs: {str(e)}")
+
+@app.get("/api/runs/stream")
+async def stream_runs(request: Request):
+    """Push new, updated and removed runs as Server-Sent Events"""
+    return StreamingResponse(
+        run_broadcaster.events(request, request.headers.get("last-event-id")),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/aggregates")
+async def get_aggregates(request: Request, metric: str = "test_rmse"):
+    """Per-model count, mean, percentiles and best run of one metric"""
+    try:
+        return await cached_json_response(
+            request, lambda: {"metric": metric, "models": aggregate(metrics_index, metric)}
+        )
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error aggregating metrics: {str(e)}")
+
+@app.get("/api/models/best")
+async def get_best_models(request: Request, metric: str = "test_rmse"):
+    """Best run of each model by one metric"""
+    def build():
+        if metric not in FILTER_KEYS:
+            raise QueryError(f"Unknown metric {metric!r}; use one of {', '.join(FILTER_KEYS)}")
+        best = {model: best_run(runs, metric) for model, runs in sorted(by_model(metrics_index).items())}
+        return {
+            "metric": metric,
+            "models": {model: run.model_dump() for model, run in best.items() if run is not None},
+        }
+    
+    try:
+        return await cached_json_response(request, build)
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching best models: {str(e)}")
+
+@app.post("/predict", response_model=PredictResponse)
+async def predict(request: PredictRequest):
+    """Predict CPU usage for raw pod specs with one or all loaded models"""
+    if not prediction_service.models:
+        raise HTTPException(status_code=503, detail="No trained models are loaded")
+    
+    models = prediction_service.models
+    if request.model is not None:
+        if request.model.lower() not in models:
+            raise HTTPException(status_code=404, detail=f"Model not loaded: {request.model}")
+        models = [request.model.lower()]
+    
+    if not request.instances:
+        return {"predictions": {name: [] for name in models}}
+    
+    try:
+        specs = [spec.model_dump() for spec in request.instances]
+        return {"predictions": await prediction_service.predict(specs, models)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error predicting: {str(e)}")
+
+@app.get("/predict/stats")
+async def get_prediction_stats():
+    """Per-model throughput and latency counters"""
+    return {"models": prediction_service.stats()}
+
+@app.get("/predict/models")
+async def get_served_models():
+    """Run each model family is served from, and the versions the registry keeps loaded"""
+    if model_registry is None:
+        return {"serving": {name: "local" for name in prediction_service.models}}
+    return model_registry.status()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,166 @@
+"""
+In-process index of MLflow run metrics.
+
+The index is built once at startup and then refreshed incrementally: every
+refresh only asks the metrics source for per-run change signatures (run,
+params and metrics directory mtimes for an mlruns tree, one SQL query for a
+SQLite store, see Q3/metrics_sources.py) and re-reads the runs whose signature
+changed, so serving a request never touches the metric files. Runs carry each
+metric's first logged value, so a value appended later is not a change.
+Subscribers are told which runs changed after every refresh. Worker processes
+that do not scan themselves load the runs another process indexed instead
+(see snapshot.py).
+"""
+
+import hashlib
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from metrics_sources import FileStoreSource
+
+
+class MetricsIndex:
+    """Run metrics kept in memory and refreshed by watching per-run change signatures"""
+
+    def __init__(self, source: Union[FileStoreSource, Path, str], make_run: Callable[..., object]):
+        # A plain path is an mlruns FileStore tree
+        self.source = FileStoreSource(source) if isinstance(source, (Path, str)) else source
+        self.make_run = make_run
+        # key -> (change signature from the source, run or None if it is not a model run)
+        self._entries: Dict[str, Tuple[object, Optional[object]]] = {}
+        self._runs: List[object] = []
+        self._views: Dict[object, object] = {}
+        self._listeners: List[Callable[[List[object], List[str], str], None]] = []
+        self._etag = self._compute_etag()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    @property
+    def runs(self) -> List[object]:
+        """Current snapshot of loaded runs (never mutated in place)"""
+        return self._runs
+
+    @property
+    def etag(self) -> str:
+        """Validator that changes whenever any indexed run changes"""
+        return self._etag
+
+    def view(self, name, build: Callable[[List[object]], object]):
+        """Derived structure (sorted order, per-model buckets, ...) cached until the runs change"""
+        views, runs = self._views, self._runs
+        if name not in views:
+            views[name] = build(runs)
+        return views[name]
+
+    def subscribe(self, listener: Callable[[List[object], List[str], str], None]) -> None:
+        """Call listener(updated_runs, removed_keys, etag) after every refresh that changes runs"""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[List[object], List[str], str], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def refresh(self) -> bool:
+        """Re-read runs whose directories changed; return True if anything changed"""
+        with self._lock:
+            found = self.source.signatures()
+            changed_keys = [
+                key for key, (_, signature) in found.items()
+                if key not in self._entries or self._entries[key][0] != signature
+            ]
+            removed_keys = set(self._entries) - set(found)
+            if not changed_keys and not removed_keys:
+                return False
+
+            loaded = self.source.load([found[key][0] for key in changed_keys])
+            updated, removed = [], []
+            for key, run in zip(changed_keys, loaded):
+                previous = self._entries.get(key, (None, None))[1]
+                run = self._make(run)
+                self._entries[key] = (found[key][1], run)
+                if run is not None:
+                    updated.append(run)
+                elif previous is not None:
+                    # A run that stopped parsing disappears for subscribers too
+                    removed.append(key)
+            for key in removed_keys:
+                if self._entries.pop(key)[1] is not None:
+                    removed.append(key)
+
+            self._runs = [run for _, run in self._entries.values() if run is not None]
+            self._views = {}
+            self._etag = self._compute_etag()
+            etag = self._etag
+
+        self._notify(updated, removed, etag)
+        return True
+
+    def export_entries(self) -> Tuple[Dict[str, object], str]:
+        """Loaded runs keyed by '<experiment>/<run>', with the matching ETag"""
+        with self._lock:
+            entries = {key: run for key, (_, run) in self._entries.items() if run is not None}
+            return entries, self._etag
+
+    def load_entries(self, runs: Dict[str, object], etag: str) -> bool:
+        """Replace the index with runs indexed elsewhere; return True if anything changed"""
+        with self._lock:
+            if etag == self._etag:
+                return False
+            previous = {key: run for key, (_, run) in self._entries.items() if run is not None}
+            updated = [run for key, run in runs.items() if previous.get(key) != run]
+            removed = [key for key in previous if key not in runs]
+            # No directory signatures: a worker that later scans itself re-reads every run once
+            self._entries = {key: (None, run) for key, run in runs.items()}
+            self._runs = list(runs.values())
+            self._views = {}
+            self._etag = etag
+
+        self._notify(updated, removed, etag)
+        return True
+
+    def _notify(self, updated: List[object], removed: List[str], etag: str) -> None:
+        if updated or removed:
+            for listener in list(self._listeners):
+                try:
+                    listener(updated, removed, etag)
+                except Exception as e:
+                    print(f"Error notifying metrics index listener: {e}")
+
+    def _make(self, run: Optional[Dict]) -> Optional[object]:
+        if run is None:
+            return None
+        try:
+            return self.make_run(**run)
+        except Exception as e:
+            print(f"Error processing run {run.get('mlflow_run_id')}: {e}")
+            return None
+
+    def _compute_etag(self) -> str:
+        digest = hashlib.sha1()
+        for key in sorted(self._entries):
+            digest.update(f"{key}:{self._entries[key][0]};".encode())
+        return f'W/"{digest.hexdigest()[:16]}"'
+
+    def start_watching(self, interval: float) -> None:
+        """Poll run-directory mtimes in a background thread"""
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        """Stop the background watcher"""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing metrics index: {e}")
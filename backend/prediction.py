@@ -0,0 +1,229 @@
+"""
+Micro-batched CPU-usage prediction on top of the models trained in Q3.
+
+Requests are queued per model; a worker collects everything that arrives
+within a few milliseconds and answers the whole batch with one vectorized
+`predict` call, run off the event loop. Tree models are served from their
+memory-mapped flattened copy (`<name>_compiled/`, see Q3/src/compiled.py) when
+training exported one, and from the pickle otherwise. The model registry
+(registry.py) can later swap in another version of a model while serving.
+"""
+
+import asyncio
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from compiled import CompiledForest
+from transform import FeatureTransform
+
+MODEL_NAMES = ["linear", "rf", "xgb"]
+
+
+class ModelStats:
+    """Throughput and latency counters for one model"""
+
+    def __init__(self, window: int = 10000):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self.errors = 0
+        self.predict_seconds = 0.0
+        self.latencies = deque(maxlen=window)
+
+    def snapshot(self) -> Dict:
+        uptime = time.monotonic() - self.started
+        latencies_ms = np.asarray(self.latencies) * 1000.0
+        return {
+            "requests": self.requests,
+            "rows": self.rows,
+            "batches": self.batches,
+            "errors": self.errors,
+            "mean_batch_rows": self.rows / self.batches if self.batches else 0.0,
+            "rows_per_second": self.rows / uptime if uptime > 0 else 0.0,
+            "predict_seconds": self.predict_seconds,
+            "latency_ms": {
+                "p50": float(np.percentile(latencies_ms, 50)) if len(latencies_ms) else 0.0,
+                "p99": float(np.percentile(latencies_ms, 99)) if len(latencies_ms) else 0.0,
+                "max": float(latencies_ms.max()) if len(latencies_ms) else 0.0,
+            },
+        }
+
+
+class MicroBatcher:
+    """Coalesce concurrent predict requests for one model into vectorized calls"""
+
+    def __init__(self, model, columns: List[str], max_batch_rows: int = 1024, max_wait_ms: float = 2.0,
+                 version: str = "local"):
+        self.feature_columns = columns
+        self.swap(model, version)
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self.stats = ModelStats()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def model(self):
+        return self._serving[0]
+
+    @property
+    def version(self) -> str:
+        return self._serving[2]
+
+    def swap(self, model, version: str) -> None:
+        """Serve the next batches from another model; a batch already predicting finishes on the old one"""
+        # Models fitted on DataFrames expect the same column names at predict time
+        columns = self.feature_columns if hasattr(model, "feature_names_in_") else None
+        # One reference assignment, so a batch never pairs one model with another's columns
+        self._serving = (model, columns, version)
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def predict(self, X: np.ndarray) -> np.ndarray:
+        """Queue a block of feature rows and wait for its slice of the batch result"""
+        future = asyncio.get_running_loop().create_future()
+        started = time.monotonic()
+        await self._queue.put((X, future))
+        try:
+            return await future
+        finally:
+            self.stats.requests += 1
+            self.stats.latencies.append(time.monotonic() - started)
+
+    def _predict_batch(self, X: np.ndarray) -> np.ndarray:
+        model, columns, _ = self._serving
+        if columns is not None:
+            X = pd.DataFrame(X, columns=columns)
+        return np.asarray(model.predict(X), dtype=np.float64)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            rows = len(items[0][0])
+            deadline = loop.time() + self.max_wait
+            while rows < self.max_batch_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                items.append(item)
+                rows += len(item[0])
+
+            X = np.vstack([x for x, _ in items])
+            started = time.monotonic()
+            try:
+                preds = await loop.run_in_executor(None, self._predict_batch, X)
+            except Exception as e:
+                self.stats.errors += 1
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.stats.predict_seconds += time.monotonic() - started
+            self.stats.batches += 1
+            self.stats.rows += rows
+
+            offset = 0
+            for x, future in items:
+                if not future.done():
+                    future.set_result(preds[offset:offset + len(x)])
+                offset += len(x)
+
+
+class PredictionService:
+    """Models loaded once at startup, each served through its own micro-batcher"""
+
+    def __init__(self, models_path: Path, max_batch_rows: int = 1024, max_wait_ms: float = 2.0,
+                 use_compiled: bool = True):
+        self.models_path = Path(models_path)
+        self.use_compiled = use_compiled
+        self.max_batch_rows = max_batch_rows
+        self.max_wait_ms = max_wait_ms
+        self.features: Optional[FeatureTransform] = None
+        self.batchers: Dict[str, MicroBatcher] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def load(self) -> None:
+        """Load the preprocessing transform and every model pickle that exists"""
+        transform_file = self.models_path / "preprocessor.json"
+        if not transform_file.exists():
+            print(f"Preprocessing transform not found: {transform_file}")
+            return
+        self.features = FeatureTransform.load(transform_file)
+
+        for name in MODEL_NAMES:
+            compiled_dir = self.models_path / f"{name}_compiled"
+            model_file = compiled_dir if self.use_compiled and compiled_dir.is_dir() else \
+                self.models_path / f"{name}_model.pkl"
+            if not model_file.exists():
+                continue
+            try:
+                model = CompiledForest.load(model_file) if model_file.is_dir() else joblib.load(model_file)
+            except Exception as e:
+                print(f"Error loading model {model_file}: {e}")
+                continue
+            self.batchers[name] = MicroBatcher(
+                model, self.features.feature_columns, self.max_batch_rows, self.max_wait_ms
+            )
+            print(f"Loaded {name} model from {model_file}")
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        for batcher in self.batchers.values():
+            batcher.start()
+
+    def swap(self, name: str, model, version: str) -> None:
+        """Serve a model under name from now on; safe to call from any thread after start()"""
+        batcher = self.batchers.get(name)
+        if batcher is not None:
+            batcher.swap(model, version)
+            return
+        batcher = MicroBatcher(model, self.features.feature_columns, self.max_batch_rows, self.max_wait_ms,
+                               version)
+        # A new batcher's queue and worker task belong to the event loop
+        self._loop.call_soon_threadsafe(self._add, name, batcher)
+
+    def _add(self, name: str, batcher: MicroBatcher) -> None:
+        batcher.start()
+        # A new dict rather than an insert, so request handlers never see it change under them
+        self.batchers = {**self.batchers, name: batcher}
+
+    async def stop(self) -> None:
+        for batcher in self.batchers.values():
+            await batcher.stop()
+
+    @property
+    def models(self) -> List[str]:
+        return list(self.batchers)
+
+    async def predict(self, specs: List[Dict], models: List[str]) -> Dict[str, List[float]]:
+        """Predict CPU usage for raw pod specs with each requested model"""
+        X = self.features.transform_batch(specs)
+        results = await asyncio.gather(*(self.batchers[name].predict(X) for name in models))
+        return {name: preds.tolist() for name, preds in zip(models, results)}
+
+    def stats(self) -> Dict[str, Dict]:
+        return {name: {"version": batcher.version, **batcher.stats.snapshot()}
+                for name, batcher in self.batchers.items()}
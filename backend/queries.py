@@ -0,0 +1,180 @@
+"""
+Filtering, sorting, cursor pagination and aggregation over the metrics index.
+
+Sorted orders and per-model buckets are built once per index version (see
+MetricsIndex.view) so a page request bisects to its cursor and only touches
+the runs it returns, instead of materializing and serializing every run.
+"""
+
+import base64
+import json
+import operator
+import re
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+METRIC_KEYS = ["train_rmse", "train_mae", "train_r2", "test_rmse", "test_mae", "test_r2"]
+COST_KEYS = ["fit_seconds", "predict_seconds", "peak_mem_mb", "train_rows_per_sec"]
+FILTER_KEYS = METRIC_KEYS + COST_KEYS
+SORT_KEYS = FILTER_KEYS + ["start_time"]
+
+# Direction in which each metric improves
+LOWER_IS_BETTER = {"train_rmse", "train_mae", "test_rmse", "test_mae", "fit_seconds", "predict_seconds", "peak_mem_mb"}
+
+OPERATORS = {
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+    "=": operator.eq,
+}
+
+WHERE_PATTERN = re.compile(r"^\s*(\w+)\s*(>=|<=|>|<|=)\s*(-?[0-9.eE+-]+)\s*$")
+
+
+class QueryError(ValueError):
+    """Invalid filter, sort key or cursor supplied by the client"""
+
+
+def run_key(run) -> str:
+    return f"{run.experiment_id}/{run.mlflow_run_id}"
+
+
+def sort_value(run, key: str) -> float:
+    value = getattr(run, key)
+    return float(value) if value is not None else 0.0
+
+
+def parse_sort(sort: str) -> Tuple[str, bool]:
+    """'test_rmse' sorts ascending, '-test_rmse' descending"""
+    descending = sort.startswith("-")
+    key = sort.lstrip("-+")
+    if key not in SORT_KEYS:
+        raise QueryError(f"Cannot sort by {key!r}; use one of {', '.join(SORT_KEYS)}")
+    return key, descending
+
+
+def parse_where(clauses: List[str]):
+    """Turn ['test_r2>=0.8', ...] into (metric, comparison, value) triples"""
+    filters = []
+    for clause in clauses:
+        match = WHERE_PATTERN.match(clause)
+        if not match or match.group(1) not in FILTER_KEYS:
+            raise QueryError(f"Invalid metric filter {clause!r}; expected e.g. 'test_r2>=0.8'")
+        filters.append((match.group(1), OPERATORS[match.group(2)], float(match.group(3))))
+    return filters
+
+
+def encode_cursor(position: Tuple[float, str]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        value, key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(value), str(key)
+    except Exception:
+        raise QueryError("Invalid cursor")
+
+
+def sorted_view(index, key: str, descending: bool, model: Optional[str]):
+    """(positions, runs) of one model's runs (or all) in sort order, cached per index version"""
+    def build(runs):
+        if model is not None:
+            runs = by_model(index).get(model, [])
+        sign = -1.0 if descending else 1.0
+        entries = sorted(((sign * sort_value(r, key), run_key(r)), r) for r in runs)
+        return [e[0] for e in entries], [e[1] for e in entries]
+
+    return index.view(("sorted", key, descending, model), build)
+
+
+def by_model(index) -> Dict[str, list]:
+    """Runs bucketed by lower-cased model name"""
+    def build(runs):
+        buckets = {}
+        for run in runs:
+            buckets.setdefault(run.model.lower(), []).append(run)
+        return buckets
+
+    return index.view("by_model", build)
+
+
+def query_runs(index, model=None, data_version=None, experiment_id=None, since_ms=None, until_ms=None,
+               where=(), sort="-start_time", cursor=None, limit=100):
+    """One page of runs matching the filters; returns (runs, total_count, next_cursor)"""
+    key, descending = parse_sort(sort)
+    filters = parse_where(list(where))
+    model = model.lower() if model else None
+    positions, runs = sorted_view(index, key, descending, model)
+
+    def matches(run):
+        if data_version is not None and run.data_version != data_version:
+            return False
+        if experiment_id is not None and run.experiment_id != experiment_id:
+            return False
+        if since_ms is not None and (run.start_time is None or run.start_time < since_ms):
+            return False
+        if until_ms is not None and (run.start_time is None or run.start_time > until_ms):
+            return False
+        return all(getattr(run, metric) is not None and compare(getattr(run, metric), value)
+                   for metric, compare, value in filters)
+
+    unfiltered = data_version is None and experiment_id is None and since_ms is None \
+        and until_ms is None and not filters
+    start = bisect_right(positions, tuple(decode_cursor(cursor))) if cursor else 0
+
+    page = []
+    last = None
+    next_cursor = None
+    for i in range(start, len(runs)):
+        if unfiltered or matches(runs[i]):
+            if len(page) == limit:
+                next_cursor = encode_cursor(positions[last])
+                break
+            page.append(runs[i])
+            last = i
+
+    total_count = len(runs) if unfiltered else sum(1 for run in runs if matches(run))
+    return page, total_count, next_cursor
+
+
+def summarize(values: np.ndarray) -> Dict[str, float]:
+    return {
+        "mean": float(values.mean()),
+        "std": float(values.std()),
+        "min": float(values.min()),
+        "p50": float(np.percentile(values, 50)),
+        "p90": float(np.percentile(values, 90)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
+
+
+def best_run(runs, metric: str):
+    runs = [r for r in runs if getattr(r, metric) is not None]
+    if not runs:
+        return None
+    pick = min if metric in LOWER_IS_BETTER else max
+    return pick(runs, key=lambda r: getattr(r, metric))
+
+
+def aggregate(index, metric: str) -> Dict[str, Dict]:
+    """Per-model count, distribution and best run of one metric"""
+    if metric not in FILTER_KEYS:
+        raise QueryError(f"Unknown metric {metric!r}; use one of {', '.join(FILTER_KEYS)}")
+    result = {}
+    for model, runs in sorted(by_model(index).items()):
+        # Cost metrics are missing on runs logged before they were recorded
+        runs = [r for r in runs if getattr(r, metric) is not None]
+        if not runs:
+            continue
+        values = np.array([getattr(r, metric) for r in runs], dtype=np.float64)
+        result[model] = {
+            "count": len(runs),
+            **summarize(values),
+            "best_run": best_run(runs, metric).model_dump(),
+        }
+    return result
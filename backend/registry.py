@@ -0,0 +1,227 @@
+"""
+Best-run model registry behind /predict.
+
+After every metrics-index refresh (and every poll interval, since MLflow
+uploads a run's model after its metrics) the registry picks the best run of
+each model family by MODEL_REGISTRY_METRIC. If that run is better than the
+version being served and logged a model (see `model_dir()` in
+Q3/metrics_sources.py), a background thread loads it and swaps it into the
+family's micro-batcher. The swap is a single reference assignment: a batch
+that is already predicting finishes on the old model and the next batch uses
+the new one. No request is dropped, and no request waits for unpickling.
+
+Only runs trained on the data version of the newest run that records one are
+candidates. Runs logged with data_version "unknown" are never swapped in,
+since nothing tells which data they saw. A candidate's model must take
+exactly the features preprocessor.json produces. A run
+that fails either check, or whose flattened copy does not match the original
+model, counts as unloadable: the family keeps serving what it serves.
+
+Loaded versions stay in an LRU cache bounded by MODEL_CACHE_MB. The versions
+being served are never evicted, and going back to a recently served version
+(e.g. after the best run is deleted) does not reload it.
+"""
+
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from compiled import ARRAYS, CompiledForest
+from metrics_sources import MODEL_FILE
+from prediction import MODEL_NAMES, PredictionService
+from queries import LOWER_IS_BETTER, by_model
+
+# Models served from a flattened copy built at load time (as training exports them)
+COMPILED_FAMILIES = ("rf", "xgb")
+
+# Random rows a flattened copy is checked against the original model on before serving
+VERIFY_ROWS = 256
+
+
+def current_data_version(runs) -> Optional[str]:
+    """data_version of the most recently started run that records one, or None if no run does"""
+    known = [run for run in runs if run.data_version not in (None, "unknown")]
+    newest = max(known, key=lambda run: run.start_time or 0, default=None)
+    return newest.data_version if newest is not None else None
+
+
+def check_features(model, columns: List[str]) -> None:
+    """Raise ValueError unless the model was fitted on exactly these feature columns"""
+    n_features = getattr(model, "n_features_in_", None)
+    if n_features is not None and n_features != len(columns):
+        raise ValueError(f"model expects {n_features} features, preprocessor.json produces {len(columns)}")
+    names = getattr(model, "feature_names_in_", None)
+    if names is not None and list(names) != list(columns):
+        raise ValueError(f"model features {list(names)} differ from preprocessor.json's {list(columns)}")
+
+
+class ModelVersion:
+    """A model loaded from one run"""
+
+    def __init__(self, family: str, run_id: str, model, size_bytes: int, score: float):
+        self.family = family
+        self.run_id = run_id
+        self.model = model
+        self.size_bytes = size_bytes
+        self.score = score
+
+    def describe(self) -> Dict:
+        return {"family": self.family, "run_id": self.run_id, "size_mb": self.size_bytes / 2**20,
+                "score": self.score}
+
+
+class ModelRegistry:
+    """Serves the best logged model of each family and hot-swaps it when a better run appears"""
+
+    def __init__(self, index, service: PredictionService, metric: str = "test_rmse", max_mb: float = 512.0,
+                 use_compiled: bool = True, interval: float = 5.0):
+        self.index = index
+        self.service = service
+        self.metric = metric
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.use_compiled = use_compiled
+        self.interval = interval
+        self._cache: "OrderedDict[Tuple[str, str], ModelVersion]" = OrderedDict()
+        # Guards _cache: the reload thread changes it while status() reads it from request threads
+        self._lock = threading.Lock()
+        # family -> (run id, score) being served; absent while the startup pickles are served
+        self._serving: Dict[str, Tuple[str, float]] = {}
+        # Runs whose model exists but could not be loaded, so they are not retried every poll
+        self._broken = set()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self.index.subscribe(self._on_change)
+        self._thread = threading.Thread(target=self._run, daemon=True, name="model-registry")
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.index.unsubscribe(self._on_change)
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _on_change(self, updated, removed, etag) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.reconcile()
+            except Exception as e:
+                print(f"Error updating served models: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def candidates(self, runs: List[object], data_version: Optional[str]) -> List[object]:
+        """Runs on data_version with a usable score, best first; none without a known data_version"""
+        if data_version is None:
+            return []
+        scored = [run for run in runs
+                  if getattr(run, self.metric) is not None and not math.isnan(getattr(run, self.metric))
+                  and run.data_version == data_version]
+        return sorted(scored, key=lambda run: getattr(run, self.metric),
+                      reverse=self.metric not in LOWER_IS_BETTER)
+
+    def reconcile(self) -> None:
+        """Serve the best loadable run of every family, loading it first if needed"""
+        if self.service.features is None:
+            # Without preprocessor.json there is nothing to turn pod specs into features
+            return
+        lower_is_better = self.metric in LOWER_IS_BETTER
+        families = {family: runs for family, runs in by_model(self.index).items() if family in MODEL_NAMES}
+        data_version = current_data_version(run for runs in families.values() for run in runs)
+        for family, runs in families.items():
+            serving = self._serving.get(family)
+            candidates = self.candidates(runs, data_version)
+            for run in candidates:
+                score = getattr(run, self.metric)
+                if serving is not None:
+                    if run.mlflow_run_id == serving[0]:
+                        break
+                    if not (score < serving[1] if lower_is_better else score > serving[1]):
+                        # The served run left the index or the data version: fall back to the best loadable one
+                        if any(r.mlflow_run_id == serving[0] for r in candidates):
+                            break
+                version = self._get(family, run)
+                if version is not None:
+                    self._serve(version)
+                    break
+
+    def _serve(self, version: ModelVersion) -> None:
+        self.service.swap(version.family, version.model, version.run_id)
+        self._serving[version.family] = (version.run_id, version.score)
+        print(f"Serving {version.family} from run {version.run_id} ({self.metric}={version.score:.5f})")
+        self._evict()
+
+    def _get(self, family: str, run) -> Optional[ModelVersion]:
+        """Cached version of a run, or a fresh load; None if the run has no loadable model"""
+        key = (family, run.mlflow_run_id)
+        with self._lock:
+            version = self._cache.get(key)
+            if version is not None:
+                self._cache.move_to_end(key)
+                return version
+        if key in self._broken:
+            return None
+        model_dir = self.index.source.model_dir(run.experiment_id, run.mlflow_run_id)
+        if model_dir is None:
+            return None
+        try:
+            version = self._load(family, run, model_dir / MODEL_FILE)
+        except Exception as e:
+            self._broken.add(key)
+            print(f"Error loading the {family} model of run {run.mlflow_run_id}: {e}")
+            return None
+        with self._lock:
+            self._cache[key] = version
+        return version
+
+    def _load(self, family: str, run, path) -> ModelVersion:
+        """Load and check a run's model; raises if it cannot serve the current features"""
+        model = joblib.load(path)
+        size_bytes = path.stat().st_size
+        columns = self.service.features.feature_columns
+        check_features(model, columns)
+        if self.use_compiled and family in COMPILED_FAMILIES:
+            compiled = CompiledForest.from_model(model, columns)
+            X = np.random.default_rng(0).normal(size=(VERIFY_ROWS, compiled.n_features_in_))
+            X_model = pd.DataFrame(X, columns=columns) if hasattr(model, "feature_names_in_") else X
+            compiled.verify(model, X_model)
+            model = compiled
+            size_bytes = sum(getattr(compiled, name).nbytes for name in ARRAYS)
+        return ModelVersion(family, run.mlflow_run_id, model, size_bytes, getattr(run, self.metric))
+
+    def _evict(self) -> None:
+        """Drop least recently used versions beyond max_bytes, never one being served"""
+        serving = {(family, run_id) for family, (run_id, _) in self._serving.items()}
+        with self._lock:
+            total = sum(version.size_bytes for version in self._cache.values())
+            for key in list(self._cache):
+                if total <= self.max_bytes:
+                    break
+                if key not in serving:
+                    total -= self._cache.pop(key).size_bytes
+
+    def status(self) -> Dict:
+        with self._lock:
+            versions = list(self._cache.values())
+        return {
+            "metric": self.metric,
+            "serving": {name: batcher.version for name, batcher in self.service.batchers.items()},
+            "cache_mb": sum(version.size_bytes for version in versions) / 2**20,
+            "cache_limit_mb": self.max_bytes / 2**20,
+            "cached": [version.describe() for version in versions],
+        }
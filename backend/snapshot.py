@@ -0,0 +1,125 @@
+"""
+Metrics snapshot shared by several uvicorn worker processes.
+
+With `uvicorn --workers N`, every worker would otherwise scan mlruns on its own.
+When METRICS_SNAPSHOT is set, the worker holding an exclusive lock on
+`<snapshot>.lock` is the only one that scans. After every change it writes
+the runs and the index ETag to the snapshot file (written to a temporary
+file, then renamed). The other workers poll the snapshot file's stat and
+reload it when it changes. All workers therefore serve the same runs under
+the same ETag, so a 304 from one worker stays valid on the next. If the
+scanning worker exits, its lock is released and another worker takes over
+at its next poll.
+
+The lock is an fcntl advisory lock, so the snapshot is POSIX-only. Where fcntl
+is missing (Windows) it is not used and every worker scans on its own.
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Optional
+
+from metrics_index import MetricsIndex
+
+
+def locking_available() -> bool:
+    """True if the leader lock (fcntl.flock) works on this platform"""
+    try:
+        import fcntl  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class SharedSnapshot:
+    """Keeps a MetricsIndex in sync across processes through one snapshot file"""
+
+    def __init__(self, index: MetricsIndex, path: Path, dump_run: Callable[[object], dict]):
+        self.index = index
+        self.path = Path(path)
+        self.dump_run = dump_run
+        self.is_leader = False
+        self._lock_file = None
+        self._loaded_stat = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sync(self) -> None:
+        """One poll: scan and publish as the leader, otherwise load a newer snapshot"""
+        if not self.is_leader:
+            self._try_lead()
+        if self.is_leader:
+            if self.index.refresh() or not self.path.exists():
+                self.publish()
+        elif not self.load() and not self.index.runs and self._loaded_stat is None:
+            # No snapshot has been published yet: serve a local scan until one appears
+            self.index.refresh()
+
+    def _try_lead(self) -> None:
+        import fcntl
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(f"{self.path}.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return
+        self._lock_file = lock_file
+        self.is_leader = True
+        print(f"Publishing the metrics snapshot to {self.path} (pid {os.getpid()})")
+
+    def publish(self) -> None:
+        entries, etag = self.index.export_entries()
+        payload = {"etag": etag, "runs": {key: self.dump_run(run) for key, run in entries.items()}}
+        tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> bool:
+        """Load the snapshot if it changed since the last load; True if it was loaded"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if signature == self._loaded_stat:
+            return False
+        with open(self.path) as f:
+            payload = json.load(f)
+        runs = {}
+        for key, run in payload["runs"].items():
+            try:
+                runs[key] = self.index.make_run(**run)
+            except Exception as e:
+                print(f"Error loading run {key} from the snapshot: {e}")
+        self.index.load_entries(runs, payload["etag"])
+        self._loaded_stat = signature
+        return True
+
+    def start(self, interval: float) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, args=(interval,), daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+            self.is_leader = False
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Error syncing the metrics snapshot: {e}")
@@ -0,0 +1,122 @@
+"""
+Server-Sent Events stream of run changes.
+
+The metrics index watcher is the only thing polling mlruns. After each refresh
+it hands the changed runs to the broadcaster, which encodes one SSE event and
+queues it for every connected client, so N dashboards cost one filesystem scan.
+"""
+
+import asyncio
+import json
+from typing import List, Optional, Set
+
+from coalescing import Coalescer
+from metrics_index import MetricsIndex
+
+# Seconds between comment lines that keep idle connections (and proxies) open
+KEEPALIVE_INTERVAL = 15.0
+
+# Events buffered per client before it is told to resync instead
+CLIENT_QUEUE_SIZE = 256
+
+# Marker queued for a client that fell behind; it gets a fresh snapshot
+RESYNC = b""
+
+
+def format_event(event: str, data, event_id: Optional[str] = None) -> bytes:
+    """Encode one SSE message"""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+def split_key(key: str) -> dict:
+    experiment_id, run_id = key.split("/", 1)
+    return {"experiment_id": experiment_id, "mlflow_run_id": run_id}
+
+
+class RunBroadcaster:
+    """Fans metrics index changes out to every connected stream client"""
+
+    def __init__(self, index: MetricsIndex, keepalive: float = KEEPALIVE_INTERVAL,
+                 queue_size: int = CLIENT_QUEUE_SIZE, coalescer: Optional[Coalescer] = None):
+        self.index = index
+        self.coalescer = coalescer
+        self.keepalive = keepalive
+        self.queue_size = queue_size
+        self._clients: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def client_count(self) -> int:
+        return len(self._clients)
+
+    def start(self) -> None:
+        """Subscribe to the index; must be called from the serving event loop"""
+        self._loop = asyncio.get_running_loop()
+        self.index.subscribe(self._on_change)
+
+    def stop(self) -> None:
+        """Unsubscribe and end every open stream"""
+        self.index.unsubscribe(self._on_change)
+        for queue in list(self._clients):
+            self._put(queue, None)
+
+    def _on_change(self, updated: List[object], removed: List[str], etag: str) -> None:
+        # Runs on the watcher thread: encode once, then hand over to the loop
+        message = format_event(
+            "runs",
+            {"updated": [run.model_dump() for run in updated],
+             "removed": [split_key(key) for key in removed]},
+            etag,
+        )
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._publish, message)
+
+    def _publish(self, message: bytes) -> None:
+        for queue in list(self._clients):
+            self._put(queue, message)
+
+    def _put(self, queue: asyncio.Queue, message: Optional[bytes]) -> None:
+        if queue.full():
+            # Slow client: drop its backlog and let it catch up from a snapshot
+            while not queue.empty():
+                queue.get_nowait()
+            message = RESYNC if message is not None else None
+        queue.put_nowait(message)
+
+    def snapshot(self) -> bytes:
+        return format_event(
+            "snapshot", [run.model_dump() for run in self.index.runs], self.index.etag
+        )
+
+    async def _snapshot(self) -> bytes:
+        """Snapshot encoded off the event loop, shared by clients connecting at the same time"""
+        if self.coalescer is None:
+            return self.snapshot()
+        return await self.coalescer.run(("snapshot", self.index.etag), self.snapshot)
+
+    async def events(self, request, last_event_id: Optional[str] = None):
+        """SSE byte stream for one client: a snapshot (unless it is up to date), then changes"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._clients.add(queue)
+        try:
+            yield b"retry: 5000\n\n"
+            if last_event_id != self.index.etag:
+                yield await self._snapshot()
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=self.keepalive)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield b": keepalive\n\n"
+                    continue
+                if message is None:
+                    break
+                yield await self._snapshot() if message == RESYNC else message
+        finally:
+            self._clients.discard(queue)
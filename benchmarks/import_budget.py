@@ -0,0 +1,92 @@
+"""
+Import-time budget for the entry points that run as short-lived processes.
+
+    python import_budget.py                                  # every module below
+    python import_budget.py export_metrics generate_metrics  # what CI's deploy job runs
+
+Each module is imported in a fresh interpreter under `python -X importtime`
+(best of --repeat runs), and its cumulative import time is compared with its
+budget. The budgets are a few times the measured baseline, so a module that
+regains a heavy top-level import (mlflow, sklearn, xgboost, matplotlib,
+pandas) goes over while machine noise does not. On a miss the largest
+imports are listed and the script exits with status 1.
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# module -> (directory it is run from, budget in ms). Measured baselines: export_metrics and
+# generate_metrics ~10 ms, train ~80 ms (~1.5 s with its old top-level imports), evaluation ~40 ms
+BUDGETS_MS = {
+    "export_metrics": (ROOT / "Q3", 150),
+    "generate_metrics": (ROOT / "Q3", 150),
+    "train": (ROOT / "Q3" / "src", 400),
+    "evaluation": (ROOT / "Q3" / "src", 300),
+}
+
+# Largest imports listed for a module over budget
+TOP_IMPORTS = 8
+
+
+def import_times(module, cwd):
+    """[(cumulative us, self us, name)] of one cold import of module"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=cwd,
+        env={**os.environ, "PYTHONPATH": str(cwd)}, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    times = []
+    for line in result.stderr.splitlines():
+        # "import time: <self us> | <cumulative us> | <indented name>"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        times.append((int(cumulative_us), int(self_us), name.strip()))
+    return times
+
+
+def measure(module, cwd, repeat=3):
+    """Best cumulative import time of module in ms, with the import breakdown of that run"""
+    best_ms, best_times = None, []
+    for _ in range(repeat):
+        times = import_times(module, cwd)
+        total_ms = next(cumulative for cumulative, _, name in reversed(times) if name == module) / 1000
+        if best_ms is None or total_ms < best_ms:
+            best_ms, best_times = total_ms, times
+    return best_ms, best_times
+
+
+def check(modules, repeat=3):
+    """Print each module's import time against its budget; True if all fit"""
+    ok = True
+    for module in modules:
+        cwd, budget_ms = BUDGETS_MS[module]
+        total_ms, times = measure(module, cwd, repeat)
+        within = total_ms <= budget_ms
+        ok &= within
+        print(f"{'✓' if within else '⚠'} {module}: {total_ms:.0f} ms (budget {budget_ms} ms)")
+        if not within:
+            # Top-level packages only, so each heavy dependency shows once
+            top = sorted((t for t in times if "." not in t[2]), reverse=True)[:TOP_IMPORTS + 1]
+            for cumulative, _, name in top:
+                if name != module:
+                    print(f"    {cumulative / 1000:8.1f} ms  {name}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check cold import times against their budgets")
+    parser.add_argument("modules", nargs="*", help=f"Modules to check (default: all of {', '.join(BUDGETS_MS)})")
+    parser.add_argument("--repeat", type=int, default=3, help="Cold imports per module; the fastest counts")
+    args = parser.parse_args()
+
+    unknown = [module for module in args.modules if module not in BUDGETS_MS]
+    if unknown:
+        parser.error(f"No budget for {', '.join(unknown)}")
+    sys.exit(0 if check(args.modules or list(BUDGETS_MS), args.repeat) else 1)
@@ -0,0 +1,480 @@
+"""
+Benchmarks for preprocessing, training, batch scoring, the mlruns scanner, model inference and the API.
+
+Inputs are generated once per size into a work directory (see synthetic.py)
+and every case is measured in a fresh Python process, so the peak RSS it
+reports is its own. API cases start uvicorn on a synthetic mlruns tree and
+drive it with a local asyncio load generator. Results are written as JSON
+tagged with the git commit; pass an earlier file to --compare to see
+regressions.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import platform
+import resource
+import subprocess
+from pathlib import Path
+from datetime import datetime, timezone
+
+import numpy as np
+
+from synthetic import generate_mlruns, generate_raw_csv
+
+ROOT = Path(__file__).resolve().parent.parent
+Q3_SRC = ROOT / "Q3" / "src"
+BACKEND = ROOT / "backend"
+
+DEFAULT_SIZES = {
+    "preprocess": [10_000, 100_000],
+    "preprocess_streaming": [10_000, 100_000],
+    "train": [10_000],
+    "score": [10_000, 100_000],
+    "scanner": [100, 1_000],
+    "predict": [1, 1_000],
+    "api": [100, 1_000],
+}
+
+# Endpoints driven by the load generator, per API case
+API_ENDPOINTS = [
+    "/api/metrics",
+    "/api/metrics/xgb",
+    "/api/runs?limit=100&sort=-test_r2",
+    "/api/aggregates?metric=test_rmse",
+]
+
+# Part of the cached mlruns tree names; bump it when synthetic.generate_mlruns changes
+MLRUNS_VERSION = 2
+
+# Rows of the dataset used to train the models behind /predict and the predict case
+PREDICT_TRAIN_ROWS = 10_000
+
+# Minimum time spent repeating each timed call in the predict case
+PREDICT_REPEAT_SECONDS = 0.5
+
+PREDICT_BODY = {
+    "instances": [
+        {"cpu_request": 0.5, "mem_request": 512, "cpu_limit": 1, "mem_limit": 1024,
+         "runtime_minutes": 30, "controller_kind": "Deployment"}
+    ]
+}
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Peak resident set size in MB (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"],
+                                             cwd=ROOT, text=True).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+# Input preparation (in the parent, outside of any measurement)
+
+def raw_csv(workdir, rows):
+    path = workdir / f"raw-{rows}.csv"
+    if not path.exists():
+        print(f"  generating {path.name}")
+        generate_raw_csv(str(path), rows)
+    return path
+
+
+def processed(workdir, rows):
+    path = workdir / f"processed-{rows}.parquet"
+    if not path.exists():
+        subprocess.run([sys.executable, str(Q3_SRC / "preprocess.py"), str(raw_csv(workdir, rows)), str(path),
+                        str(workdir / f"preprocessor-{rows}.json")], check=True, stdout=subprocess.DEVNULL)
+    return path
+
+
+def mlruns(workdir, runs):
+    path = workdir / f"mlruns-v{MLRUNS_VERSION}-{runs}"
+    if not path.exists():
+        print(f"  generating {path.name}")
+        generate_mlruns(str(path), runs)
+    return path
+
+
+def predict_models(workdir):
+    """Models and preprocessor.json for /predict, trained once per work directory"""
+    path = workdir / "models"
+    if not (path / "preprocessor.json").exists():
+        print("  training models for /predict")
+        case_in_child("train", PREDICT_TRAIN_ROWS, workdir)
+        trained = workdir / f"models-train-{PREDICT_TRAIN_ROWS}"
+        os.makedirs(path, exist_ok=True)
+        for name in ("linear", "rf", "xgb"):
+            os.replace(trained / f"{name}_model.pkl", path / f"{name}_model.pkl")
+        for name in ("rf", "xgb"):
+            if (trained / f"{name}_compiled").is_dir():
+                os.replace(trained / f"{name}_compiled", path / f"{name}_compiled")
+        os.replace(workdir / f"preprocessor-{PREDICT_TRAIN_ROWS}.json", path / "preprocessor.json")
+    return path
+
+
+def prepare(case, size, workdir):
+    if case in ("preprocess", "preprocess_streaming"):
+        raw_csv(workdir, size)
+    elif case == "train":
+        processed(workdir, size)
+    elif case == "scanner":
+        mlruns(workdir, size)
+    elif case == "predict":
+        predict_models(workdir)
+    elif case == "score":
+        predict_models(workdir)
+        raw_csv(workdir, size)
+
+
+# Measured cases (each runs in its own process via case_in_child)
+
+def run_preprocess(size, workdir, streaming):
+    sys.path.insert(0, str(Q3_SRC))
+    from preprocess import preprocess, preprocess_streaming
+
+    out_dir = workdir / "out"
+    os.makedirs(out_dir, exist_ok=True)
+    args = (str(raw_csv(workdir, size)), str(out_dir / "processed.parquet"), str(out_dir / "preprocessor.json"))
+    started = time.perf_counter()
+    if streaming:
+        preprocess_streaming(*args)
+    else:
+        preprocess(*args)
+    wall = time.perf_counter() - started
+    return {"wall_seconds": wall, "rows_per_sec": size / wall}
+
+
+def run_train(size, workdir):
+    sys.path.insert(0, str(Q3_SRC))
+    os.environ.setdefault("MLFLOW_TRACKING_URI", (workdir / "mlruns-train").as_uri())
+    from train import train_all, artifact_worker
+
+    model_dir = workdir / f"models-train-{size}"
+    os.makedirs(model_dir, exist_ok=True)
+    started = time.perf_counter()
+    train_all(str(processed(workdir, size)), str(model_dir), os.cpu_count())
+    artifact_worker.drain()
+    wall = time.perf_counter() - started
+    return {"wall_seconds": wall, "rows_per_sec": size / wall,
+            "peak_rss_children_mb": peak_rss_mb(resource.RUSAGE_CHILDREN)}
+
+
+def run_score(size, workdir):
+    """Batch scoring of a raw CSV with every model on all cores"""
+    sys.path.insert(0, str(Q3_SRC))
+    from score import score
+
+    out_dir = workdir / "out"
+    os.makedirs(out_dir, exist_ok=True)
+    started = time.perf_counter()
+    score(str(raw_csv(workdir, size)), str(out_dir / "scores.parquet"), str(predict_models(workdir)),
+          workers=os.cpu_count())
+    wall = time.perf_counter() - started
+    return {"wall_seconds": wall, "rows_per_sec": size / wall,
+            "peak_rss_children_mb": peak_rss_mb(resource.RUSAGE_CHILDREN)}
+
+
+def run_scanner(size, workdir):
+    sys.path.insert(0, str(BACKEND))
+    os.chdir(BACKEND)
+    import main
+    from metrics_index import MetricsIndex
+
+    path = mlruns(workdir, size)
+    started = time.perf_counter()
+    runs = main.get_metrics_from_mlflow(str(path))
+    wall = time.perf_counter() - started
+
+    index = MetricsIndex(path, main.make_model_metrics)
+    t0 = time.perf_counter()
+    index.refresh()
+    index_build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    index.refresh()
+    index_refresh = time.perf_counter() - t0
+    return {"wall_seconds": wall, "runs": len(runs), "runs_per_sec": len(runs) / wall,
+            "index_build_seconds": index_build, "index_noop_refresh_seconds": index_refresh}
+
+
+def median_seconds(fn):
+    """Median wall time of fn() over repeats filling PREDICT_REPEAT_SECONDS"""
+    times = []
+    deadline = time.perf_counter() + PREDICT_REPEAT_SECONDS
+    while len(times) < 3 or time.perf_counter() < deadline:
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return float(np.median(times))
+
+
+def run_predict(size, workdir):
+    """Load time and per-batch latency of the pickled vs the compiled tree models"""
+    sys.path.insert(0, str(Q3_SRC))
+    import joblib
+    from compiled import CompiledForest
+    from data_io import read_processed
+
+    models = predict_models(workdir)
+    X = read_processed(str(processed(workdir, PREDICT_TRAIN_ROWS))).drop("cpu_usage", axis=1)
+    X = X.iloc[np.arange(size) % len(X)]
+    result = {"wall_seconds": 0.0}
+    for name in ("rf", "xgb"):
+        started = time.perf_counter()
+        model = joblib.load(models / f"{name}_model.pkl")
+        result[f"{name}_load_pickle_ms"] = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        compiled = CompiledForest.load(models / f"{name}_compiled")
+        result[f"{name}_load_compiled_ms"] = (time.perf_counter() - started) * 1000
+
+        X_model = X if hasattr(model, "feature_names_in_") else X.to_numpy()
+        X_array = X.to_numpy()
+        pickle_seconds = median_seconds(lambda: model.predict(X_model))
+        compiled_seconds = median_seconds(lambda: compiled.predict(X_array))
+        result[f"{name}_pickle_ms"] = pickle_seconds * 1000
+        result[f"{name}_compiled_ms"] = compiled_seconds * 1000
+        result[f"{name}_max_abs_error"] = compiled.verify(model, X_model)
+        result["wall_seconds"] += compiled_seconds
+    return result
+
+
+def run_case(case, size, workdir):
+    if case == "preprocess":
+        return run_preprocess(size, workdir, streaming=False)
+    if case == "preprocess_streaming":
+        return run_preprocess(size, workdir, streaming=True)
+    if case == "train":
+        return run_train(size, workdir)
+    if case == "score":
+        return run_score(size, workdir)
+    if case == "scanner":
+        return run_scanner(size, workdir)
+    if case == "predict":
+        return run_predict(size, workdir)
+    raise ValueError(f"Unknown benchmark case: {case}")
+
+
+def case_in_child(case, size, workdir):
+    """Run one case in a fresh interpreter (inside workdir, where training writes metrics/) and return its result dict"""
+    out = subprocess.run(
+        [sys.executable, __file__, "--child", case, str(size), "--workdir", str(workdir)],
+        check=True, stdout=subprocess.PIPE, text=True, cwd=workdir,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+# API load generation
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_peak_rss_mb(pid):
+    """VmHWM of the server process (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+async def load(base_url, method, path, body, concurrency, duration):
+    import httpx
+
+    latencies = []
+    errors = 0
+
+    async def worker(client, deadline):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(worker(client, deadline) for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_sec": len(latencies) / wall,
+        "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+        "p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else None,
+    }
+
+
+def run_api(size, workdir, concurrency, duration, with_predict):
+    port = free_port()
+    env = dict(os.environ, MLRUNS_PATH=str(mlruns(workdir, size)),
+               MODELS_PATH=str(predict_models(workdir) if with_predict else workdir / "no-models"))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND, env=env, stdout=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        import httpx
+
+        started = time.perf_counter()
+        while True:
+            try:
+                httpx.get(base_url + "/health", timeout=1)
+                break
+            except httpx.HTTPError:
+                if server.poll() is not None or time.perf_counter() - started > 60:
+                    raise RuntimeError("API server did not start")
+                time.sleep(0.1)
+        startup = time.perf_counter() - started
+
+        requests = [("GET", path, None) for path in API_ENDPOINTS]
+        if with_predict:
+            requests.append(("POST", "/predict", PREDICT_BODY))
+        endpoints = {}
+        for method, path, body in requests:
+            endpoints[f"{method} {path}"] = asyncio.run(load(base_url, method, path, body, concurrency, duration))
+            print(f"    {method} {path}: {endpoints[f'{method} {path}']['requests_per_sec']:.0f} req/s")
+        return {
+            "startup_seconds": startup,
+            "requests_per_sec": min(e["requests_per_sec"] for e in endpoints.values()),
+            "peak_rss_mb": server_peak_rss_mb(server.pid),
+            "concurrency": concurrency,
+            "endpoints": endpoints,
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+# Reporting
+
+def compare(results, baseline_path, threshold):
+    """Print per-case ratios against a baseline file; return the regressed cases"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r["case"], r["size"]): r for r in baseline["results"]}
+    print(f"\nCompared with {baseline_path} ({(baseline.get('commit') or '?')[:10]}):")
+    regressions = []
+    for r in results:
+        before = previous.get((r["case"], r["size"]))
+        if before is None:
+            continue
+        if r["case"] == "api":
+            ratio = before["requests_per_sec"] / r["requests_per_sec"]
+            label = f"{r['requests_per_sec']:.0f} req/s vs {before['requests_per_sec']:.0f}"
+        else:
+            ratio = r["wall_seconds"] / before["wall_seconds"]
+            label = f"{r['wall_seconds']:.3f}s vs {before['wall_seconds']:.3f}s"
+        flag = "  ⚠ regression" if ratio > 1 + threshold else ""
+        print(f"  {r['case']:<22}{r['size']:>10}  x{ratio:.2f}  ({label}){flag}")
+        if flag:
+            regressions.append((r["case"], r["size"]))
+    return regressions
+
+
+def parse_sizes(values):
+    sizes = {}
+    for value in values or []:
+        case, _, numbers = value.partition("=")
+        if case not in DEFAULT_SIZES or not numbers:
+            raise SystemExit(f"--size expects CASE=N[,N...] with CASE in {', '.join(DEFAULT_SIZES)}")
+        sizes[case] = [int(float(n)) for n in numbers.split(",")]
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing, training, the scanner and the API")
+    parser.add_argument("--cases", nargs="+", default=list(DEFAULT_SIZES), choices=list(DEFAULT_SIZES))
+    parser.add_argument("--size", action="append", metavar="CASE=N[,N...]",
+                        help="Override sizes, e.g. preprocess=1e6,1e7 or api=100000 (repeatable)")
+    parser.add_argument("--workdir", default=str(ROOT / "benchmarks" / ".work"), help="Where generated inputs are cached")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Slowdown flagged as a regression")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent API clients")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds of load per API endpoint")
+    parser.add_argument("--no-predict", action="store_true", help="Skip /predict (avoids training models)")
+    parser.add_argument("--child", nargs=2, metavar=("CASE", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir).resolve()
+    os.makedirs(workdir, exist_ok=True)
+
+    if args.child:
+        case, size = args.child[0], int(args.child[1])
+        # Training logs and artifacts go to stdout; keep the last line for the result
+        result = run_case(case, size, workdir)
+        result["peak_rss_mb"] = peak_rss_mb()
+        print(json.dumps(result))
+        return
+
+    sizes = {**DEFAULT_SIZES, **parse_sizes(args.size)}
+    commit, dirty = git_commit()
+    results = []
+    for case in args.cases:
+        for size in sizes[case]:
+            print(f"▶ {case} @ {size:,}")
+            if case == "api":
+                result = run_api(size, workdir, args.concurrency, args.duration, not args.no_predict)
+            else:
+                prepare(case, size, workdir)
+                result = case_in_child(case, size, workdir)
+            results.append({"case": case, "size": size, **result})
+            if case == "api":
+                summary = f"{result['requests_per_sec']:.0f} req/s"
+            elif case == "predict":
+                summary = ", ".join(f"{name} {result[f'{name}_pickle_ms']:.2f}ms pickle / "
+                                    f"{result[f'{name}_compiled_ms']:.2f}ms compiled" for name in ("rf", "xgb"))
+            else:
+                summary = f"{result['wall_seconds']:.3f}s"
+            print(f"  {summary}, peak RSS {result['peak_rss_mb'] or 0:.0f} MB")
+
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    output = args.output or str(
+        ROOT / "benchmarks" / "results"
+        / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{(commit or 'nogit')[:10]}.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✓ Results saved to {output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
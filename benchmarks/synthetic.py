@@ -0,0 +1,106 @@
+"""
+Synthetic inputs for the benchmarks.
+
+`raw.csv` files follow the columns preprocess.py reads (the numeric pod
+requests/limits, runtime and controller kind, plus the cpu_usage target) and
+are written in chunks so 10M-row files never have to fit in memory. mlruns
+trees use the MLflow FileStore layout the scanner and the API read.
+"""
+
+import os
+import uuid
+import argparse
+
+import numpy as np
+import pandas as pd
+
+CONTROLLER_KINDS = np.array(["Deployment", "Job", "StatefulSet", "DaemonSet", "ReplicaSet", "CronJob"])
+# The names train.py logs as the "model" param, as the API and dashboard expect
+MODEL_NAMES = ["linear", "rf", "xgb"]
+METRIC_KEYS = ["train_rmse", "train_mae", "train_r2", "test_rmse", "test_mae", "test_r2"]
+
+# Rows generated per write when building large raw.csv files
+CHUNK_ROWS = 500_000
+
+
+def raw_chunk(rng, start, n_rows):
+    """One block of pod specs with a cpu_usage that depends on them"""
+    cpu_request = rng.gamma(2.0, 0.5, n_rows)
+    mem_request = rng.gamma(2.0, 256.0, n_rows)
+    runtime_minutes = rng.exponential(60.0, n_rows)
+    kinds = CONTROLLER_KINDS[rng.integers(0, len(CONTROLLER_KINDS), n_rows)]
+    df = pd.DataFrame({
+        "pod": np.arange(start, start + n_rows),
+        "cpu_request": cpu_request,
+        "mem_request": mem_request,
+        "cpu_limit": cpu_request * rng.uniform(1.0, 3.0, n_rows),
+        "mem_limit": mem_request * rng.uniform(1.0, 2.0, n_rows),
+        "runtime_minutes": runtime_minutes,
+        "controller_kind": kinds,
+    })
+    df["cpu_usage"] = (0.6 * cpu_request + 0.1 * np.log1p(runtime_minutes)
+                       + 0.05 * (kinds == "Job") + rng.normal(0.0, 0.1, n_rows))
+    return df
+
+
+def generate_raw_csv(path, n_rows, seed=0, chunk_rows=CHUNK_ROWS):
+    """Write an n_rows raw.csv in chunks"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_rows, chunk_rows):
+        chunk = raw_chunk(rng, start, min(chunk_rows, n_rows - start))
+        chunk.to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+    return path
+
+
+def write_run(experiment_path, rng, start_time):
+    run_id = uuid.UUID(bytes=rng.bytes(16)).hex
+    run_path = os.path.join(experiment_path, run_id)
+    os.makedirs(os.path.join(run_path, "metrics"))
+    os.makedirs(os.path.join(run_path, "params"))
+    with open(os.path.join(run_path, "meta.yaml"), "w") as f:
+        f.write(f"run_id: {run_id}\nstart_time: {start_time}\nend_time: {start_time + 60000}\nstatus: 3\n")
+    with open(os.path.join(run_path, "params", "model"), "w") as f:
+        f.write(MODEL_NAMES[rng.integers(len(MODEL_NAMES))])
+    with open(os.path.join(run_path, "params", "data_version"), "w") as f:
+        f.write(f"v{rng.integers(1, 4)}")
+    for key in METRIC_KEYS:
+        value = rng.uniform(0.5, 1.0) if key.endswith("r2") else rng.uniform(0.01, 0.5)
+        with open(os.path.join(run_path, "metrics", key), "w") as f:
+            f.write(f"{start_time} {value} 0\n")
+
+
+def generate_mlruns(path, n_runs, n_experiments=4, seed=0):
+    """Write an mlruns tree with n_runs model runs spread over n_experiments"""
+    rng = np.random.default_rng(seed)
+    start_time = 1_700_000_000_000
+    for e in range(n_experiments):
+        experiment_path = os.path.join(path, str(e))
+        os.makedirs(experiment_path, exist_ok=True)
+        with open(os.path.join(experiment_path, "meta.yaml"), "w") as f:
+            f.write(f"experiment_id: '{e}'\nname: bench-{e}\n")
+        for i in range(e, n_runs, n_experiments):
+            write_run(experiment_path, rng, start_time + i * 1000)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic benchmark inputs")
+    sub = parser.add_subparsers(dest="kind", required=True)
+    raw = sub.add_parser("raw", help="raw.csv with the preprocess.py schema")
+    raw.add_argument("output")
+    raw.add_argument("--rows", type=int, default=10_000)
+    raw.add_argument("--seed", type=int, default=0)
+    runs = sub.add_parser("mlruns", help="MLflow FileStore tree")
+    runs.add_argument("output")
+    runs.add_argument("--runs", type=int, default=100)
+    runs.add_argument("--experiments", type=int, default=4)
+    runs.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.kind == "raw":
+        generate_raw_csv(args.output, args.rows, args.seed)
+        print(f"✓ {args.rows} rows written to {args.output}")
+    else:
+        generate_mlruns(args.output, args.runs, args.experiments, args.seed)
+        print(f"✓ {args.runs} runs written to {args.output}")
@@ -0,0 +1,20 @@
+"""
+Import-time budgets as a pytest check (see import_budget.py):
+
+    python -m pytest benchmarks/test_import_budget.py
+"""
+
+import pytest
+
+from import_budget import BUDGETS_MS, measure
+
+
+@pytest.mark.parametrize("module", list(BUDGETS_MS))
+def test_import_within_budget(module):
+    cwd, budget_ms = BUDGETS_MS[module]
+    total_ms, times = measure(module, cwd, repeat=3)
+    heaviest = sorted((t for t in times if "." not in t[2] and t[2] != module), reverse=True)[:5]
+    assert total_ms <= budget_ms, (
+        f"import {module} took {total_ms:.0f} ms (budget {budget_ms} ms); heaviest imports: "
+        + ", ".join(f"{name} {cumulative / 1000:.0f} ms" for cumulative, _, name in heaviest)
+    )
@@ -17,6 +17,44 @@ interface ModelMetrics {
   test_r2: number
   mlflow_run_id: string
   timestamp?: string
+  fit_seconds?: number | null
+  predict_seconds?: number | null
+  peak_mem_mb?: number | null
+  train_rows_per_sec?: number | null
+}
+
+// summary.json of the compact bundle written by Q3/dashboard_bundle.py
+interface BundleSummary {
+  runs: number
+  models: { model: string; runs: number; best: ModelMetrics; latest: ModelMetrics }[]
+  shards: string[]
+}
+
+// runs/<month>-<k>.json: one array per run column, `runs` entries each
+interface BundleShard {
+  shard: string
+  runs: number
+  [column: string]: string | number | (string | number | null)[]
+}
+
+// Every run in the bundle, one row per run as in metrics.json
+const loadBundleRuns = async (): Promise<ModelMetrics[]> => {
+  const summary = await axios.get<BundleSummary>('/data/bundle/summary.json')
+  const shards = await Promise.all(
+    summary.data.shards.map(name => axios.get<BundleShard>(`/data/bundle/${name}`))
+  )
+  return shards.flatMap(({ data }) => {
+    const columns = Object.entries(data).filter(
+      (entry): entry is [string, (string | number | null)[]] => Array.isArray(entry[1])
+    )
+    return Array.from({ length: data.runs }, (_, i) => {
+      const run = Object.fromEntries(columns.map(([key, values]) => [key, values[i]]))
+      if (typeof run.start_time === 'number') {
+        run.timestamp = new Date(run.start_time).toISOString()
+      }
+      return run as unknown as ModelMetrics
+    })
+  })
 }
 
 export default function Home() {
@@ -32,8 +70,13 @@ export default function Home() {
   const fetchMetrics = async () => {
     try {
       setLoading(true)
-      const response = await axios.get('/metrics.json')
-      setMetrics(response.data)
+      // Every run from the bundle's shards; metrics.json when there is no bundle
+      try {
+        setMetrics(await loadBundleRuns())
+      } catch {
+        const response = await axios.get('/metrics.json')
+        setMetrics(response.data)
+      }
       setError(null)
     } catch (err) {
       setError('Failed to fetch metrics. Please ensure metrics.json exists.')
@@ -10,6 +10,10 @@ interface ModelMetrics {
   test_r2: number
   mlflow_run_id: string
   timestamp?: string
+  fit_seconds?: number | null
+  predict_seconds?: number | null
+  peak_mem_mb?: number | null
+  train_rows_per_sec?: number | null
 }
 
 interface ModelComparisonProps {
@@ -18,16 +22,22 @@ interface ModelComparisonProps {
 
 export default function ModelComparison({ metrics }: ModelComparisonProps) {
   const getBestValue = (metricName: keyof ModelMetrics, higher: boolean = false) => {
-    if (metrics.length === 0) return null
-    const values = metrics.map(m => m[metricName] as number)
+    const values = metrics
+      .map(m => m[metricName])
+      .filter((v): v is number => typeof v === 'number')
+    if (values.length === 0) return null
     return higher ? Math.max(...values) : Math.min(...values)
   }
 
-  const isBestValue = (value: number, metricName: keyof ModelMetrics, higher: boolean = false) => {
+  const isBestValue = (value: number | null | undefined, metricName: keyof ModelMetrics, higher: boolean = false) => {
     const bestValue = getBestValue(metricName, higher)
-    return value === bestValue
+    return value != null && value === bestValue
   }
 
+  // Training cost is only logged by newer runs
+  const formatCost = (value: number | null | undefined, digits: number, unit: string) =>
+    value == null ? '—' : `${value.toFixed(digits)} ${unit}`
+
   return (
     <div className="bg-slate-800/50 backdrop-blur-sm border border-slate-700 rounded-xl p-6">
       <h2 className="text-2xl font-bold text-white mb-6">Model Comparison</h2>
@@ -42,6 +52,11 @@ export default function ModelComparison({ metrics }: ModelComparisonProps) {
               <th className="text-right py-3 px-4 text-slate-300 font-semibold">Test RMSE</th>
               <th className="text-right py-3 px-4 text-slate-300 font-semibold">Test MAE</th>
               <th className="text-right py-3 px-4 text-slate-300 font-semibold">Test R²</th>
+              <th className="text-right py-3 px-4 text-slate-300 font-semibold">Fit Time</th>
+              <th className="text-right py-3 px-4 text-slate-300 font-semibold"
+                  title="Peak RSS of the training process, including models trained before this one in the same process">
+                Process Peak Memory
+              </th>
               <th className="text-right py-3 px-4 text-slate-300 font-semibold">Run ID</th>
             </tr>
           </thead>
@@ -98,6 +113,20 @@ export default function ModelComparison({ metrics }: ModelComparisonProps) {
                 }`}>
                   {metric.test_r2.toFixed(6)}
                 </td>
+                <td className={`text-right py-4 px-4 ${
+                  isBestValue(metric.fit_seconds, 'fit_seconds') 
+                    ? 'text-primary-400 font-bold' 
+                    : 'text-slate-300'
+                }`}>
+                  {formatCost(metric.fit_seconds, 2, 's')}
+                </td>
+                <td className={`text-right py-4 px-4 ${
+                  isBestValue(metric.peak_mem_mb, 'peak_mem_mb') 
+                    ? 'text-primary-400 font-bold' 
+                    : 'text-slate-300'
+                }`}>
+                  {formatCost(metric.peak_mem_mb, 0, 'MB')}
+                </td>
                 <td className="text-right py-4 px-4 text-slate-400 font-mono text-xs">
                   {metric.mlflow_run_id.substring(0, 8)}...
                 </td>